@@ -0,0 +1,220 @@
+"""
+Solve one of the MCM models for a whole ensemble of parameter sets and
+initial conditions at once.
+
+All trajectories are stacked into one ODE system whose right-hand side is a
+single vectorized call of the model's rhs (see models.py), so sweeping
+thousands of parameter sets costs about as many NumPy calls as solving one.
+The state is stored trajectory by trajectory, so the Jacobian of the stacked
+system is banded (each trajectory only couples to itself) and LSODA, like
+odeint in the scripts, can use it without building a dense matrix.
+
+The step size is shared by the trajectories solved together; chunk_size
+limits how many are, when a few stiff ones would slow down the rest.
+
+With jac=True the implicit methods (LSODA, BDF, Radau) get the model's
+analytic Jacobian, in LSODA's packed banded format or as a block-diagonal
+sparse matrix, instead of estimating it by finite differences. full_output
+returns the number of rhs and Jacobian evaluations, like odeint's infodict.
+
+Example:
+    from ensemble import parameter_grid, solve_ensemble
+    from models import MODELS
+
+    model = MODELS["problem1"]
+    params, grid = parameter_grid(model, k=np.linspace(-0.04, 0, 100), b=np.linspace(1, 1.5, 100))
+    t = np.linspace(0, model.t_end, 1000)
+    solution = solve_ensemble(model, t, params)
+    # solution[i] is what odeint returns for the parameters params[i]
+"""
+import itertools
+
+import numpy as np
+from scipy.integrate import solve_ivp
+from scipy.sparse import csc_matrix, identity, kron
+
+from models import MODELS
+
+# The tolerances of odeint
+RTOL = 1.49012e-8
+ATOL = 1.49012e-8
+
+IMPLICIT_METHODS = ("LSODA", "BDF", "Radau")
+
+
+def parameter_grid(model, **values):
+    """
+    Build the parameter sets of every combination of the given values, with
+    the model's defaults for the parameters that are not given.
+
+    Returns:
+        params: array of shape (n, len(model.params))
+        grid: dict of the swept parameter name -> array of shape (n,)
+    """
+    unknown = set(values) - set(model.params)
+    if unknown:
+        raise ValueError(f"unknown parameters for {model.name}: {sorted(unknown)}")
+    names = list(values)
+    combinations = list(itertools.product(*(np.atleast_1d(values[name]) for name in names)))
+    combinations = np.array(combinations, dtype=float).reshape(len(combinations), len(names))
+    params = np.tile(np.asarray(model.defaults, dtype=float), (len(combinations), 1))
+    for column, name in enumerate(names):
+        params[:, model.params.index(name)] = combinations[:, column]
+    grid = {name: combinations[:, column] for column, name in enumerate(names)}
+    return params, grid
+
+
+def stacked_rhs(model, params):
+    """
+    Returns f(t, Y) for the stacked system of the trajectories with the
+    given parameter sets (shape (n, len(model.params))), where Y holds the
+    states one trajectory after another.
+    """
+    p = np.ascontiguousarray(np.transpose(params))
+    n_state = len(model.state)
+    n = p.shape[1]
+    rhs = model.rhs
+
+    def f(t, Y):
+        f.calls += 1
+        y = Y.reshape(n, n_state).T
+        out = np.empty((n_state, n))
+        for row, derivative in enumerate(rhs(t, y, p)):
+            out[row] = derivative
+        return out.T.ravel()
+
+    f.calls = 0
+    return f
+
+
+def stacked_jac(model, params, banded=False):
+    """
+    Returns jac(t, Y) for the stacked system of stacked_rhs, from the model's
+    analytic Jacobian: a sparse block-diagonal matrix, or with banded the
+    packed banded array that LSODA takes with lband = uband = n_state - 1.
+    """
+    p = np.ascontiguousarray(np.transpose(params))
+    n_state = len(model.state)
+    n = p.shape[1]
+    model_jac = model.jac
+
+    if banded:
+        def jac(t, Y):
+            jac.calls += 1
+            J = model_jac(t, Y.reshape(n, n_state).T, p)
+            # jac_packed[uband + i - j, j] = jac[i, j], within each block
+            packed = np.zeros((2 * n_state - 1, n, n_state))
+            for i in range(n_state):
+                for j in range(n_state):
+                    packed[n_state - 1 + i - j, :, j] = J[i, j]
+            return packed.reshape(2 * n_state - 1, n * n_state)
+
+        jac.calls = 0
+        return jac
+
+    first = np.arange(n)[:, None, None] * n_state
+    block = np.arange(n_state)
+    rows = np.broadcast_to(first + block[None, :, None], (n, n_state, n_state)).ravel()
+    cols = np.broadcast_to(first + block[None, None, :], (n, n_state, n_state)).ravel()
+
+    def jac(t, Y):
+        jac.calls += 1
+        J = model_jac(t, Y.reshape(n, n_state).T, p)
+        data = J.transpose(2, 0, 1).ravel()
+        return csc_matrix((data, (rows, cols)), shape=(n * n_state, n * n_state))
+
+    jac.calls = 0
+    return jac
+
+
+def _solve(model, t, params, y0, method, rtol, atol, jac):
+    n, n_state = y0.shape
+    options = {}
+    if method == "LSODA":
+        options["lband"] = options["uband"] = n_state - 1
+        if jac:
+            options["jac"] = stacked_jac(model, params, banded=True)
+    elif method in ("BDF", "Radau"):
+        if jac:
+            options["jac"] = stacked_jac(model, params)
+        else:
+            options["jac_sparsity"] = kron(identity(n), np.ones((n_state, n_state)), format="csc")
+    f = stacked_rhs(model, params)
+    result = solve_ivp(
+        f,
+        (t[0], t[-1]),
+        y0.ravel(),
+        method=method,
+        t_eval=t,
+        rtol=rtol,
+        atol=atol,
+        **options,
+    )
+    if not result.success:
+        raise RuntimeError(f"{model.name}: {result.message}")
+    info = {
+        # Counted here: solve_ivp's nfev leaves out finite-difference Jacobians
+        "nfe": f.calls,
+        "nje": options["jac"].calls if "jac" in options else int(result.njev),
+        "nlu": int(result.nlu),
+    }
+    return result.y.reshape(n, n_state, len(t)).transpose(0, 2, 1), info
+
+
+def solve_ensemble(
+    model,
+    t,
+    params,
+    y0=None,
+    method="LSODA",
+    rtol=RTOL,
+    atol=ATOL,
+    chunk_size=None,
+    jac=False,
+    full_output=False,
+):
+    """
+    Integrate model for every parameter set in params.
+
+    Args:
+        model: an OdeModel, or the name of one in models.MODELS
+        t: increasing times to return the solution at; t[0] is the start
+        params: array of shape (n, len(model.params)), e.g. from parameter_grid
+        y0: initial conditions, shape (len(model.state),) for all
+            trajectories or (n, len(model.state)); the model's y0 by default
+        method: any solve_ivp method
+        chunk_size: solve at most this many trajectories together
+        jac: use the model's analytic Jacobian (implicit methods only)
+        full_output: also return a dict with the number of rhs evaluations
+                     ("nfe", including those for finite-difference
+                     Jacobians), Jacobian evaluations ("nje") and LU
+                     decompositions ("nlu"), summed over the chunks
+
+    Returns:
+        Array of shape (n, len(t), len(model.state)), and the dict if
+        full_output is set.
+    """
+    if jac and method not in IMPLICIT_METHODS:
+        raise ValueError(f"jac is only used by the implicit methods {IMPLICIT_METHODS}")
+    if isinstance(model, str):
+        model = MODELS[model]
+    t = np.asarray(t, dtype=float)
+    params = np.atleast_2d(np.asarray(params, dtype=float))
+    n = len(params)
+    if y0 is None:
+        y0 = model.y0
+    y0 = np.broadcast_to(np.asarray(y0, dtype=float), (n, len(model.state)))
+    if chunk_size is None:
+        chunk_size = n
+    solution = np.empty((n, len(t), len(model.state)))
+    info = {"nfe": 0, "nje": 0, "nlu": 0}
+    for start in range(0, n, chunk_size):
+        chunk = slice(start, start + chunk_size)
+        solution[chunk], chunk_info = _solve(
+            model, t, params[chunk], y0[chunk], method, rtol, atol, jac
+        )
+        for key in info:
+            info[key] += chunk_info[key]
+    if full_output:
+        return solution, info
+    return solution
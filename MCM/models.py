@@ -0,0 +1,301 @@
+"""
+Vectorized right-hand sides of the MCM models (problem1-5 and test).
+
+Every rhs(t, y, p) is the model() of the matching script written so that it
+works on arrays: y has one row per state variable and p one row per
+parameter, with one column per trajectory, so a single call evaluates the
+derivatives of a whole ensemble. The equations are the same as in the
+scripts; logistic uses scipy.special.expit instead of math.exp. jac(t, y, p)
+is the analytic Jacobian of rhs with respect to y, for implicit solvers.
+
+Parameters that the scripts read from module globals inside model() (r_P, k,
+b and miu in problem3) are explicit parameters here.
+"""
+from collections import namedtuple
+
+import numpy as np
+from scipy.special import expit as logistic
+
+# state: names of the state variables, in the order of y
+# params: names of the parameters, in the order of p
+# defaults: parameter values used in the script
+# y0: initial conditions used in the script
+# t_end: end of the time span used in the script
+# jac: analytic Jacobian, jac(t, y, p)[i, j] = d rhs_i / d y_j for each trajectory
+OdeModel = namedtuple("OdeModel", ["name", "state", "params", "defaults", "y0", "t_end", "rhs", "jac"])
+
+
+def _zeros(y):
+    """
+    An all-zero Jacobian for the states y, of shape (n_state, n_state, n).
+    """
+    return np.zeros((len(y), len(y)) + np.shape(y[0]))
+
+
+def problem1_rhs(t, y, p):
+    rate_1, rate_2, rate_3, rate_4 = y
+    P, K, r, A_1, A_2, A_3, A_4, k, b = p
+    d1dt = r * logistic(k * A_1 / P + b) - r * P / K * rate_1
+    d2dt = r * logistic(k * A_2 / P + b) - r * P / K * rate_2
+    d3dt = r * logistic(k * A_3 / P + b) - r * P / K * rate_3
+    d4dt = r * logistic(k * A_4 / P + b) - r * P / K * rate_4
+    return [d1dt, d2dt, d3dt, d4dt]
+
+
+def problem1_jac(t, y, p):
+    P, K, r, A_1, A_2, A_3, A_4, k, b = p
+    J = _zeros(y)
+    for i in range(4):
+        J[i, i] = -r * P / K
+    return J
+
+
+def problem2_rhs(t, y, p):
+    A1, A2, rate = y
+    P, K_P, K_A, r_P, r_A, alpha, beta, k, b, miu, const_rate = p
+    newborn_rate = logistic(k * A1 / P + b)
+    drdt = r_P * newborn_rate - r_P * P / K_P * rate
+    dA1dt = r_A * A1 * (1 - A1 / K_A) - miu * (alpha * rate + beta) * P * A1
+    dA2dt = r_A * A2 * (1 - A2 / K_A) - miu * (alpha * const_rate + beta) * P * A2
+    return [dA1dt, dA2dt, drdt]
+
+
+def problem2_jac(t, y, p):
+    A1, A2, rate = y
+    P, K_P, K_A, r_P, r_A, alpha, beta, k, b, miu, const_rate = p
+    newborn_rate = logistic(k * A1 / P + b)
+    J = _zeros(y)
+    J[0, 0] = r_A * (1 - 2 * A1 / K_A) - miu * (alpha * rate + beta) * P
+    J[0, 2] = -miu * alpha * P * A1
+    J[1, 1] = r_A * (1 - 2 * A2 / K_A) - miu * (alpha * const_rate + beta) * P
+    J[2, 0] = r_P * newborn_rate * (1 - newborn_rate) * k / P
+    J[2, 2] = -r_P * P / K_P
+    return J
+
+
+def problem3_rhs(t, y, p):
+    H1, H2, P1, P2, rate = y
+    A, alpha1, beta1, alpha2, beta2, const_rate, delta_H, r_P, k, b, miu = p
+    K_P = (alpha2 * rate + beta2)
+    drdt = r_P * logistic(k * A / P1 + b) - (r_P * P1 / K_P + (alpha1 * rate + beta1) * H1) * rate
+    dP1dt = r_P * P1 * (1 - P1 / K_P) - (alpha1 * rate + beta1) * H1 * P1
+    dP2dt = r_P * P2 * (1 - P2 / (alpha2 * const_rate + beta2)) - (alpha1 * const_rate + beta1) * H2 * P2
+    dH1dt = delta_H * (alpha1 * rate + beta1) * H1 * P1 - miu * H1
+    dH2dt = delta_H * (alpha1 * const_rate + beta1) * H2 * P2 - miu * H2
+    return [dH1dt, dH2dt, dP1dt, dP2dt, drdt]
+
+
+def problem3_jac(t, y, p):
+    H1, H2, P1, P2, rate = y
+    A, alpha1, beta1, alpha2, beta2, const_rate, delta_H, r_P, k, b, miu = p
+    K_P = (alpha2 * rate + beta2)
+    K_P2 = (alpha2 * const_rate + beta2)
+    eat1 = (alpha1 * rate + beta1)
+    eat2 = (alpha1 * const_rate + beta1)
+    newborn_rate = logistic(k * A / P1 + b)
+    J = _zeros(y)
+    # dH1dt
+    J[0, 0] = delta_H * eat1 * P1 - miu
+    J[0, 2] = delta_H * eat1 * H1
+    J[0, 4] = delta_H * alpha1 * H1 * P1
+    # dH2dt
+    J[1, 1] = delta_H * eat2 * P2 - miu
+    J[1, 3] = delta_H * eat2 * H2
+    # dP1dt
+    J[2, 0] = -eat1 * P1
+    J[2, 2] = r_P * (1 - 2 * P1 / K_P) - eat1 * H1
+    J[2, 4] = r_P * P1 * P1 * alpha2 / (K_P * K_P) - alpha1 * H1 * P1
+    # dP2dt
+    J[3, 1] = -eat2 * P2
+    J[3, 3] = r_P * (1 - 2 * P2 / K_P2) - eat2 * H2
+    # drdt
+    J[4, 0] = -eat1 * rate
+    J[4, 2] = -r_P * newborn_rate * (1 - newborn_rate) * k * A / (P1 * P1) - r_P / K_P * rate
+    J[4, 4] = (
+        -(r_P * P1 / K_P + eat1 * H1)
+        - (alpha1 * H1 - r_P * P1 * alpha2 / (K_P * K_P)) * rate
+    )
+    return J
+
+
+def problem4_rhs(t, y, p):
+    rate_1, rate_2, P1, P2 = y
+    A_1, A_2, k1, b1, k2, b2, rate_0, miu, alpha, beta = p
+    r1 = k2 * (rate_1 - rate_0) * (rate_1 - rate_0) + b2
+    r2 = k2 * (rate_2 - rate_0) * (rate_2 - rate_0) + b2
+    K1 = (alpha * rate_1 + beta)
+    K2 = (alpha * rate_2 + beta)
+    d1dt = r1 * logistic(k1 * A_1 / P1 + b1) - (r1 * P1 / K1 + miu) * rate_1
+    d2dt = r2 * logistic(k1 * A_2 / P2 + b1) - (r2 * P2 / K2 + miu) * rate_2
+    dP1dt = r1 * P1 * (1 - P1 / K1) - miu * P1
+    dP2dt = r2 * P2 * (1 - P2 / K2) - miu * P2
+    return [d1dt, d2dt, dP1dt, dP2dt]
+
+
+def problem4_jac(t, y, p):
+    rate_1, rate_2, P1, P2 = y
+    A_1, A_2, k1, b1, k2, b2, rate_0, miu, alpha, beta = p
+    J = _zeros(y)
+    # rate_1 and P1 don't interact with rate_2 and P2
+    for i, rate_i, P, A_i in ((0, rate_1, P1, A_1), (1, rate_2, P2, A_2)):
+        r = k2 * (rate_i - rate_0) * (rate_i - rate_0) + b2
+        dr = 2 * k2 * (rate_i - rate_0)
+        K = (alpha * rate_i + beta)
+        newborn_rate = logistic(k1 * A_i / P + b1)
+        J[i, i] = dr * newborn_rate - (dr * P / K - r * P * alpha / (K * K)) * rate_i - (r * P / K + miu)
+        J[i, i + 2] = -r * newborn_rate * (1 - newborn_rate) * k1 * A_i / (P * P) - r / K * rate_i
+        J[i + 2, i] = dr * P * (1 - P / K) + r * P * P * alpha / (K * K)
+        J[i + 2, i + 2] = r * (1 - 2 * P / K) - miu
+    return J
+
+
+def problem5_rhs(t, y, p):
+    rate, P, A = y
+    k1, b1, k2, b2, rate_0, miu, alpha, beta = p
+    r = k2 * (rate - rate_0) * (rate - rate_0) + b2
+    K = (alpha * rate + beta)
+    d1dt = r * logistic(k1 * A / P + b1) - (r * P / K + miu) * rate
+    dP1dt = r * P * (1 - P / K) - miu * P
+    # t is shared by the whole ensemble, so the forcing is a scalar
+    if (t < 10):
+        dAdt = -5
+    elif ((t > 75) and (t < 100)):
+        dAdt = 20
+    else: dAdt = 0
+    return [d1dt, dP1dt, dAdt]
+
+
+def problem5_jac(t, y, p):
+    rate, P, A = y
+    k1, b1, k2, b2, rate_0, miu, alpha, beta = p
+    r = k2 * (rate - rate_0) * (rate - rate_0) + b2
+    dr = 2 * k2 * (rate - rate_0)
+    K = (alpha * rate + beta)
+    newborn_rate = logistic(k1 * A / P + b1)
+    d_newborn_rate = newborn_rate * (1 - newborn_rate) * k1 / P
+    J = _zeros(y)
+    J[0, 0] = dr * newborn_rate - (dr * P / K - r * P * alpha / (K * K)) * rate - (r * P / K + miu)
+    J[0, 1] = -r * d_newborn_rate * A / P - r / K * rate
+    J[0, 2] = r * d_newborn_rate
+    J[1, 0] = dr * P * (1 - P / K) + r * P * P * alpha / (K * K)
+    J[1, 1] = r * (1 - 2 * P / K) - miu
+    # dAdt only depends on t
+    return J
+
+
+def test_rhs(t, y, p):
+    A, B, P, rate = y
+    gamma_A, gamma_B, gamma_P, K_A, theta_BA, miu, alpha_1, beta_1,\
+    alpha_2, beta_2, k, b, delta_BA, delta_BP, delta_PA, m = p
+
+    dAdt = gamma_A * A * (1 - A / K_A) - theta_BA * A * B - miu * (alpha_1 * rate + beta_1) * A * P
+
+    dBdt = delta_BA * theta_BA * A * B + delta_BP * (alpha_2 * rate + beta_2) * B * P - gamma_B * B
+
+    dPdt = - (alpha_2 * rate + beta_2) * B * P + delta_PA * (alpha_1 * rate + beta_1) * A * P - gamma_P * P - m * P * P
+
+    newborn_rate = logistic(k * A / P + b)
+
+    d_rate = delta_PA * (alpha_1 * rate + beta_1) * A * P * P * (newborn_rate - rate)
+    return [dAdt, dBdt, dPdt, d_rate]
+
+
+def test_jac(t, y, p):
+    A, B, P, rate = y
+    gamma_A, gamma_B, gamma_P, K_A, theta_BA, miu, alpha_1, beta_1,\
+    alpha_2, beta_2, k, b, delta_BA, delta_BP, delta_PA, m = p
+    eat_A = (alpha_1 * rate + beta_1)
+    eat_B = (alpha_2 * rate + beta_2)
+    newborn_rate = logistic(k * A / P + b)
+    d_newborn_rate = newborn_rate * (1 - newborn_rate) * k / P
+    J = _zeros(y)
+    # dAdt
+    J[0, 0] = gamma_A * (1 - 2 * A / K_A) - theta_BA * B - miu * eat_A * P
+    J[0, 1] = -theta_BA * A
+    J[0, 2] = -miu * eat_A * A
+    J[0, 3] = -miu * alpha_1 * A * P
+    # dBdt
+    J[1, 0] = delta_BA * theta_BA * B
+    J[1, 1] = delta_BA * theta_BA * A + delta_BP * eat_B * P - gamma_B
+    J[1, 2] = delta_BP * eat_B * B
+    J[1, 3] = delta_BP * alpha_2 * B * P
+    # dPdt
+    J[2, 0] = delta_PA * eat_A * P
+    J[2, 1] = -eat_B * P
+    J[2, 2] = -eat_B * B + delta_PA * eat_A * A - gamma_P - 2 * m * P
+    J[2, 3] = -alpha_2 * B * P + delta_PA * alpha_1 * A * P
+    # d_rate
+    growth = delta_PA * eat_A * A * P * P
+    J[3, 0] = growth / A * (newborn_rate - rate) + growth * d_newborn_rate
+    J[3, 2] = 2 * growth / P * (newborn_rate - rate) - growth * d_newborn_rate * A / P
+    J[3, 3] = delta_PA * alpha_1 * A * P * P * (newborn_rate - rate) - growth
+    return J
+
+
+MODELS = {
+    model.name: model
+    for model in [
+        OdeModel(
+            "problem1",
+            ("rate_1", "rate_2", "rate_3", "rate_4"),
+            ("P", "K", "r", "A_1", "A_2", "A_3", "A_4", "k", "b"),
+            (20, 20, 0.1, 1000, 500, 100, 20, -0.02, 1.27),
+            (0.5, 0.5, 0.5, 0.5),
+            50,
+            problem1_rhs,
+            problem1_jac,
+        ),
+        OdeModel(
+            "problem2",
+            ("A1", "A2", "rate"),
+            ("P", "K_P", "K_A", "r_P", "r_A", "alpha", "beta", "k", "b", "miu", "const_rate"),
+            (20, 20, 1000, 0.05, 0.05, 0.01, 0.005, -0.02, 1.27, 0.1, 0.56),
+            (1000, 1000, 0.56),
+            100,
+            problem2_rhs,
+            problem2_jac,
+        ),
+        OdeModel(
+            "problem3",
+            ("H1", "H2", "P1", "P2", "rate"),
+            ("A", "alpha1", "beta1", "alpha2", "beta2", "const_rate", "delta_H", "r_P", "k", "b", "miu"),
+            (100, -0.1, 0.15, 2, 15.7, 0.65, 0.35, 0.4, -0.02, 1.27, 0.2),
+            (2, 2, 5, 5, 0.65),
+            200,
+            problem3_rhs,
+            problem3_jac,
+        ),
+        OdeModel(
+            "problem4",
+            ("rate_1", "rate_2", "P1", "P2"),
+            ("A_1", "A_2", "k1", "b1", "k2", "b2", "rate_0", "miu", "alpha", "beta"),
+            (500, 50, -0.02, 1.27, -0.4, 0.1, 0.5, 0.05, 2, 23.8),
+            (0.5, 0.5, 10, 10),
+            400,
+            problem4_rhs,
+            problem4_jac,
+        ),
+        OdeModel(
+            "problem5",
+            ("rate", "P", "A"),
+            ("k1", "b1", "k2", "b2", "rate_0", "miu", "alpha", "beta"),
+            (-0.02, 1.27, -0.4, 0.1, 0.5, 0.05, 2, 23.8),
+            (0.75, 8, 50),
+            200,
+            problem5_rhs,
+            problem5_jac,
+        ),
+        OdeModel(
+            "test",
+            ("A", "B", "P", "rate"),
+            ("gamma_A", "gamma_B", "gamma_P", "K_A", "theta_BA", "miu", "alpha_1", "beta_1",
+             "alpha_2", "beta_2", "k", "b", "delta_BA", "delta_BP", "delta_PA", "m"),
+            (0.03, 0.04, 0.06, 100, 0.005, 0.1, 0.006, 0.006,
+             -0.007, 0.007, -0.02, 1.3, 0.3, 0.3, 0.35, 0.001),
+            (100, 20, 2, 0.56),
+            1000,
+            test_rhs,
+            test_jac,
+        ),
+    ]
+}
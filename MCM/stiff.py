@@ -0,0 +1,62 @@
+"""
+Compare solver modes on the stiff systems (test.py and problem3.py): odeint
+and the ensemble solver, each with finite-difference and with analytic
+Jacobians, reporting rhs evaluations (nfe), Jacobian evaluations (nje) and
+time.
+
+Run from the MCM directory: python stiff.py
+"""
+import time
+
+import numpy as np
+from scipy.integrate import odeint
+
+from ensemble import parameter_grid, solve_ensemble
+from models import MODELS
+
+# Parameter changes that make the systems stiffer than the scripts' defaults
+CASES = [
+    ("test", {}),
+    ("test", {"delta_PA": 1.0}),
+    ("problem3", {}),
+    ("problem3", {"r_P": 40.0}),
+]
+# Size of the ensemble for the ensemble solver, swept over k
+ENSEMBLE = 200
+
+
+def odeint_counts(model, t, params, analytic_jac):
+    p = np.asarray(params, dtype=float)[:, None]
+
+    def func(y, t):
+        return [float(np.squeeze(d)) for d in model.rhs(t, y[:, None], p)]
+
+    def dfun(y, t):
+        return model.jac(t, y[:, None], p)[:, :, 0]
+
+    start = time.perf_counter()
+    _, info = odeint(func, model.y0, t, Dfun=dfun if analytic_jac else None, full_output=True)
+    elapsed = time.perf_counter() - start
+    return {"nfe": int(info["nfe"][-1]), "nje": int(info["nje"][-1])}, elapsed
+
+
+def report(label, info, elapsed):
+    print(f"    {label:<24} nfe={info['nfe']:>7} nje={info['nje']:>5} {elapsed:7.2f}s")
+
+
+for name, changes in CASES:
+    model = MODELS[name]
+    t = np.linspace(0, model.t_end, 1000)
+    params, _ = parameter_grid(model, **{key: [value] for key, value in changes.items()})
+    print(f"{name} {changes or 'defaults'}")
+    for analytic_jac in (False, True):
+        info, elapsed = odeint_counts(model, t, params[0], analytic_jac)
+        report(f"odeint jac={analytic_jac}", info, elapsed)
+
+    k = dict(zip(model.params, params[0]))["k"]
+    ensemble, _ = parameter_grid(model, k=np.linspace(1.5 * k, 0.5 * k, ENSEMBLE), **changes)
+    for method in ("LSODA", "BDF", "Radau"):
+        for analytic_jac in (False, True):
+            start = time.perf_counter()
+            _, info = solve_ensemble(model, t, ensemble, method=method, jac=analytic_jac, full_output=True)
+            report(f"{method} x{ENSEMBLE} jac={analytic_jac}", info, time.perf_counter() - start)
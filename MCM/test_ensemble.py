@@ -0,0 +1,40 @@
+"""
+Checks the batched ensemble solver against odeint, run by run. Run with
+pytest from the repository root or MCM.
+"""
+import numpy as np
+import pytest
+from scipy.integrate import odeint
+
+from ensemble import parameter_grid, solve_ensemble
+from models import MODELS
+
+
+def _odeint(model, t, p):
+    return odeint(lambda y, t: np.array(model.rhs(t, y, p), float), model.y0, t)
+
+
+@pytest.mark.parametrize("name", ["problem1", "problem2", "problem4"])
+@pytest.mark.parametrize("chunk_size", [None, 2])
+def test_ensemble_matches_odeint(name, chunk_size):
+    model = MODELS[name]
+    swept = "k1" if "k1" in model.params else "k"
+    default = model.defaults[model.params.index(swept)]
+    params, _ = parameter_grid(model, **{swept: default * np.array([0.5, 1, 1.5])})
+    t = np.linspace(0, model.t_end, 50)
+    solution = solve_ensemble(model, t, params, chunk_size=chunk_size)
+    assert solution.shape == (3, len(t), len(model.state))
+    for run, p in enumerate(params):
+        expected = _odeint(model, t, p)
+        np.testing.assert_allclose(solution[run], expected, rtol=1e-5, atol=1e-6 * np.abs(expected).max())
+
+
+def test_parameter_grid_sweeps_every_combination():
+    model = MODELS["problem1"]
+    params, grid = parameter_grid(model, k=[-0.01, -0.02], b=[1, 1.2, 1.4])
+    assert params.shape == (6, len(model.params))
+    assert set(zip(grid["k"], grid["b"])) == {(k, b) for k in (-0.01, -0.02) for b in (1, 1.2, 1.4)}
+    P = model.params.index("P")
+    assert np.all(params[:, P] == model.defaults[P])
+    with pytest.raises(ValueError):
+        parameter_grid(model, nope=[1])
@@ -0,0 +1,50 @@
+"""
+Checks the analytic Jacobians of models.py against finite differences of
+the right-hand sides. Run with pytest from the repository root or MCM.
+"""
+import numpy as np
+import pytest
+
+from ensemble import solve_ensemble
+from models import MODELS
+
+
+def _rhs(model, t, y, p):
+    # The derivatives as an array of shape (n_state, n); constant ones
+    # (problem5's forcing) come back as scalars
+    return np.array([np.broadcast_to(value, y.shape[1:]) for value in model.rhs(t, y, p)], float)
+
+
+@pytest.mark.parametrize("name", sorted(MODELS))
+def test_jacobian_matches_finite_differences(name):
+    model = MODELS[name]
+    rng = np.random.default_rng(1)
+    n = 7
+    # Trajectories around the defaults and the initial conditions
+    p = np.array(model.defaults, float)[:, None] * (1 + 0.1 * rng.standard_normal((len(model.defaults), n)))
+    y = np.abs(np.array(model.y0, float)[:, None] * (1 + 0.3 * rng.standard_normal((len(model.state), n)))) + 0.1
+    t = 3.0
+    J = model.jac(t, y, p)
+    assert J.shape == (len(model.state), len(model.state), n)
+    J_fd = np.zeros_like(J)
+    for j in range(len(model.state)):
+        h = 1e-6 * np.maximum(1, np.abs(y[j]))
+        y_plus, y_minus = y.copy(), y.copy()
+        y_plus[j] += h
+        y_minus[j] -= h
+        J_fd[:, j] = (_rhs(model, t, y_plus, p) - _rhs(model, t, y_minus, p)) / (2 * h)
+    np.testing.assert_allclose(J, J_fd, rtol=1e-5, atol=1e-6 * np.abs(J_fd).max())
+
+
+@pytest.mark.parametrize("method", ["LSODA", "BDF"])
+def test_analytic_jacobian_gives_the_same_solution(method):
+    # The stiff one: LSODA switches to BDF and evaluates the Jacobian
+    model = MODELS["test"]
+    t = np.linspace(0, model.t_end, 50)
+    params = np.array([model.defaults])
+    estimated = solve_ensemble(model, t, params, method=method, rtol=1e-8, atol=1e-10)
+    analytic, info = solve_ensemble(
+        model, t, params, method=method, rtol=1e-8, atol=1e-10, jac=True, full_output=True
+    )
+    assert info["nje"] > 0
+    np.testing.assert_allclose(analytic, estimated, rtol=1e-5, atol=1e-6 * np.abs(estimated).max())
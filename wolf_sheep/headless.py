@@ -0,0 +1,5 @@
+import sys
+
+from wolf_sheep.cli import main
+
+sys.exit(main())
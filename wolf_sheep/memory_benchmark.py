@@ -0,0 +1,128 @@
+"""
+Memory per agent
+================================
+
+Creates n agents of one class of agents2 in an otherwise empty
+model2.WolfSheep on a square grid of about n cells, placing them on the grid
+and adding them to the schedule as the model does, and reports:
+
+- bytes/agent: memory allocated per agent, measured with tracemalloc. This
+  includes mesa's bookkeeping (the model's agent registry, the schedule and
+  the grid), not only the agent object;
+- RSS: resident memory of the process once the agents exist.
+
+Every measurement runs in a fresh process, and RSS is measured in a run
+without tracemalloc, which adds its own overhead to every allocation.
+
+Usage:
+    python memory_benchmark.py
+    python memory_benchmark.py --sizes 10000 100000 --classes Sheep GrassPatch
+"""
+
+import argparse
+import math
+import multiprocessing
+import sys
+import tracemalloc
+import warnings
+
+SIZES = (10**4, 10**5, 10**6)
+CLASSES = ("Sheep", "Sheep2", "Wolf", "Wolf2", "GrassPatch", "GrassPatch2")
+
+
+def resident_memory():
+    """
+    Resident memory of this process in bytes (current on Linux, peak
+    elsewhere).
+    """
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def make_agent(class_name, model, pos):
+    from wolf_sheep import agents2
+
+    agent_class = getattr(agents2, class_name)
+    if class_name == "Sheep":
+        return agent_class(model.next_id(), pos, model, True, 10, "Female", False, False)
+    if class_name in ("GrassPatch", "GrassPatch2"):
+        return agent_class(model.next_id(), pos, model, True, 30, False)
+    return agent_class(model.next_id(), pos, model, True, 10, False)
+
+
+def measure(class_name, n, traced):
+    """
+    Create n agents of class_name; returns the bytes allocated per agent
+    with traced, else the RSS of the process.
+    """
+    warnings.filterwarnings("ignore", message=r"Agent \d+ is being placed with", category=UserWarning)
+    from wolf_sheep.model2 import WolfSheep
+
+    side = math.isqrt(n - 1) + 1
+    model = WolfSheep(
+        width=side, height=side, initial_sheep=0, initial_sheep2=0,
+        initial_wolves=0, seed=0,
+    )
+    positions = [
+        (model.random.randrange(side), model.random.randrange(side)) for _ in range(n)
+    ]
+    if traced:
+        tracemalloc.start()
+    agents = []
+    for pos in positions:
+        agent = make_agent(class_name, model, pos)
+        model.grid.place_agent(agent, pos)
+        model.schedule.add(agent)
+        agents.append(agent)
+    if not traced:
+        return resident_memory()
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # Don't count the list of agents kept by this function
+    allocated -= sys.getsizeof(agents)
+    return allocated / n
+
+
+def _measure(arguments):
+    return measure(*arguments)
+
+
+def run(sizes=SIZES, classes=CLASSES):
+    """
+    Measure every class at every size; returns a list of
+    (n, class name, bytes per agent, RSS) rows.
+    """
+    rows = []
+    context = multiprocessing.get_context("spawn")
+    for n in sizes:
+        for class_name in classes:
+            results = []
+            for traced in (True, False):
+                with context.Pool(1) as pool:
+                    results.append(pool.apply(_measure, ((class_name, n, traced),)))
+            rows.append((n, class_name, *results))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the memory used per agent.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="numbers of agents")
+    parser.add_argument("--classes", nargs="+", default=CLASSES, choices=CLASSES, help="agent classes")
+    args = parser.parse_args(argv)
+    print(f"{'agents':>9}  {'class':<12} {'bytes/agent':>11} {'RSS MB':>8}")
+    for n, class_name, per_agent, rss in run(args.sizes, args.classes):
+        print(f"{n:>9}  {class_name:<12} {per_agent:>11.0f} {rss / 2**20:>8.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,46 @@
-from wolf_sheep.server import server
+import argparse
 
-server.launch(open_browser=True)
+from wolf_sheep.server import (
+    make_background_server,
+    make_raster_server,
+    make_replay_server,
+    make_session_server,
+    server,
+)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Launch the Wolf-Sheep visualization server (one model "
+        "step per frame of the page, unless a mode is given)."
+    )
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--background", action="store_true",
+        help="run the model at full speed in a worker thread, the page "
+        "showing its latest state at each frame",
+    )
+    mode.add_argument(
+        "--raster", metavar="SIZE", type=int, nargs="?", const=1000,
+        help="the same on a SIZE x SIZE grid, drawn as one image (default "
+        "size: 1000)",
+    )
+    mode.add_argument(
+        "--sessions", metavar="MAX", type=int, nargs="?", const=16,
+        help="give every page its own model, in a pool of worker processes, "
+        "with up to MAX pages at once (default: 16)",
+    )
+    mode.add_argument(
+        "--replay", metavar="PATH",
+        help="play back a trace recorded with record_to",
+    )
+    args = parser.parse_args()
+    if args.background:
+        server = make_background_server()
+    elif args.raster is not None:
+        server = make_raster_server(args.raster)
+    elif args.sessions is not None:
+        server = make_session_server(max_sessions=args.sessions)
+    elif args.replay is not None:
+        server = make_replay_server(args.replay)
+
+    server.launch(open_browser=True)
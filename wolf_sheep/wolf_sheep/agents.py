@@ -12,9 +12,7 @@ class Sheep(RandomWalker):
     The init is the same as the RandomWalker.
     """
 
-    energy = None
-    sex = None
-
+    __slots__ = ("energy", "sex")
 
     def __init__(self, unique_id, pos, model, moore, energy=None,\
                   sex=None):
@@ -72,7 +70,7 @@ class Wolf(RandomWalker):
     A wolf that walks around, reproduces (asexually) and eats sheep.
     """
 
-    energy = None
+    __slots__ = ("energy",)
 
     def __init__(self, unique_id, pos, model, moore, energy=None):
         super().__init__(unique_id, pos, model, moore=moore)
@@ -119,6 +117,8 @@ class GrassPatch(mesa.Agent):
     A patch of resource that grows at a fixed rate and it is eaten by sheep
     """
 
+    __slots__ = ("unique_id", "model", "pos", "fully_grown", "countdown")
+
     def __init__(self, unique_id, pos, model, fully_grown, countdown):
         """
         Creates a new patch of resource
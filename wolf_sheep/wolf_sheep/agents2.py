@@ -1,10 +1,32 @@
 import mesa
 import math
+from .field import GRASS, GRASS2
 from .random_walk import RandomWalker
+from .scheduler import TrackedAttribute
 
 def logistic(p):
     return 1 / (1 + math.exp(-p))
 
+def count_down_asleep(patch, until=None):
+    """
+    For a regrowing patch going to sleep after its step: the step at which
+    it regrows, or until if that comes first. The steps it sleeps through
+    would only count down, so they are counted down now.
+    """
+    steps = patch.model.schedule.steps
+    wake = steps + 1 + max(math.ceil(patch.countdown), 0)
+    if until is not None and until < wake:
+        wake = until
+    patch.countdown -= wake - steps - 1
+    return wake
+
+def recovery_wait(u, p=0.005):
+    """
+    Number of steps, from 0, before the first success of a draw with
+    probability p made every step, sampled from one uniform draw u.
+    """
+    return int(math.log1p(-u) / math.log1p(-p))
+
 class Sheep(RandomWalker):
     """
     A sheep that walks around, reproduces (asexually) and gets eaten.
@@ -12,10 +34,11 @@ class Sheep(RandomWalker):
     The init is the same as the RandomWalker.
     """
 
-    energy = None
-    sex = None
-    stuck = None
-    para = None
+    __slots__ = ("energy", "_sex", "_stuck", "_para")
+
+    sex = TrackedAttribute()
+    stuck = TrackedAttribute()
+    para = TrackedAttribute()
 
     def __init__(self, unique_id, pos, model, moore, energy=None,\
                   sex=None, stuck=None, para=None):
@@ -37,20 +60,13 @@ class Sheep(RandomWalker):
                 self.energy -= 1
             else: self.energy -= 0.8
 
-            if self.stuck and living:
-                this_cell = self.model.grid.get_cell_list_contents([self.pos])
-                try:
-                    resource_patch = next(obj for obj in this_cell if isinstance(obj, GrassPatch))
-                except StopIteration:
-                    judge1 = False
-                else:
-                    judge1 = resource_patch.fully_grown
-                try:
-                    resource_patch2 = next(obj for obj in this_cell if isinstance(obj, GrassPatch2))
-                except StopIteration:
-                    judge2 = False
-                else:
-                    judge2 = resource_patch2.fully_grown
+            if self.model.resource_field is not None:
+                self._graze_field(self.model.resource_field)
+            elif self.stuck and living:
+                resource_patch = self.model.grid.get_first(self.pos, GrassPatch)
+                judge1 = resource_patch is not None and resource_patch.fully_grown
+                resource_patch2 = self.model.grid.get_first(self.pos, GrassPatch2)
+                judge2 = resource_patch2 is not None and resource_patch2.fully_grown
                 if judge1 or judge2:
                     self.energy += self.model.sheep_gain_from_food / 3
                 else:
@@ -58,25 +74,12 @@ class Sheep(RandomWalker):
             else:
                 self.random_move()
             # If there is resource available, parasite it
-                this_cell = self.model.grid.get_cell_list_contents([self.pos])
-                try:
-                    resource_patch = next(obj for obj in this_cell if isinstance(obj, GrassPatch))
-                except StopIteration:
-                    judge1 = False
-                else:
-                    judge1 = resource_patch.fully_grown
-                try:
-                    resource_patch2 = next(obj for obj in this_cell if isinstance(obj, GrassPatch2))
-                except StopIteration:
-                    judge2 = False
-                else:
-                    judge2 = resource_patch2.fully_grown
-                try:
-                    competer = next(obj for obj in this_cell if isinstance(obj, Sheep))
-                except StopIteration:
-                    judge3 = False
-                else:
-                    judge3 = competer.stuck
+                resource_patch = self.model.grid.get_first(self.pos, GrassPatch)
+                judge1 = resource_patch is not None and resource_patch.fully_grown
+                resource_patch2 = self.model.grid.get_first(self.pos, GrassPatch2)
+                judge2 = resource_patch2 is not None and resource_patch2.fully_grown
+                competer = self.model.grid.get_first(self.pos, Sheep)
+                judge3 = competer is not None and competer.stuck
                 if judge1:
                     if judge3:
                         resource_patch.fully_grown = False
@@ -84,9 +87,9 @@ class Sheep(RandomWalker):
                     else:
                         self.stuck = True
                         self.energy += self.model.sheep_gain_from_food /3
-                        if self.para and self.random.random() < 1:
+                        if self.para and self.model.streams.infection() < 1:
                             resource_patch.para = True
-                        elif resource_patch.para and self.random.random() < 1:
+                        elif resource_patch.para and self.model.streams.infection() < 1:
                             self.para = True
                             
                 elif judge2:
@@ -96,46 +99,69 @@ class Sheep(RandomWalker):
                     else:
                         self.stuck = True
                         self.energy += self.model.sheep_gain_from_food /3
-                        if self.para and self.random.random() < 1:
+                        if self.para and self.model.streams.infection() < 1:
                             resource_patch2.para = True
-                        elif resource_patch2.para and self.random.random() < 1:
+                        elif resource_patch2.para and self.model.streams.infection() < 1:
                             self.para = True
 
 
             # Death
             if self.energy < 0:
-                self.model.grid.remove_agent(self)
-                self.model.schedule.remove(self)
+                self.model.lifecycle.kill(self)
                 living = False
             
             # Caught by human
-            if living and self.random.random() < 0.01:
-                self.model.grid.remove_agent(self)
-                self.model.schedule.remove(self)
+            if living and self.model.streams.capture() < 0.01:
+                self.model.lifecycle.kill(self)
                 living = False
             
             # Recover
-            if living and self.random.random() < 0.05:
+            if living and self.model.streams.recovery() < 0.05:
                 self.para = False
             
             reproduce = (-4 * (self.model.rate - 0.5) * (self.model.rate - 0.5) + 1) * self.model.sheep_reproduce
-            if living and self.random.random() < reproduce:
+            if living and self.model.streams.reproduce() < reproduce:
                 # Create a new sheep:
                 if self.model.resource1 or self.model.resource2:
                     self.energy /= 2
-                next_moves = self.model.grid.get_neighborhood(self.pos, self.moore, True)
-                next_move = self.random.choice(next_moves)
+                # The lamb is placed in its parent's cell
+                self.model.streams.legacy_neighbor_draw(self.model.grid, self.pos, self.moore)
                 #if self.random.random() < logistic(-0.02 * (self.model.resource1 + self.model.resource2) / self.model.sheep_num + 1.27) :
-                if self.random.random() < 0.5:
-                    lamb = Sheep(
-                        self.model.next_id(), next_move, self.model, self.moore, self.energy, 'Male'
-                    , False, False)
+                if self.model.streams.offspring_sex() < 0.5:
+                    self.model.lifecycle.spawn(
+                        Sheep, self.pos, self.moore, self.energy, 'Male', False, False
+                    )
                 else: 
-                    lamb = Sheep(
-                        self.model.next_id(), next_move, self.model, self.moore, self.energy, 'Female'
-                    , False, False)
-                self.model.grid.place_agent(lamb, self.pos)
-                self.model.schedule.add(lamb)
+                    self.model.lifecycle.spawn(
+                        Sheep, self.pos, self.moore, self.energy, 'Female', False, False
+                    )
+
+    def _graze_field(self, field):
+        """
+        The stuck/feeding part of step(), reading the resource patches from
+        the model's ResourceField instead of the agents in this cell.
+        """
+        if self.stuck:
+            if field.fully_grown[self.pos]:
+                self.energy += self.model.sheep_gain_from_food / 3
+            else:
+                self.stuck = False
+            return
+
+        self.random_move()
+        if not field.fully_grown[self.pos]:
+            return
+        competer = self.model.grid.get_first(self.pos, Sheep)
+        if competer.stuck:
+            field.fully_grown[self.pos] = False
+            competer.stuck = False
+        else:
+            self.stuck = True
+            self.energy += self.model.sheep_gain_from_food /3
+            if self.para and self.model.streams.infection() < 1:
+                field.para[self.pos] = True
+            elif field.para[self.pos] and self.model.streams.infection() < 1:
+                self.para = True
 
 class Sheep2(RandomWalker):
     """
@@ -144,8 +170,9 @@ class Sheep2(RandomWalker):
     The init is the same as the RandomWalker.
     """
 
-    energy = None
-    para = None
+    __slots__ = ("energy", "_para")
+
+    para = TrackedAttribute()
     def __init__(self, unique_id, pos, model, moore, energy=None, para=None):
         super().__init__(unique_id, pos, model, moore=moore)
         self.energy = energy
@@ -162,40 +189,35 @@ class Sheep2(RandomWalker):
         if self.model.resource1 or self.model.resource2:
             self.energy -= 1
             # If there is resource available, eat it
-            this_cell = self.model.grid.get_cell_list_contents([self.pos])
-            try:
-                resource_patch = next(obj for obj in this_cell if isinstance(obj, GrassPatch2))
-            except StopIteration:
-                judge1 = False
+            field = self.model.resource_field
+            if field is not None:
+                if field.kind[self.pos] == GRASS2 and field.fully_grown[self.pos]:
+                    self.energy += self.model.sheep_gain_from_food * 1.5
+                    self.para = bool(field.para[self.pos])
+                    field.fully_grown[self.pos] = False
             else:
-                judge1 = resource_patch.fully_grown
-            if judge1:
-                self.energy += self.model.sheep_gain_from_food * 1.5
-                self.para = resource_patch.para
-                resource_patch.fully_grown = False
+                resource_patch = self.model.grid.get_first(self.pos, GrassPatch2)
+                judge1 = resource_patch is not None and resource_patch.fully_grown
+                if judge1:
+                    self.energy += self.model.sheep_gain_from_food * 1.5
+                    self.para = resource_patch.para
+                    resource_patch.fully_grown = False
 
             # Death
             if self.energy < 0:
-                self.model.grid.remove_agent(self)
-                self.model.schedule.remove(self)
+                self.model.lifecycle.kill(self)
                 living = False
                 
         reproduce = self.model.sheep_reproduce 
-        if living and self.random.random() < reproduce * 1.2:
+        if living and self.model.streams.reproduce() < reproduce * 1.2:
             # Create a new sheep:
             if self.model.resource1 or self.model.resource2:
                 self.energy /= 2
             #if self.random.random() < logistic(-0.02 * self.model.resource / self.model.sheep_num + 1.27) :
-            if self.random.random() < 0.5:
-                lamb = Sheep2(
-                    self.model.next_id(), self.pos, self.model, self.moore, self.energy
-                )
+            if self.model.streams.offspring_sex() < 0.5:
+                self.model.lifecycle.spawn(Sheep2, self.pos, self.moore, self.energy)
             else: 
-                lamb = Sheep2(
-                    self.model.next_id(), self.pos, self.model, self.moore, self.energy, False
-                )
-            self.model.grid.place_agent(lamb, self.pos)
-            self.model.schedule.add(lamb)
+                self.model.lifecycle.spawn(Sheep2, self.pos, self.moore, self.energy, False)
 
 
 class Wolf(RandomWalker):
@@ -203,8 +225,9 @@ class Wolf(RandomWalker):
     A wolf that walks around, reproduces (asexually) and eats sheep.
     """
 
-    energy = None
-    para = None
+    __slots__ = ("energy", "_para")
+
+    para = TrackedAttribute()
     def __init__(self, unique_id, pos, model, moore, energy=None, para=None):
         super().__init__(unique_id, pos, model, moore=moore)
         self.energy = energy
@@ -216,80 +239,69 @@ class Wolf(RandomWalker):
 
         # If there are sheep present, eat one
         x, y = self.pos
-        this_cell = self.model.grid.get_cell_list_contents([self.pos])
-        sheep = [obj for obj in this_cell if isinstance(obj, Sheep)]
-        sheep2 = [obj for obj in this_cell if isinstance(obj, Sheep2)]
+        sheep = self.model.grid.get_of_type(self.pos, Sheep)
+        sheep2 = self.model.grid.get_of_type(self.pos, Sheep2)
         if len(sheep) > 0 and len(sheep2) == 0:
             sheep_to_eat = self.random.choice(sheep)
-            if sheep_to_eat.sex == 'Male' and self.random.random() < 0.8:
+            if sheep_to_eat.sex == 'Male' and self.model.streams.selectivity() < 0.8:
                 self.energy += self.model.wolf_gain_from_food
                 # Kill the sheep
                 if sheep_to_eat.para:
                     self.para = True
-                self.model.grid.remove_agent(sheep_to_eat)
-                self.model.schedule.remove(sheep_to_eat)
+                self.model.lifecycle.kill(sheep_to_eat)
             elif sheep_to_eat.sex == 'Female' :
                 self.energy += self.model.wolf_gain_from_food
                 # Kill the sheep
                 if sheep_to_eat.para:
                     self.para = True
-                self.model.grid.remove_agent(sheep_to_eat)
-                self.model.schedule.remove(sheep_to_eat)
+                self.model.lifecycle.kill(sheep_to_eat)
         elif len(sheep2) > 0 and len(sheep) == 0:
             sheep_to_eat = self.random.choice(sheep2)
             self.energy += self.model.wolf_gain_from_food
             # Kill the sheep
             if sheep_to_eat.para:
                 self.para = True
-            self.model.grid.remove_agent(sheep_to_eat)
-            self.model.schedule.remove(sheep_to_eat)
+            self.model.lifecycle.kill(sheep_to_eat)
         elif len(sheep2) > 0 and len(sheep) > 0:
-            if self.random.random() < (len(sheep) / (len(sheep) + len(sheep2))):
+            if self.model.streams.selectivity() < (len(sheep) / (len(sheep) + len(sheep2))):
                 sheep_to_eat = self.random.choice(sheep)
-                if sheep_to_eat.sex == 'Male' and self.random.random() < 0.8:
+                if sheep_to_eat.sex == 'Male' and self.model.streams.selectivity() < 0.8:
                     self.energy += self.model.wolf_gain_from_food
                     # Kill the sheep
                     if sheep_to_eat.para:
                         self.para = True
-                    self.model.grid.remove_agent(sheep_to_eat)
-                    self.model.schedule.remove(sheep_to_eat)
+                    self.model.lifecycle.kill(sheep_to_eat)
                 elif sheep_to_eat.sex == 'Female' :
                     self.energy += self.model.wolf_gain_from_food
                     # Kill the sheep
                     if sheep_to_eat.para:
                         self.para = True
-                    self.model.grid.remove_agent(sheep_to_eat)
-                    self.model.schedule.remove(sheep_to_eat)
+                    self.model.lifecycle.kill(sheep_to_eat)
             else:
                 sheep_to_eat = self.random.choice(sheep2)
                 self.energy += self.model.wolf_gain_from_food
                 # Kill the sheep
                 if sheep_to_eat.para:
                     self.para = True
-                self.model.grid.remove_agent(sheep_to_eat)
-                self.model.schedule.remove(sheep_to_eat)
+                self.model.lifecycle.kill(sheep_to_eat)
 
         # Death or reproduction
         if self.energy < 0:
-            self.model.grid.remove_agent(self)
-            self.model.schedule.remove(self)
+            self.model.lifecycle.kill(self)
         else:
-            if self.random.random() < self.model.wolf_reproduce:
+            if self.model.streams.reproduce() < self.model.wolf_reproduce:
                 # Create a new wolf cub
                 self.energy /= 2
-                cub = Wolf(
-                    self.model.next_id(), self.pos, self.model, self.moore, self.energy, False
-                )
-                self.model.grid.place_agent(cub, cub.pos)
-                self.model.schedule.add(cub)
+                self.model.lifecycle.spawn(Wolf, self.pos, self.moore, self.energy, False)
 
 class Wolf2(RandomWalker):
     """
     A wolf that walks around, reproduces (asexually) and eats sheep.
     """
 
-    energy = None
-    para = None
+    __slots__ = ("energy", "_para")
+
+    para = TrackedAttribute()
     def __init__(self, unique_id, pos, model, moore, energy=None, para=None):
         super().__init__(unique_id, pos, model, moore=moore)
         self.energy = energy
@@ -301,38 +313,30 @@ class Wolf2(RandomWalker):
 
         # If there are sheep present, eat one
         x, y = self.pos
-        this_cell = self.model.grid.get_cell_list_contents([self.pos])
-        sheep = [obj for obj in this_cell if isinstance(obj, Sheep)]
-        this_cell = self.model.grid.get_cell_list_contents([self.pos])
-        try:
-            resource_patch = next(obj for obj in this_cell if isinstance(obj, GrassPatch))
-        except StopIteration:
-            judge1 = False
-        else:
-            judge1 = resource_patch.fully_grown
-        try:
-            resource_patch2 = next(obj for obj in this_cell if isinstance(obj, GrassPatch2))
-        except StopIteration:
-            judge2 = False
-        else:
-            judge2 = resource_patch2.fully_grown
+        sheep = self.model.grid.get_of_type(self.pos, Sheep)
+        field = self.model.resource_field
+        if field is None:
+            resource_patch = self.model.grid.get_first(self.pos, GrassPatch)
+            judge1 = resource_patch is not None and resource_patch.fully_grown
+            resource_patch2 = self.model.grid.get_first(self.pos, GrassPatch2)
+            judge2 = resource_patch2 is not None and resource_patch2.fully_grown
         if len(sheep) > 0:
             sheep_to_eat = self.random.choice(sheep)
-            if sheep_to_eat.sex == 'Male' and self.random.random() < 0.8:
+            if sheep_to_eat.sex == 'Male' and self.model.streams.selectivity() < 0.8:
                 self.energy += self.model.wolf_gain_from_food * 0.8
                 # Kill the sheep
                 if sheep_to_eat.para:
                     self.para = True
-                self.model.grid.remove_agent(sheep_to_eat)
-                self.model.schedule.remove(sheep_to_eat)
+                self.model.lifecycle.kill(sheep_to_eat)
             elif sheep_to_eat.sex == 'Female' :
                 self.energy += self.model.wolf_gain_from_food * 0.8
                 # Kill the sheep
                 if sheep_to_eat.para:
                     self.para = True
-                self.model.grid.remove_agent(sheep_to_eat)
-                self.model.schedule.remove(sheep_to_eat)
-        if judge1:
+                self.model.lifecycle.kill(sheep_to_eat)
+        if field is not None:
+            self._graze_field(field)
+        elif judge1:
             resource_patch.fully_grown = False
             if resource_patch.para:
                     self.para = True
@@ -344,23 +348,37 @@ class Wolf2(RandomWalker):
             self.energy += self.model.sheep_gain_from_food * 0.2
         # Death or reproduction
         if self.energy < 0:
-            self.model.grid.remove_agent(self)
-            self.model.schedule.remove(self)
+            self.model.lifecycle.kill(self)
         else:
-            if self.random.random() < self.model.wolf_reproduce:
+            if self.model.streams.reproduce() < self.model.wolf_reproduce:
                 # Create a new wolf cub
                 self.energy /= 2
-                cub = Wolf2(
-                    self.model.next_id(), self.pos, self.model, self.moore, self.energy, False
-                )
-                self.model.grid.place_agent(cub, cub.pos)
-                self.model.schedule.add(cub)
+                self.model.lifecycle.spawn(Wolf2, self.pos, self.moore, self.energy, False)
+
+    def _graze_field(self, field):
+        """
+        Eat the resource patch in this cell, if grown, straight from the
+        model's ResourceField.
+        """
+        if not field.fully_grown[self.pos]:
+            return
+        field.fully_grown[self.pos] = False
+        if field.para[self.pos]:
+            self.para = True
+        if field.kind[self.pos] == GRASS:
+            self.energy += self.model.sheep_gain_from_food * 0.3
+        else:
+            self.energy += self.model.sheep_gain_from_food * 0.2
 
 class GrassPatch(mesa.Agent):
     """
     A patch of resource that grows at a fixed rate and it is eaten by sheep
     """
-    para = None
+
+    __slots__ = ("unique_id", "model", "pos", "countdown", "_fully_grown", "_para")
+
+    fully_grown = TrackedAttribute()
+    para = TrackedAttribute()
     def __init__(self, unique_id, pos, model, fully_grown, countdown, para=None):
         """
         Creates a new patch of resource
@@ -384,13 +402,27 @@ class GrassPatch(mesa.Agent):
             else:
                 self.countdown -= 1
 
+    def next_activation(self):
+        """
+        When the scheduler steps patches on demand: at the step of regrowth
+        while regrowing, not at all once grown.
+        """
+        if self.fully_grown:
+            return None
+        return count_down_asleep(self)
+
 
 class GrassPatch2(mesa.Agent):
     """
     A patch of resource that grows at a fixed rate and it is eaten by sheep
     """
 
-    para = None
+    __slots__ = (
+        "unique_id", "model", "pos", "countdown", "recover_at", "_fully_grown", "_para"
+    )
+
+    fully_grown = TrackedAttribute()
+    para = TrackedAttribute()
     def __init__(self, unique_id, pos, model, fully_grown, countdown, para=None):
         """
         Creates a new patch of resource
@@ -404,6 +436,7 @@ class GrassPatch2(mesa.Agent):
         self.countdown = countdown
         self.pos = pos
         self.para = para
+        self.recover_at = None
 
     def step(self):
         if not self.fully_grown:
@@ -414,6 +447,30 @@ class GrassPatch2(mesa.Agent):
             else:
                 self.countdown -= 1
         # Recover
-        if self.random.random() < 0.005:
+        if self.model.active_patches:
+            # The step of recovery is drawn once, when the patch is first
+            # seen infected, so that a grown patch can sleep until then
+            steps = self.model.schedule.steps
+            if not self.para:
+                self.recover_at = None
+            else:
+                if self.recover_at is None:
+                    self.recover_at = steps + recovery_wait(self.model.streams.patch_recovery())
+                if steps >= self.recover_at:
+                    self.para = False
+                    self.recover_at = None
+        elif self.model.streams.patch_recovery() < 0.005:
             self.para = False
 
+    def next_activation(self):
+        """
+        When the scheduler steps patches on demand: at the step of regrowth
+        or of recovery, whichever comes first, and not at all while grown and
+        healthy.
+        """
+        if not self.fully_grown:
+            return count_down_asleep(self, self.recover_at if self.para else None)
+        if self.para:
+            return self.recover_at
+        return None
+
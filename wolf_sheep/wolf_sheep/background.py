@@ -0,0 +1,253 @@
+"""
+Background simulation server
+================================
+
+In mesa's ModularServer the model only steps when the browser asks for the
+next frame, so a run goes as fast as the render round trips allow.
+BackgroundServer instead steps the model continuously in a worker thread,
+at full speed, and answers each frame request of the browser with the
+latest state: the frames in between are skipped. Charts use
+BatchChartModule, which sends every step collected since the previous frame
+in one batch, so no chart point is lost. Websocket messages are compressed
+(permessage-deflate).
+
+The model is only touched by the worker thread: frames are rendered there,
+between two steps. The worker pauses when no frame has been requested for
+idle_timeout seconds (the Stop button of the page stops requesting frames),
+and when the model stops running. The Step button shows the next frame, but
+the model goes on stepping until the worker pauses.
+
+If a step raises, the worker stops stepping and every frame request fails
+with the exception; the page is sent "end", as for a model that stopped
+running, and Reset starts a new simulation.
+
+Example:
+>>> server = BackgroundServer(
+...     WolfSheep, [canvas_element, BatchChartModule(series)], "Wolf Sheep", model_params
+... )
+>>> server.launch()
+"""
+
+import asyncio
+import concurrent.futures
+import functools
+import json
+import queue
+import threading
+import time
+import traceback
+
+import mesa
+import tornado.escape
+import tornado.web
+from mesa_viz_tornado.ModularVisualization import SocketHandler
+
+from .canvas import RESOURCES, DeltaSocketHandler
+
+DEFAULT_IDLE_TIMEOUT = 2.0
+
+
+class BackgroundSimulation:
+    """
+    Steps model in a daemon thread while frames keep being requested, and
+    runs the frame requests between two steps.
+
+    Args:
+        model: The model to step
+        idle_timeout: Seconds after the last frame request after which the
+                      worker pauses
+
+    Attributes:
+        error: The exception raised by model.step(), if one was; the model
+               is not stepped any more and requests fail with it.
+    """
+
+    def __init__(self, model, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        self.model = model
+        self.idle_timeout = idle_timeout
+        self.steps = 0
+        self.error = None
+        self._requests = queue.Queue()
+        self._last_request = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _stepping(self):
+        return (
+            self.model.running
+            and self.error is None
+            and self._last_request is not None
+            and time.monotonic() - self._last_request < self.idle_timeout
+        )
+
+    def _run(self):
+        while not self._closed:
+            stepping = self._stepping()
+            try:
+                # Between steps, only look for a request; while paused, wait
+                # for one (with a timeout, to notice close())
+                function, future = self._requests.get(block=not stepping, timeout=0.1)
+            except queue.Empty:
+                if stepping:
+                    try:
+                        self.model.step()
+                    except Exception as exception:
+                        self.error = exception
+                        self.model.running = False
+                    else:
+                        self.steps += 1
+                continue
+            if not future.set_running_or_notify_cancel():
+                continue
+            if self.error is not None:
+                future.set_exception(self.error)
+                continue
+            try:
+                future.set_result(function(self.model))
+            except BaseException as exception:
+                future.set_exception(exception)
+
+    def request(self, function):
+        """
+        Returns a concurrent.futures.Future of function(model), called by the
+        worker between two steps. Also keeps (or starts) the worker stepping.
+        Once a step has raised, the future fails with its exception.
+        """
+        self._last_request = time.monotonic()
+        future = concurrent.futures.Future()
+        self._requests.put((function, future))
+        return future
+
+    def close(self):
+        """
+        Stop the worker, after the step it is making, and cancel the
+        requests it has not run.
+        """
+        self._closed = True
+        self._thread.join()
+        while not self._requests.empty():
+            _, future = self._requests.get()
+            future.cancel()
+
+
+class BatchChartModule(mesa.visualization.ChartModule):
+    """
+    A ChartModule that sends, with each frame, the values of every step
+    collected since the previous frame, as
+    {"start": first step, "values": [[values of the series], ...]} (one list
+    per series, in the order of series). Takes the arguments of ChartModule.
+
+    Like DeltaCanvasGrid, it keeps what was sent per connection (client),
+    when served through a DeltaSocketHandler.
+    """
+
+    local_includes = ["BatchChartModule.js"]
+    local_dir = RESOURCES
+
+    def __init__(
+        self, series, canvas_height=200, canvas_width=500, data_collector_name="datacollector"
+    ):
+        super().__init__(series, canvas_height, canvas_width, data_collector_name)
+        self.js_code = "elements.push(new BatchChartModule({}, {}, {}));".format(
+            json.dumps(self.series), canvas_width, canvas_height
+        )
+        self.client = None
+        # Client -> (model, number of steps sent)
+        self._clients = {}
+
+    def forget(self, client):
+        """
+        Drop the state of client, a closed connection.
+        """
+        self._clients.pop(client, None)
+
+    def render(self, model):
+        sent_model, start = self._clients.get(self.client, (None, 0))
+        if model is not sent_model:
+            start = 0
+        model_vars = getattr(model, self.data_collector_name).model_vars
+        values = [list(model_vars.get(s["Label"], ())[start:]) for s in self.series]
+        sent = start + max((len(series) for series in values), default=0)
+        self._clients[self.client] = (model, sent)
+        return {"start": start, "values": values}
+
+
+class BackgroundSocketHandler(DeltaSocketHandler):
+    """
+    The websocket handler of BackgroundServer: frames come from the
+    worker, rendered for this connection, and messages are compressed.
+    """
+
+    def get_compression_options(self):
+        # Enable permessage-deflate with the default settings
+        return {}
+
+    async def _send_frame(self):
+        application = self.application
+        render = functools.partial(self.render_for_client, application.render_frame)
+        try:
+            frame = await asyncio.wrap_future(application.simulation.request(render))
+        except Exception:
+            # The model failed: end the run, which Reset can start again
+            traceback.print_exc()
+            frame = None
+        if frame is None:
+            self.write_message({"type": "end"})
+        else:
+            self.write_message({"type": "viz_state", "data": frame})
+
+    async def on_message(self, message):
+        msg = tornado.escape.json_decode(message)
+        if msg["type"] == "get_step":
+            await self._send_frame()
+        elif msg["type"] == "reset":
+            self.application.reset_model()
+            await self._send_frame()
+        else:
+            super().on_message(message)
+
+
+class _BackgroundRoutes(tornado.web.Application):
+    # Comes right after ModularServer in the MRO of BackgroundServer, so it
+    # receives the handlers ModularServer builds and swaps the websocket's
+    def __init__(self, handlers, **settings):
+        handlers = [
+            (handler[0], BackgroundSocketHandler) + tuple(handler[2:])
+            if handler[1] is SocketHandler
+            else handler
+            for handler in handlers
+        ]
+        super().__init__(handlers, **settings)
+
+
+class BackgroundServer(mesa.visualization.ModularServer, _BackgroundRoutes):
+    """
+    A ModularServer whose model runs continuously in a
+    BackgroundSimulation, see the module docstring. Takes the arguments of
+    ModularServer, and idle_timeout.
+    """
+
+    def __init__(self, *args, idle_timeout=DEFAULT_IDLE_TIMEOUT, **kwargs):
+        self.idle_timeout = idle_timeout
+        self.simulation = None
+        super().__init__(*args, **kwargs)
+
+    def reset_model(self):
+        if self.simulation is not None:
+            self.simulation.close()
+        super().reset_model()
+        self.simulation = BackgroundSimulation(self.model, self.idle_timeout)
+        self._final_frame_sent = False
+
+    def render_frame(self, model):
+        """
+        Render the visualization elements, or return None once the model has
+        stopped running and its last frame has been sent. Called by the
+        worker.
+        """
+        if not model.running:
+            if self._final_frame_sent:
+                return None
+            self._final_frame_sent = True
+        return self.render_model()
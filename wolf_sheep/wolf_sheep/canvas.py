@@ -0,0 +1,237 @@
+"""
+Delta-encoded canvas grid
+================================
+
+A drop-in alternative to mesa.visualization.CanvasGrid that sends the
+browser only the cells whose portrayal changed since the previous frame,
+instead of the portrayal of every agent on the grid.
+
+Frames are encoded compactly:
+
+- every distinct portrayal style (shape, colors, size, layer...) is sent
+  once, with a number, in "styles", and cells refer to it by that number;
+- a cell is sent as [x, y, items], with one item per agent in layer order:
+  the style number, or [style number, text] for portrayals with a "text";
+  a cell that has become empty has no items.
+
+A keyframe, which redraws the whole grid and resends the styles in use, is
+sent for the first frame of every model and every keyframe_interval frames.
+
+What was sent is kept per connection: served by a DeltaModularServer (or a
+server whose websocket handler is a DeltaSocketHandler), every page gets
+the changes since its own previous frame, and a page that connects gets a
+keyframe. With mesa's SocketHandler, all the pages share one state, and a
+page only sees the changes since the last frame of any page.
+
+On a TypedMultiGrid, only the cells recorded in its changed_cells (agents
+placed, removed or moved, TrackedAttributes changed) and the cells of the
+agents of volatile_types, whose portrayal can change without any of those
+(e.g. a Wolf showing its energy), are portrayed again, so the server's work
+per frame also scales with the changes. On other grids every cell is
+portrayed and only the sending is saved.
+
+Example:
+>>> canvas_element = DeltaCanvasGrid(
+...     wolf_sheep_portrayal, 20, 20, 500, 500, volatile_types=(Wolf,)
+... )
+>>> server = DeltaModularServer(WolfSheep, [canvas_element], "Wolf Sheep", model_params)
+"""
+
+import json
+import os
+
+import mesa
+import tornado.web
+from mesa.visualization import VisualizationElement
+from mesa_viz_tornado.ModularVisualization import SocketHandler
+
+RESOURCES = os.path.join(os.path.dirname(__file__), "resources")
+
+
+class _ClientState:
+    # What a DeltaCanvasGrid has sent to one connection
+    __slots__ = ("model", "frame", "styles", "sent", "changed")
+
+    def __init__(self, model):
+        self.model = model
+        self.frame = 0
+        # Style key -> number, the items last sent for each cell, and the
+        # cells changed since the last frame
+        self.styles = {}
+        self.sent = {}
+        self.changed = set()
+
+
+class DeltaCanvasGrid(VisualizationElement):
+    """
+    Canvas grid element that sends the changed cells only, see the module
+    docstring. Portrayals are those of CanvasGrid.
+
+    Args:
+        portrayal_method: Function that returns the portrayal of an agent,
+                          or None
+        grid_width, grid_height: Size of the grid, in cells
+        canvas_width, canvas_height: Size of the canvas, in pixels
+        volatile_types: Agent types whose cells are portrayed every frame
+        keyframe_interval: Number of frames from one keyframe to the next
+
+    client is the connection the next render is for (set by
+    DeltaSocketHandler, None otherwise), and forget(client) drops what was
+    sent to a closed one.
+    """
+
+    package_includes = ["GridDraw.js"]
+    local_includes = ["DeltaCanvasModule.js"]
+    local_dir = RESOURCES
+
+    def __init__(
+        self,
+        portrayal_method,
+        grid_width,
+        grid_height,
+        canvas_width=500,
+        canvas_height=500,
+        volatile_types=(),
+        keyframe_interval=100,
+    ):
+        super().__init__()
+        self.portrayal_method = portrayal_method
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        self.canvas_width = canvas_width
+        self.canvas_height = canvas_height
+        self.volatile_types = tuple(volatile_types)
+        self.keyframe_interval = keyframe_interval
+        self.js_code = "elements.push(new DeltaCanvasModule({}, {}, {}, {}));".format(
+            canvas_width, canvas_height, grid_width, grid_height
+        )
+        self.client = None
+        self._clients = {}
+
+    def forget(self, client):
+        """
+        Drop the state of client, a closed connection.
+        """
+        self._clients.pop(client, None)
+
+    def _encode(self, grid, pos, styles, new_styles):
+        """
+        The items of the cell at pos, adding the styles not in styles yet to
+        both.
+        """
+        portrayals = []
+        for agent in grid.get_cell_list_contents([pos]):
+            portrayal = self.portrayal_method(agent)
+            if portrayal:
+                portrayals.append(portrayal)
+        portrayals.sort(key=lambda portrayal: portrayal.get("Layer", 0))
+        items = []
+        for portrayal in portrayals:
+            text = portrayal.pop("text", None)
+            key = json.dumps(portrayal, sort_keys=True)
+            style = styles.get(key)
+            if style is None:
+                style = styles[key] = len(styles)
+                new_styles[style] = portrayal
+            items.append(style if text is None else [style, text])
+        return items
+
+    def _candidate_cells(self, model, state, keyframe):
+        grid = model.grid
+        tracking = getattr(grid, "changed_cells", None) is not None
+        if tracking:
+            # The grid's changes are popped once, for every connection
+            changes = grid.pop_changed_cells()
+            for other in list(self._clients.values()):
+                if other.model is model:
+                    other.changed |= changes
+        elif hasattr(grid, "track_changes"):
+            grid.track_changes()
+        if keyframe or not tracking:
+            state.changed = set()
+            return [(x, y) for x in range(grid.width) for y in range(grid.height)]
+        cells, state.changed = state.changed, set()
+        for agent_type in self.volatile_types:
+            for agent in model.schedule.get_agents_of_type(agent_type):
+                if agent.pos is not None:
+                    cells.add(agent.pos)
+        return cells
+
+    def render(self, model):
+        state = self._clients.get(self.client)
+        if state is None or state.model is not model:
+            state = self._clients[self.client] = _ClientState(model)
+        keyframe = state.frame % self.keyframe_interval == 0
+        state.frame += 1
+        if keyframe:
+            state.styles = {}
+            state.sent = {}
+        sent = state.sent
+        new_styles = {}
+        cells = []
+        for pos in self._candidate_cells(model, state, keyframe):
+            items = self._encode(model.grid, pos, state.styles, new_styles)
+            if items == sent.get(pos, []):
+                continue
+            if items:
+                sent[pos] = items
+            else:
+                sent.pop(pos, None)
+            cells.append([pos[0], pos[1], items])
+        return {"keyframe": keyframe, "styles": new_styles, "cells": cells}
+
+
+class DeltaSocketHandler(SocketHandler):
+    """
+    A websocket handler that renders the elements with per-connection state
+    (those with a client attribute, e.g. DeltaCanvasGrid) for its own
+    connection.
+    """
+
+    def render_for_client(self, function, *args):
+        """
+        Returns function(*args), a render of the visualization elements, made
+        for this connection.
+        """
+        elements = [
+            element
+            for element in self.application.visualization_elements
+            if hasattr(element, "client")
+        ]
+        for element in elements:
+            element.client = self
+        try:
+            return function(*args)
+        finally:
+            for element in elements:
+                element.client = None
+
+    @property
+    def viz_state_message(self):
+        return {"type": "viz_state", "data": self.render_for_client(self.application.render_model)}
+
+    def on_close(self):
+        for element in self.application.visualization_elements:
+            forget = getattr(element, "forget", None)
+            if forget is not None:
+                forget(self)
+
+
+class _DeltaRoutes(tornado.web.Application):
+    # Comes right after ModularServer in the MRO of DeltaModularServer, so it
+    # receives the handlers ModularServer builds and swaps the websocket's
+    def __init__(self, handlers, **settings):
+        handlers = [
+            (handler[0], DeltaSocketHandler) + tuple(handler[2:])
+            if handler[1] is SocketHandler
+            else handler
+            for handler in handlers
+        ]
+        super().__init__(handlers, **settings)
+
+
+class DeltaModularServer(mesa.visualization.ModularServer, _DeltaRoutes):
+    """
+    A ModularServer whose pages each get their own DeltaCanvasGrid frames,
+    see the module docstring. Takes the arguments of ModularServer.
+    """
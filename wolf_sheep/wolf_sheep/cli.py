@@ -0,0 +1,174 @@
+"""
+Headless command-line runner
+================================
+
+Runs model2.WolfSheep (or VectorizedWolfSheep) for a number of steps and
+writes the collected model variables to a CSV or NPZ file, without starting
+the visualization server.
+
+mesa imports mesa_viz_tornado, networkx and pandas on import if they are
+installed, although a headless run needs none of them: they are only used by
+the visualization server, NetworkGrid and the DataCollector's dataframe
+methods. They make up most of the start-up time, so they are blocked before
+mesa is imported and the output is written with the csv module / NumPy.
+
+Usage:
+    python headless.py --steps 200 --seed 1 --resource1 true \\
+        --sheep-gain-from-food 5 --output run.csv
+    python headless.py --help
+"""
+
+import argparse
+import csv
+import inspect
+import sys
+import time
+import warnings
+
+_START = time.perf_counter()
+
+# Imported by mesa only when installed, and not needed to run a model
+BLOCKED_IMPORTS = ("mesa_viz_tornado", "networkx", "pandas")
+
+
+def block_optional_imports():
+    """
+    Make the optional imports of mesa fail (mesa ignores the ImportError), so
+    importing mesa does not load them. Has no effect on modules that have
+    already been imported.
+    """
+    for name in BLOCKED_IMPORTS:
+        sys.modules.setdefault(name, None)
+
+
+def _parse_bool(value):
+    if value.lower() in ("1", "true", "yes", "on"):
+        return True
+    if value.lower() in ("0", "false", "no", "off"):
+        return False
+    raise argparse.ArgumentTypeError(f"expected true or false, got {value!r}")
+
+
+def _parse_number(value):
+    # Keep whole numbers ints: some float parameters go into randrange
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+
+def model_parameters(model_cls):
+    """
+    The keyword parameters of model_cls, except seed, with their defaults.
+    """
+    signature = inspect.signature(model_cls.__init__)
+    return {
+        name: parameter.default
+        for name, parameter in signature.parameters.items()
+        if name not in ("self", "seed") and parameter.default is not parameter.empty
+    }
+
+
+def build_parser(parameters):
+    parser = argparse.ArgumentParser(
+        description="Run the Wolf-Sheep model without visualization and "
+        "write the collected data to a file."
+    )
+    parser.add_argument("--steps", type=int, default=200, help="number of steps (default: 200)")
+    parser.add_argument("--seed", type=int, default=None, help="random seed")
+    parser.add_argument(
+        "--output", "-o", default="-",
+        help="output file, .csv or .npz (default: CSV on standard output); "
+        "not used with --stream-to",
+    )
+    parser.add_argument(
+        "--vectorized", action="store_true",
+        help="use VectorizedWolfSheep instead of model2.WolfSheep",
+    )
+    parser.add_argument(
+        "--verbose", "-v", action="store_true",
+        help="print start-up and run times to standard error",
+    )
+    group = parser.add_argument_group("model parameters")
+    for name, default in parameters.items():
+        if isinstance(default, bool):
+            value_type = _parse_bool
+        elif default is None:
+            value_type = str
+        elif isinstance(default, int):
+            value_type = int
+        else:
+            value_type = _parse_number
+        group.add_argument(
+            "--" + name.replace("_", "-"), dest=name, type=value_type,
+            default=default, help=f"(default: {default})",
+        )
+    return parser
+
+
+def write_csv(model_vars, file):
+    names = list(model_vars)
+    writer = csv.writer(file, lineterminator="\n")
+    writer.writerow(["Step"] + names)
+    steps = len(model_vars[names[0]]) if names else 0
+    for step in range(steps):
+        writer.writerow([step] + [model_vars[name][step] for name in names])
+
+
+def write_npz(model_vars, path):
+    import numpy as np
+
+    steps = len(next(iter(model_vars.values()), []))
+    np.savez(path, Step=np.arange(steps), **{name: np.asarray(values) for name, values in model_vars.items()})
+
+
+def main(argv=None):
+    block_optional_imports()
+    # The agents are created with their position already set, so mesa warns
+    # about every place_agent call; one warning per agent is only noise here
+    warnings.filterwarnings("ignore", message=r"Agent \d+ is being placed with", category=UserWarning)
+    from .model2 import WolfSheep
+
+    parameters = model_parameters(WolfSheep)
+    args = build_parser(parameters).parse_args(argv)
+    if args.vectorized:
+        from .vectorized import VectorizedWolfSheep as model_cls
+    else:
+        model_cls = WolfSheep
+    accepted = model_parameters(model_cls)
+    kwargs = {name: getattr(args, name) for name in parameters if name in accepted}
+    startup = time.perf_counter() - _START
+
+    model = model_cls(**kwargs, seed=args.seed)
+    for _ in range(args.steps):
+        if not model.running:
+            break
+        model.step()
+    streaming = kwargs.get("stream_to") is not None
+    if streaming:
+        # Already on disk, but for the last chunk
+        model.datacollector.close()
+    if getattr(model, "profiler", None) is not None:
+        model.profiler.close()
+    if getattr(model, "recorder", None) is not None:
+        model.recorder.close()
+    run = time.perf_counter() - _START - startup
+
+    if not streaming:
+        model_vars = model.datacollector.model_vars
+        if args.output == "-":
+            write_csv(model_vars, sys.stdout)
+        elif args.output.endswith(".npz"):
+            write_npz(model_vars, args.output)
+        else:
+            with open(args.output, "w", newline="") as file:
+                write_csv(model_vars, file)
+    if getattr(model, "stop_reason", None) is not None:
+        print(f"stopped early: {model.stop_reason}", file=sys.stderr)
+    if args.verbose:
+        print(f"start-up {startup:.3f}s, run {run:.3f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,227 @@
+"""
+Streaming data collection
+================================
+
+A drop-in alternative to mesa.DataCollector for the model reporters of long
+runs: values are buffered in fixed-size typed NumPy arrays and every full
+buffer is written out as a chunk, so memory use does not grow with the
+number of steps.
+
+Two on-disk formats are supported:
+
+- a directory of NPZ files, one per chunk (chunk_000000.npz, ...), written
+  with NumPy only;
+- a Parquet file with one row group per chunk, if pyarrow is installed.
+
+Both can be read a chunk at a time, and a subset of the columns, with
+iter_chunks, or column by column with read_columns.
+
+Example:
+>>> collector = StreamingDataCollector(
+...     {"Wolves": lambda m: m.schedule.get_type_count(Wolf)}, "run.parquet"
+... )
+>>> collector.collect(model)
+>>> collector.close()
+>>> read_columns("run.parquet", ["Step", "Wolves"])
+"""
+
+import os
+import sys
+
+import mesa
+import numpy as np
+
+DEFAULT_CHUNK_SIZE = 4096
+
+
+def _pyarrow():
+    # Imported on first use: pyarrow is optional and slow to import
+    if "pandas" in sys.modules and sys.modules["pandas"] is None:
+        # Blocked by cli.block_optional_imports, which pyarrow can't handle
+        del sys.modules["pandas"]
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Parquet output requires pyarrow") from None
+    return pyarrow, pyarrow.parquet
+
+
+def _is_parquet(path):
+    return str(path).endswith(".parquet")
+
+
+class _NpzChunkWriter:
+    def __init__(self, path):
+        self.path = path
+        self.chunks = 0
+        os.makedirs(path, exist_ok=True)
+
+    def write(self, columns):
+        file_name = os.path.join(self.path, f"chunk_{self.chunks:06d}.npz")
+        np.savez(file_name, **columns)
+        self.chunks += 1
+
+    def close(self):
+        pass
+
+
+class _ParquetWriter:
+    def __init__(self, path):
+        self.pa, self.pq = _pyarrow()
+        self.path = path
+        self.writer = None
+
+    def write(self, columns):
+        table = self.pa.table(columns)
+        if self.writer is None:
+            self.writer = self.pq.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+class StreamingDataCollector:
+    """
+    Collects model reporters like mesa.DataCollector, but streams them to
+    disk in chunks of chunk_size steps instead of keeping them in lists.
+
+    The output has a "Step" column (the number of the collect call, from 0)
+    followed by one column per reporter. The type of each column is fixed by
+    its first value (bool, int64 or float64).
+
+    flush() writes out the steps collected so far; close() also finishes the
+    file, which a Parquet file needs before it can be read.
+
+    Args:
+        model_reporters: dict of column name -> function of the model, or
+                         name of a model attribute
+        path: a directory for NPZ chunks, or a file ending in .parquet
+        chunk_size: Number of steps per chunk
+    """
+
+    def __init__(self, model_reporters, path, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.model_reporters = dict(model_reporters)
+        self.path = path
+        self.chunk_size = chunk_size
+        self.steps = 0
+        self._buffers = None
+        self._rows = 0
+        if _is_parquet(path):
+            self._writer = _ParquetWriter(path)
+        else:
+            self._writer = _NpzChunkWriter(path)
+
+    def _values(self, model):
+        values = {}
+        for name, reporter in self.model_reporters.items():
+            if isinstance(reporter, str):
+                values[name] = getattr(model, reporter)
+            else:
+                values[name] = reporter(model)
+        return values
+
+    def collect(self, model):
+        """
+        Record the model reporters for the current step.
+        """
+        values = self._values(model)
+        if self._buffers is None:
+            self._buffers = {"Step": np.empty(self.chunk_size, dtype=np.int64)}
+            for name, value in values.items():
+                dtype = np.asarray(value).dtype
+                if dtype.kind in "iu":
+                    dtype = np.int64
+                elif dtype.kind != "b":
+                    dtype = np.float64
+                self._buffers[name] = np.empty(self.chunk_size, dtype=dtype)
+        row = self._rows
+        self._buffers["Step"][row] = self.steps
+        for name, value in values.items():
+            self._buffers[name][row] = value
+        self._rows += 1
+        self.steps += 1
+        if self._rows == self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Write out the steps buffered since the last chunk, if any.
+        """
+        if not self._rows:
+            return
+        rows = self._rows
+        self._writer.write({name: buffer[:rows] for name, buffer in self._buffers.items()})
+        self._rows = 0
+
+    def close(self):
+        """
+        Flush and finish the output. Nothing can be collected afterwards.
+        """
+        self.flush()
+        self._writer.close()
+
+    def __getstate__(self):
+        # Copies would write to the same file
+        raise TypeError(
+            "a StreamingDataCollector can't be pickled; snapshot models that "
+            "keep their data in memory (without stream_to)"
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def census_reporter(name, model):
+    """
+    A reporter for one value of model.census(), used as
+    partial(census_reporter, name). Unlike a lambda it can be pickled.
+    """
+    return model.census()[name]
+
+
+def make_collector(model_reporters, stream_to=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    A mesa.DataCollector for model_reporters, or a StreamingDataCollector
+    writing to stream_to if it is given.
+    """
+    if stream_to is None:
+        return mesa.DataCollector(model_reporters)
+    return StreamingDataCollector(model_reporters, stream_to, chunk_size)
+
+
+def iter_chunks(path, columns=None):
+    """
+    Yield the output of a StreamingDataCollector a chunk at a time, as dicts
+    of column name -> array, with only the given columns if any.
+    """
+    if _is_parquet(path):
+        _, pq = _pyarrow()
+        parquet_file = pq.ParquetFile(path)
+        for group in range(parquet_file.num_row_groups):
+            table = parquet_file.read_row_group(group, columns=columns)
+            yield {name: table.column(name).to_numpy() for name in table.column_names}
+        return
+    for file_name in sorted(os.listdir(path)):
+        if not (file_name.startswith("chunk_") and file_name.endswith(".npz")):
+            continue
+        with np.load(os.path.join(path, file_name)) as chunk:
+            # NpzFile only reads the members that are accessed
+            yield {name: chunk[name] for name in (columns or chunk.files)}
+
+
+def read_columns(path, columns=None):
+    """
+    Read whole columns of the output of a StreamingDataCollector, as a dict
+    of column name -> array.
+    """
+    parts = {}
+    for chunk in iter_chunks(path, columns):
+        for name, values in chunk.items():
+            parts.setdefault(name, []).append(values)
+    return {name: np.concatenate(values) for name, values in parts.items()}
@@ -0,0 +1,3 @@
+# test_random_walk.py is a script run from this directory (python
+# test_random_walk.py), not a pytest module
+collect_ignore = ["test_random_walk.py"]
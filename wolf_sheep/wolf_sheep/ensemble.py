@@ -0,0 +1,242 @@
+"""
+Replicate ensembles
+================================
+
+ReplicateAggregator summarizes the collected reporters of many replicate
+runs step by step without keeping the runs: for every step and reporter it
+keeps the number of runs, the running mean and variance (Welford's
+algorithm) and P² estimates of a few quantiles (Jain and Chlamtac, 1985), so
+its memory is O(steps x reporters), whatever the number of replicates.
+
+The P² estimates depend on the order the runs are added in. Runs from
+parallel workers should be added in a fixed order, as aggregate_sweep does,
+for the summary to be reproducible.
+
+Example:
+>>> aggregator = ReplicateAggregator(REPORTERS, steps=201)
+>>> for seed in range(10000):
+...     model = WolfSheep(seed=seed)
+...     model.run_model(200)
+...     aggregator.add(model.datacollector.model_vars)
+>>> low, high = aggregator.confidence_band("Parasite")
+>>> aggregator.quantile("Parasite", 0.95)
+"""
+
+import numpy as np
+
+DEFAULT_QUANTILES = (0.05, 0.5, 0.95)
+
+# Number of P² markers
+_MARKERS = 5
+
+
+class _P2Quantiles:
+    """
+    P² estimators of the quantiles qs for every cell of an array of shape
+    cells, updated a prefix of the cells at a time.
+    """
+
+    def __init__(self, shape, qs):
+        self.qs = np.asarray(qs, dtype=float)
+        shape = tuple(shape) + (len(self.qs), _MARKERS)
+        # Marker heights; the first observations until there are 5
+        self.heights = np.zeros(shape)
+        # Marker positions, from 0
+        self.positions = np.tile(np.arange(_MARKERS, dtype=float), shape[:-1] + (1,))
+        p = self.qs[:, None]
+        self._increments = np.hstack([np.zeros_like(p), p / 2, p, (1 + p) / 2, np.ones_like(p)])
+
+    def add(self, values, counts):
+        """
+        Add one observation per cell of values (a prefix of the cells, along
+        the first axis); counts are the numbers of observations of those
+        cells before this one, by step.
+        """
+        heights = self.heights[:len(values)]
+        positions = self.positions[:len(values)]
+        shape = heights.shape[:-1]
+        counts = np.broadcast_to(counts.reshape((-1,) + (1,) * (len(shape) - 1)), shape)
+        values = np.broadcast_to(values[..., None], shape)
+
+        # The first 5 observations are kept as they are, then sorted
+        filling = counts < _MARKERS
+        if filling.any():
+            rows = np.nonzero(filling)
+            heights[rows + (counts[rows],)] = values[rows]
+            full = counts == _MARKERS - 1
+            heights[full] = np.sort(heights[full], axis=-1)
+
+        rows = np.nonzero(~filling)
+        if not len(rows[0]):
+            return
+        q = heights[rows]
+        n = positions[rows]
+        x = values[rows][:, None]
+        # Desired marker positions once x is added (positions start at 0)
+        desired = counts[rows][:, None] * self._increments[rows[-1]]
+
+        # Extend the extreme markers to x, and shift the markers above it
+        q[:, :1] = np.minimum(q[:, :1], x)
+        q[:, -1:] = np.maximum(q[:, -1:], x)
+        k = (x >= q[:, 1:-1]).sum(axis=1)
+        n += np.arange(_MARKERS) > k[:, None]
+
+        for i in range(1, _MARKERS - 1):
+            d = desired[:, i] - n[:, i]
+            move = ((d >= 1) & (n[:, i + 1] - n[:, i] > 1)) | (
+                (d <= -1) & (n[:, i - 1] - n[:, i] < -1)
+            )
+            if not move.any():
+                continue
+            d = np.sign(d[move])
+            qm, nm = q[move], n[move]
+            below, here, above = qm[:, i - 1], qm[:, i], qm[:, i + 1]
+            n_below, n_here, n_above = nm[:, i - 1], nm[:, i], nm[:, i + 1]
+            parabolic = here + d / (n_above - n_below) * (
+                (n_here - n_below + d) * (above - here) / (n_above - n_here)
+                + (n_above - n_here - d) * (here - below) / (n_here - n_below)
+            )
+            neighbour = np.where(d > 0, above, below)
+            n_neighbour = np.where(d > 0, n_above, n_below)
+            linear = here + d * (neighbour - here) / (n_neighbour - n_here)
+            ok = (below < parabolic) & (parabolic < above)
+            qm[:, i] = np.where(ok, parabolic, linear)
+            nm[:, i] += d
+            q[move] = qm
+            n[move] = nm
+
+        heights[rows] = q
+        positions[rows] = n
+
+    def estimate(self, counts):
+        """
+        The quantile estimates of every cell, given the numbers of
+        observations by step; NaN where there are none.
+        """
+        shape = self.heights.shape[:-1]
+        counts = np.broadcast_to(counts.reshape((-1,) + (1,) * (len(shape) - 1)), shape)
+        result = self.heights[..., 2].copy()
+        for count in range(_MARKERS):
+            cells = counts == count
+            if not cells.any():
+                continue
+            if count == 0:
+                result[cells] = np.nan
+                continue
+            # Exact quantiles of the first observations
+            first = np.sort(self.heights[cells][:, :count], axis=-1)
+            qs = np.broadcast_to(self.qs, shape)[cells]
+            position = qs * (count - 1)
+            low = np.floor(position).astype(int)
+            high = np.minimum(low + 1, count - 1)
+            index = np.arange(len(first))
+            result[cells] = first[index, low] + (position - low) * (
+                first[index, high] - first[index, low]
+            )
+        return result
+
+
+class ReplicateAggregator:
+    """
+    Per-step summary of the reporters names over replicate runs, see the
+    module docstring.
+
+    Args:
+        names: Reporter names to summarize
+        steps: Number of collected steps of a full run (max steps + 1, the
+               models collect once when they are created)
+        quantiles: Quantiles to estimate for every step and reporter
+        carry_forward: If True, a run that stopped early (see stopping.py)
+                       counts at the later steps with its last values, as
+                       if it had stayed in the state it stopped in;
+                       otherwise the later steps summarize the runs that
+                       got there only.
+    """
+
+    def __init__(self, names, steps, quantiles=DEFAULT_QUANTILES, carry_forward=False):
+        self.names = tuple(names)
+        self.steps = steps
+        self.quantiles = tuple(quantiles)
+        self.carry_forward = carry_forward
+        self.runs = 0
+        # Number of runs that reached each step
+        self.count = np.zeros(steps, dtype=np.int64)
+        self._mean = np.zeros((steps, len(self.names)))
+        self._m2 = np.zeros((steps, len(self.names)))
+        self._p2 = _P2Quantiles((steps, len(self.names)), self.quantiles)
+
+    def add(self, model_vars):
+        """
+        Add a run: a dict of reporter name -> sequence of values by step,
+        such as DataCollector.model_vars. Steps beyond steps are ignored.
+        """
+        values = np.column_stack(
+            [np.asarray(model_vars[name], dtype=float)[:self.steps] for name in self.names]
+        )
+        if self.carry_forward and len(values) < self.steps:
+            padding = np.repeat(values[-1:], self.steps - len(values), axis=0)
+            values = np.vstack([values, padding])
+        rows = len(values)
+        self._p2.add(values, self.count[:rows])
+        count = self.count[:rows] + 1
+        self.count[:rows] = count
+        delta = values - self._mean[:rows]
+        self._mean[:rows] += delta / count[:, None]
+        self._m2[:rows] += delta * (values - self._mean[:rows])
+        self.runs += 1
+
+    def _column(self, array, name):
+        return array[:, self.names.index(name)]
+
+    def mean(self, name):
+        """
+        Mean of the reporter name by step (NaN where no run got there).
+        """
+        mean = self._column(self._mean, name).copy()
+        mean[self.count == 0] = np.nan
+        return mean
+
+    def variance(self, name):
+        """
+        Sample variance of the reporter name by step (NaN below 2 runs).
+        """
+        with np.errstate(invalid="ignore", divide="ignore"):
+            variance = self._column(self._m2, name) / (self.count - 1)
+        variance[self.count < 2] = np.nan
+        return variance
+
+    def std(self, name):
+        return np.sqrt(self.variance(name))
+
+    def quantile(self, name, q):
+        """
+        Estimate of the quantile q (one of quantiles) of the reporter name
+        by step. Exact while fewer than 5 runs got to a step.
+        """
+        estimates = self._p2.estimate(self.count)
+        return estimates[:, self.names.index(name), self.quantiles.index(q)]
+
+    def confidence_band(self, name, z=1.96):
+        """
+        Normal confidence band of the mean of the reporter name by step, as
+        (low, high); z = 1.96 gives the 95% band.
+        """
+        mean = self.mean(name)
+        with np.errstate(invalid="ignore"):
+            half_width = z * np.sqrt(self.variance(name) / self.count)
+        return mean - half_width, mean + half_width
+
+    def columns(self):
+        """
+        The whole summary as a dict of column name -> array by step: "Step",
+        "count", then for every reporter "<name>.mean", "<name>.std" and one
+        "<name>.q<percent>" per quantile.
+        """
+        estimates = self._p2.estimate(self.count)
+        columns = {"Step": np.arange(self.steps), "count": self.count.copy()}
+        for index, name in enumerate(self.names):
+            columns[name + ".mean"] = self.mean(name)
+            columns[name + ".std"] = self.std(name)
+            for q_index, q in enumerate(self.quantiles):
+                columns[f"{name}.q{q * 100:g}"] = estimates[:, index, q_index]
+        return columns
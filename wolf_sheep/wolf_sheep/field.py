@@ -0,0 +1,102 @@
+"""
+Array-backed resource layer.
+
+Stores the state of the GrassPatch / GrassPatch2 agents as NumPy arrays shaped
+to the grid, so that regrowth and parasite recovery are a handful of vectorized
+operations per step instead of one Python ``step()`` call per cell.
+"""
+
+import numpy as np
+
+# Values of ResourceField.kind
+EMPTY = 0
+GRASS = 1  # behaves like GrassPatch
+GRASS2 = 2  # behaves like GrassPatch2
+
+# Regrowth time of each kind, relative to model.resource_regrowth_time
+REGROWTH_FACTOR = {GRASS: 1, GRASS2: 0.8}
+
+# Per-step probability that a GRASS2 cell loses its parasite
+GRASS2_RECOVERY = 0.005
+
+
+class ResourceField:
+    """
+    The resource patches of a whole grid, one array entry per cell.
+
+    Attributes:
+        kind: int8 array, which patch type (if any) lives in each cell
+        fully_grown: bool array, whether the patch can be eaten
+        countdown: float array, steps left until an eaten patch regrows
+        para: bool array, whether the patch carries the parasite
+
+    Agents index the arrays with their position, e.g.
+    ``field.fully_grown[agent.pos]``.
+    """
+
+    def __init__(self, model, width, height):
+        """
+        Create an empty field; cells are filled in with set_patch().
+
+        Args:
+            model: The model the field belongs to
+            width, height: Size of the grid
+        """
+        self.model = model
+        shape = (width, height)
+        self.kind = np.zeros(shape, dtype=np.int8)
+        self.fully_grown = np.zeros(shape, dtype=bool)
+        self.countdown = np.zeros(shape, dtype=float)
+        self.para = np.zeros(shape, dtype=bool)
+        # Seeded by the model once the patches are placed, so that filling the
+        # field draws the same numbers as creating the patch agents would.
+        self.rng = None
+
+    def seed(self, seed):
+        self.rng = np.random.default_rng(seed)
+
+    def set_patch(self, pos, kind, fully_grown, countdown, para):
+        self.kind[pos] = kind
+        self.fully_grown[pos] = fully_grown
+        self.countdown[pos] = countdown
+        self.para[pos] = para
+
+    def step(self):
+        """
+        Advance every patch by one step, like GrassPatch.step and
+        GrassPatch2.step would.
+        """
+        regrowing = (self.kind != EMPTY) & ~self.fully_grown
+        ready = regrowing & (self.countdown <= 0)
+        self.countdown[regrowing & ~ready] -= 1
+        self.fully_grown[ready] = True
+        for kind, factor in REGROWTH_FACTOR.items():
+            self.countdown[ready & (self.kind == kind)] = (
+                self.model.resource_regrowth_time * factor
+            )
+
+        # Recover
+        recover = (self.kind == GRASS2) & (
+            self.rng.random(self.kind.shape) < GRASS2_RECOVERY
+        )
+        self.para[recover] = False
+
+    def count(self, kind, attr):
+        """
+        Number of cells of the given kind where the boolean array named by
+        attr ("fully_grown" or "para") is set.
+        """
+        return int(np.count_nonzero(getattr(self, attr)[self.kind == kind]))
+
+    def census(self):
+        """
+        All the counts of count() in one pass over the arrays, as a dict of
+        (kind, attr) -> count for GRASS and GRASS2.
+        """
+        codes = self.kind.astype(np.intp) * 4 + self.fully_grown * 2 + self.para
+        counts = np.bincount(codes.ravel(), minlength=12).reshape(3, 2, 2)
+        census = {}
+        for kind in (GRASS, GRASS2):
+            census[kind, "fully_grown"] = int(counts[kind, 1].sum())
+            census[kind, "para"] = int(counts[kind, :, 1].sum())
+        return census
@@ -0,0 +1,108 @@
+"""
+Agent deaths and births
+================================
+
+The agents of agents2 die and give birth through model.lifecycle:
+lifecycle.kill(agent) and lifecycle.spawn(agent_class, pos, *args).
+
+ImmediateLifecycle applies every event as it happens: the agent leaves the
+grid and the schedule, or the newborn is created, placed and scheduled, in
+the middle of the scheduler's loop.
+
+DeferredLifecycle only takes a dead agent off the grid, so that no other
+agent finds it, and queues the rest: the schedule stops stepping it
+(RandomActivationByTypeFiltered.remove_later), and at the end of the step
+apply() removes all of them from the schedule at once and creates the
+queued newborns. The agent objects of the dead are kept in a pool and
+reused for the newborns of their class, instead of creating new agents;
+mesa's model keeps a reference to every agent ever created, so this also
+stops the model's agent registry from growing with every birth. Newborns
+join the grid at the end of the step they are born in, so unlike with
+ImmediateLifecycle they can't be eaten or met during that step.
+
+Example:
+>>> model.lifecycle.kill(sheep)
+>>> model.lifecycle.spawn(Wolf, wolf.pos, wolf.moore, wolf.energy, False)
+>>> model.lifecycle.apply()  # at the end of the step
+"""
+
+
+class ImmediateLifecycle:
+    """
+    Applies deaths and births as they happen.
+    """
+
+    def __init__(self, model):
+        self.model = model
+
+    def kill(self, agent):
+        """
+        Remove agent from the grid and the schedule.
+        """
+        self.model.grid.remove_agent(agent)
+        self.model.schedule.remove(agent)
+
+    def spawn(self, agent_class, pos, *args):
+        """
+        Create agent_class(next_id, pos, model, *args), place it at pos and
+        add it to the schedule.
+        """
+        model = self.model
+        agent = agent_class(model.next_id(), pos, model, *args)
+        model.grid.place_agent(agent, pos)
+        model.schedule.add(agent)
+
+    def apply(self):
+        pass
+
+
+class DeferredLifecycle:
+    """
+    Queues deaths and births and applies them in apply(), reusing the agent
+    objects of the dead for the newborns.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.births = []
+        self.pool = {}
+
+    def kill(self, agent):
+        """
+        Remove agent from the grid now, and from the schedule in apply().
+        """
+        self.model.grid.remove_agent(agent)
+        self.model.schedule.remove_later(agent)
+
+    def spawn(self, agent_class, pos, *args):
+        """
+        Queue the birth of agent_class(next_id, pos, model, *args), placed
+        at pos, for apply().
+        """
+        self.births.append((agent_class, pos, args))
+
+    def apply(self):
+        """
+        Remove the agents killed since the last call from the schedule, and
+        create, place and schedule the queued newborns.
+        """
+        model = self.model
+        grid = model.grid
+        schedule = model.schedule
+        pool = self.pool
+        for agent in schedule.remove_pending():
+            pool.setdefault(type(agent), []).append(agent)
+        births, self.births = self.births, []
+        for agent_class, pos, args in births:
+            # Created without a pos, which place_agent sets: mesa warns
+            # about placing an agent that already has one
+            free = pool.get(agent_class)
+            if free:
+                agent = free.pop()
+                # mesa.Agent.__init__ registers it with the model again,
+                # which changes nothing
+                agent.__init__(model.next_id(), None, model, *args)
+            else:
+                agent = agent_class(model.next_id(), None, model, *args)
+            grid.place_agent(agent, pos)
+            schedule.add(agent)
@@ -13,6 +13,10 @@ import mesa
 
 from .agents import GrassPatch, Sheep, Wolf
 from .scheduler import RandomActivationByTypeFiltered
+from .stopping import check_stop_conditions, make_stop_conditions
+
+# The reporters that count the animal species, watched by stop_on_extinction
+SPECIES = ("Predator", "Lamprey(male)", "Lamprey(female)")
 
 
 class WolfSheep(mesa.Model):
@@ -55,6 +59,9 @@ class WolfSheep(mesa.Model):
         resource_regrowth_time=30,
         sheep_gain_from_food=0.4,
         initial_rate = 0.5,
+        stop_on_extinction=False,
+        steady_state_window=0,
+        steady_state_threshold=2.0,
     ):
         """
         Create a new Wolf-Sheep model with the given parameters.
@@ -69,6 +76,14 @@ class WolfSheep(mesa.Model):
             resource_regrowth_time: How long it takes for a resource patch to regrow
                                  once it is eaten
             sheep_gain_from_food: Energy sheep gain from resource, if enabled.
+            stop_on_extinction: If True, stop the run (running = False) as
+                                soon as one of the SPECIES dies out.
+            steady_state_window: If not 0, stop the run once the collected
+                                 series are stationary over this many
+                                 steps, see stopping.SteadyState.
+            steady_state_threshold: Largest difference, in standard errors,
+                                    between the means of the two halves of
+                                    the window of a stationary series.
         """
         super().__init__()
         # Set parameters
@@ -133,6 +148,16 @@ class WolfSheep(mesa.Model):
 
         self.running = True
         self.datacollector.collect(self)
+        # Why the run stopped early, if it did
+        self.stop_reason = None
+        self.stop_conditions = make_stop_conditions(
+            self,
+            SPECIES,
+            list(self.datacollector.model_reporters),
+            stop_on_extinction,
+            steady_state_window,
+            steady_state_threshold,
+        )
 
     def step(self):
         self.schedule.step()
@@ -150,10 +175,18 @@ class WolfSheep(mesa.Model):
         self.sheep_num = self.schedule.get_type_count(Sheep)
         self.resource = self.schedule.get_type_count(GrassPatch, lambda x: x.fully_grown)
         self.male_num = self.schedule.get_type_count(Sheep, lambda x: x.sex == 'Male')
-        self.rate = self.male_num / self.sheep_num
+        # Once the sheep are gone the rate no longer matters; keep the last
+        if self.sheep_num:
+            self.rate = self.male_num / self.sheep_num
         #self.rate = 0.5
+        if self.stop_conditions:
+            check_stop_conditions(self)
 
     def run_model(self, step_count=200):
+        """
+        Run step_count steps, or until a stop condition is met; returns the
+        stop_reason, None if the run went to the end.
+        """
         if self.verbose:
             print("Initial number wolves: ", self.schedule.get_type_count(Wolf))
             print("Initial number sheep: ", self.schedule.get_type_count(Sheep))
@@ -163,6 +196,8 @@ class WolfSheep(mesa.Model):
             )
 
         for i in range(step_count):
+            if not self.running:
+                break
             self.step()
 
         if self.verbose:
@@ -172,4 +207,7 @@ class WolfSheep(mesa.Model):
             print(
                 "Final number resource: ",
                 self.schedule.get_type_count(GrassPatch, lambda x: x.fully_grown),
-            )
\ No newline at end of file
+            )
+            if self.stop_reason is not None:
+                print("Stopped early: ", self.stop_reason)
+        return self.stop_reason
\ No newline at end of file
@@ -9,10 +9,45 @@ Replication of the model found in NetLogo:
     Northwestern University, Evanston, IL.
 """
 
+import operator
+from functools import partial
+
 import mesa
 
 from .agents2 import GrassPatch, Sheep, Wolf, GrassPatch2, Sheep2, Wolf2
+from .collector import DEFAULT_CHUNK_SIZE, census_reporter, make_collector
+from .field import GRASS, GRASS2, ResourceField
+from .lifecycle import DeferredLifecycle, ImmediateLifecycle
+from .profiling import StepProfiler
+from .replay import TraceRecorder
 from .scheduler import RandomActivationByTypeFiltered
+from .space import TypedMultiGrid
+from .stopping import check_stop_conditions, make_stop_conditions
+from .streams import LegacyStreams, RandomStreams, stream_seed
+
+PATCH_KINDS = {GrassPatch: GRASS, GrassPatch2: GRASS2}
+ANIMAL_CLASSES = (Sheep, Sheep2, Wolf, Wolf2)
+
+# The model reporters, all read from WolfSheep.census()
+REPORTERS = (
+    "Species_E",
+    "Species_D",
+    "Species_C",
+    "Lamprey(male)",
+    "Lamprey(female)",
+    "Species_B",
+    "Species_A",
+    "Parasite",
+)
+
+# The reporters that count the animal species, watched by stop_on_extinction
+SPECIES = (
+    "Species_E",
+    "Species_D",
+    "Species_C",
+    "Lamprey(male)",
+    "Lamprey(female)",
+)
 
 
 class WolfSheep(mesa.Model):
@@ -59,6 +94,19 @@ class WolfSheep(mesa.Model):
         resource_regrowth_time=30,
         sheep_gain_from_food=0.4,
         initial_rate = 0.5,
+        resource_field=False,
+        stream_to=None,
+        stream_chunk_size=DEFAULT_CHUNK_SIZE,
+        rng_streams=False,
+        deferred_updates=False,
+        active_patches=False,
+        profile=False,
+        profile_to=None,
+        record_to=None,
+        stop_on_extinction=False,
+        steady_state_window=0,
+        steady_state_threshold=2.0,
+        seed=None,
     ):
         """
         Create a new Wolf-Sheep model with the given parameters.
@@ -73,6 +121,41 @@ class WolfSheep(mesa.Model):
             resource_regrowth_time: How long it takes for a resource patch to regrow
                                  once it is eaten
             sheep_gain_from_food: Energy sheep gain from resource, if enabled.
+            resource_field: If True, store the resource patches in a
+                            ResourceField instead of one agent per cell.
+            stream_to: If given, stream the collected data to this NPZ chunk
+                       directory or .parquet file with a
+                       StreamingDataCollector instead of keeping it in memory.
+            stream_chunk_size: Number of steps per chunk when streaming.
+            rng_streams: If True, draw the agents' decisions from independent
+                         RandomStreams instead of model.random.
+            deferred_updates: If True, queue the deaths and births of each
+                              step and apply them together at its end, with
+                              a DeferredLifecycle; newborns then join the
+                              grid at the end of the step they are born in.
+            active_patches: If True, step the resource patch agents only
+                            while they are regrowing or infected, and draw
+                            the step at which an infected patch recovers
+                            instead of a recovery draw every step.
+            profile: If True, record the time of every step by agent type,
+                     data collection and bookkeeping in a StepProfiler
+                     (model.profiler).
+            profile_to: If given, profile and stream the records to this NPZ
+                        chunk directory or .parquet file.
+            record_to: If given, record a trace of the run (the agents and
+                       the reporters, step by step) to this directory with
+                       a TraceRecorder (model.recorder), to be played back
+                       with replay.TraceReplay.
+            stop_on_extinction: If True, stop the run (running = False) as
+                                soon as one of the SPECIES dies out.
+            steady_state_window: If not 0, stop the run once the REPORTERS
+                                 are stationary over this many steps, see
+                                 stopping.SteadyState.
+            steady_state_threshold: Largest difference, in standard errors,
+                                    between the means of the two halves of
+                                    the window of a stationary series.
+            seed: Seed for the model's random number generator (read by
+                  mesa.Model when the model is created).
         """
         super().__init__()
         # Set parameters
@@ -89,31 +172,48 @@ class WolfSheep(mesa.Model):
         self.resource_regrowth_time = resource_regrowth_time
         self.sheep_gain_from_food = sheep_gain_from_food
         self.rate = initial_rate
+        self.active_patches = active_patches
         self.initial_male = self.sheep_num * self.rate
+        self.resource_field = None
+        self._census = None
+        self._census_step = None
+        if rng_streams:
+            self.streams = RandomStreams(stream_seed(self))
+        else:
+            self.streams = LegacyStreams(self.random)
+        if deferred_updates:
+            self.lifecycle = DeferredLifecycle(self)
+        else:
+            self.lifecycle = ImmediateLifecycle(self)
 
         self.schedule = RandomActivationByTypeFiltered(self)
-        self.grid = mesa.space.MultiGrid(self.width, self.height, torus=True)
-        self.datacollector = mesa.DataCollector(
-            {
-                "Species_E": lambda m: m.schedule.get_type_count(Wolf),
-                "Species_D": lambda m: m.schedule.get_type_count(Wolf2),
-                "Species_C": lambda m: m.schedule.get_type_count(Sheep2),
-                "Lamprey(male)": lambda m: m.schedule.get_type_count(Sheep, lambda x: x.sex == 'Male'),
-                "Lamprey(female)": lambda m: m.schedule.get_type_count(Sheep, lambda x: x.sex == 'Female'),
-                "Species_B": lambda m: m.schedule.get_type_count(
-                    GrassPatch, lambda x: x.fully_grown
-                ),
-                "Species_A": lambda m: m.schedule.get_type_count(
-                    GrassPatch2, lambda x: x.fully_grown
-                ),
-                "Parasite":lambda m: m.schedule.get_type_count(
-                    GrassPatch, lambda x: x.para
-                ) + m.schedule.get_type_count(
-                    GrassPatch2, lambda x: x.para
-                ) +  m.schedule.get_type_count(Sheep, lambda x: x.para) + 
-                m.schedule.get_type_count(Sheep2, lambda x: x.para) + 
-                m.schedule.get_type_count(Wolf, lambda x: x.para) + m.schedule.get_type_count(Wolf2, lambda x: x.para),
-            }
+        for agent_class in (GrassPatch, GrassPatch2) + ANIMAL_CLASSES:
+            self.schedule.add_counter(
+                f"{agent_class.__name__} where para", agent_class, "para"
+            )
+        for patch_class in (GrassPatch, GrassPatch2):
+            self.schedule.add_counter(
+                f"{patch_class.__name__} where fully_grown", patch_class, "fully_grown"
+            )
+        if active_patches:
+            for patch_class in (GrassPatch, GrassPatch2):
+                self.schedule.step_on_demand(patch_class)
+                self.schedule.add_wake_condition(patch_class, "fully_grown", operator.not_)
+            self.schedule.add_wake_condition(GrassPatch2, "para", bool)
+        for sex in ("Male", "Female"):
+            self.schedule.add_counter(
+                f"Sheep where sex=={sex!r}", Sheep, "sex", partial(operator.eq, sex)
+            )
+        if profile or profile_to is not None:
+            self.profiler = StepProfiler(profile_to, stream_chunk_size)
+        else:
+            self.profiler = None
+        self.schedule.profiler = self.profiler
+        self.grid = TypedMultiGrid(self.width, self.height, torus=True)
+        self.datacollector = make_collector(
+            {name: partial(census_reporter, name) for name in REPORTERS},
+            stream_to,
+            stream_chunk_size,
         )
 
         # Create sheep:
@@ -154,61 +254,167 @@ class WolfSheep(mesa.Model):
 
         # Create resource patches
         if self.resource1 or self.resource2:
+            if resource_field:
+                self.resource_field = ResourceField(self, self.width, self.height)
             for agent, (x, y) in self.grid.coord_iter():
-                if self.random.random() < 0.5:
-                    fully_grown = self.random.choice([True, False])
-                    if fully_grown:
-                        countdown = self.resource_regrowth_time
-                    else:
-                        countdown = self.random.randrange(self.resource_regrowth_time)
-                    para = True if self.random.random() < 0.2 else False
-                    patch = GrassPatch(self.next_id(), (x, y), self, fully_grown, countdown, para)
+                patch_class = GrassPatch if self.random.random() < 0.5 else GrassPatch2
+                fully_grown = self.random.choice([True, False])
+                if fully_grown:
+                    countdown = self.resource_regrowth_time
                 else:
-                    fully_grown = self.random.choice([True, False])
-                    if fully_grown:
-                        countdown = self.resource_regrowth_time
-                    else:
-                        countdown = self.random.randrange(self.resource_regrowth_time)
-                    para = True if self.random.random() < 0.2 else False
-                    patch = GrassPatch2(self.next_id(), (x, y), self, fully_grown, countdown * 0.8, para)
+                    countdown = self.random.randrange(self.resource_regrowth_time)
+                para = True if self.random.random() < 0.2 else False
+                if patch_class is GrassPatch2:
+                    countdown *= 0.8
+                if self.resource_field is not None:
+                    kind = PATCH_KINDS[patch_class]
+                    self.resource_field.set_patch((x, y), kind, fully_grown, countdown, para)
+                    continue
+                patch = patch_class(self.next_id(), (x, y), self, fully_grown, countdown, para)
                 self.grid.place_agent(patch, (x, y))
                 self.schedule.add(patch)
+            if self.resource_field is not None:
+                self.resource_field.seed(self.random.getrandbits(64))
+                if rng_streams:
+                    self.resource_field.rng = self.streams.generator("patch_recovery")
 
         self.running = True
         self.datacollector.collect(self)
+        if record_to is not None:
+            self.recorder = TraceRecorder(
+                record_to,
+                {name: partial(census_reporter, name) for name in REPORTERS},
+                stream_chunk_size,
+            )
+            self.recorder.record(self)
+        else:
+            self.recorder = None
+        # Why the run stopped early, if it did
+        self.stop_reason = None
+        self.stop_conditions = make_stop_conditions(
+            self,
+            SPECIES,
+            REPORTERS,
+            stop_on_extinction,
+            steady_state_window,
+            steady_state_threshold,
+        )
+
+    def count_patches(self, patch_class, attr):
+        """
+        Number of resource patches of the given class whose boolean attribute
+        attr ("fully_grown" or "para") is set, in either storage mode.
+        """
+        if self.resource_field is not None:
+            return self.resource_field.count(PATCH_KINDS[patch_class], attr)
+        return self.schedule.get_counter(f"{patch_class.__name__} where {attr}")
+
+    def census(self):
+        """
+        Every count the reporters and step() need, computed once per step
+        (the first time it is asked for after the scheduler has stepped) and
+        shared by all of them: the REPORTERS plus "Sheep", "GrassPatch" and
+        "GrassPatch2" (fully grown patches).
+        """
+        if self._census_step == self.schedule.steps and self._census is not None:
+            return self._census
+        schedule = self.schedule
+        get_counter = schedule.get_counter
+        if self.resource_field is not None:
+            patches = self.resource_field.census()
+            grown = patches[GRASS, "fully_grown"]
+            grown2 = patches[GRASS2, "fully_grown"]
+            patch_para = patches[GRASS, "para"] + patches[GRASS2, "para"]
+        else:
+            grown = get_counter("GrassPatch where fully_grown")
+            grown2 = get_counter("GrassPatch2 where fully_grown")
+            patch_para = get_counter("GrassPatch where para") + get_counter(
+                "GrassPatch2 where para"
+            )
+        self._census = {
+            "Species_E": schedule.get_type_count(Wolf),
+            "Species_D": schedule.get_type_count(Wolf2),
+            "Species_C": schedule.get_type_count(Sheep2),
+            "Lamprey(male)": get_counter("Sheep where sex=='Male'"),
+            "Lamprey(female)": get_counter("Sheep where sex=='Female'"),
+            "Species_B": grown,
+            "Species_A": grown2,
+            "Parasite": patch_para
+            + sum(
+                get_counter(f"{agent_class.__name__} where para")
+                for agent_class in ANIMAL_CLASSES
+            ),
+            "Sheep": schedule.get_type_count(Sheep),
+            "GrassPatch": grown,
+            "GrassPatch2": grown2,
+        }
+        self._census_step = schedule.steps
+        return self._census
 
     def step(self):
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.start_step()
         self.schedule.step()
+        if profiler is not None:
+            profiler.lap("schedule")
+        self.lifecycle.apply()
+        if self.resource_field is not None:
+            self.resource_field.step()
+        if profiler is not None:
+            profiler.lap("bookkeeping")
         # collect data
         self.datacollector.collect(self)
+        if self.recorder is not None:
+            self.recorder.record(self)
+        if profiler is not None:
+            profiler.lap("collect")
+        census = self.census()
         if self.verbose:
             print(
                 [
                     self.schedule.time,
-                    self.schedule.get_type_count(Wolf),
-                    self.schedule.get_type_count(Sheep),
-                    self.schedule.get_type_count(GrassPatch, lambda x: x.fully_grown),
-                    self.schedule.get_type_count(GrassPatch2, lambda x: x.fully_grown),
+                    census["Species_E"],
+                    census["Sheep"],
+                    census["GrassPatch"],
+                    census["GrassPatch2"],
                 ]
             )
-        self.sheep_num = self.schedule.get_type_count(Sheep)
-        self.resource1 = self.schedule.get_type_count(GrassPatch, lambda x: x.fully_grown)
-        self.resource2 = self.schedule.get_type_count(GrassPatch2, lambda x: x.fully_grown)
-        self.male_num = self.schedule.get_type_count(Sheep, lambda x: x.sex == 'Male')
+        self.sheep_num = census["Sheep"]
+        self.resource1 = census["GrassPatch"]
+        self.resource2 = census["GrassPatch2"]
+        self.male_num = census["Lamprey(male)"]
         #self.rate = self.male_num / self.sheep_num
         self.rate = 0.5
+        if self.stop_conditions:
+            check_stop_conditions(self)
+        if profiler is not None:
+            profiler.lap("bookkeeping")
+            profiler.end_step()
 
     def run_model(self, step_count=200):
+        """
+        Run step_count steps, or until a stop condition is met; returns the
+        stop_reason, None if the run went to the end.
+        """
         if self.verbose:
             print("Initial number wolves: ", self.schedule.get_type_count(Wolf))
             print("Initial number sheep: ", self.schedule.get_type_count(Sheep))
             print(
                 "Initial number resource: ",
-                self.schedule.get_type_count(GrassPatch, lambda x: x.fully_grown),
+                self.count_patches(GrassPatch, "fully_grown"),
             )
 
         for i in range(step_count):
+            if not self.running:
+                break
             self.step()
+        if hasattr(self.datacollector, "flush"):
+            self.datacollector.flush()
+        if self.profiler is not None:
+            self.profiler.flush()
+        if self.recorder is not None:
+            self.recorder.flush()
 
         if self.verbose:
             print("")
@@ -216,5 +422,8 @@ class WolfSheep(mesa.Model):
             print("Final number sheep: ", self.schedule.get_type_count(Sheep))
             print(
                 "Final number resource: ",
-                self.schedule.get_type_count(GrassPatch, lambda x: x.fully_grown),
+                self.count_patches(GrassPatch, "fully_grown"),
             )
+            if self.stop_reason is not None:
+                print("Stopped early: ", self.stop_reason)
+        return self.stop_reason
@@ -0,0 +1,126 @@
+"""
+Step profiling
+================================
+
+StepProfiler records where the time of each model step goes:
+
+- for every agent type, the wall time of its turn in the scheduler, the
+  number of agents of the type and the number of step() calls made (fewer
+  than the agents when some are asleep or waiting to be removed), reported
+  by RandomActivationByTypeFiltered;
+- the time of the whole scheduler step, of datacollector.collect and of the
+  model's own bookkeeping around them, timed by the model with lap().
+
+Each step gives one record, a dict with the columns "<Type>.time",
+"<Type>.agents", "<Type>.calls", "schedule", "collect", "bookkeeping" and
+"total" (times in seconds). Records are kept in memory, or streamed to disk
+with a StreamingDataCollector (NPZ chunks or Parquet) if stream_to is given.
+With the profiler off (model.profiler is None) the model and the scheduler
+only check for it once per step and per agent type.
+
+Example:
+>>> model = WolfSheep(profile=True)
+>>> model.run_model(100)
+>>> columns = model.profiler.columns()
+>>> columns["Sheep.time"].sum(), columns["collect"].sum()
+"""
+
+import time
+
+import numpy as np
+
+from .collector import DEFAULT_CHUNK_SIZE, StreamingDataCollector
+
+
+class StepProfiler:
+    """
+    Collects one timing record per model step, see the module docstring.
+
+    Args:
+        stream_to: If given, stream the records to this NPZ chunk directory
+                   or .parquet file instead of keeping them in records. The
+                   columns are those of the first record.
+        chunk_size: Number of steps per chunk when streaming.
+    """
+
+    def __init__(self, stream_to=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.stream_to = stream_to
+        self.chunk_size = chunk_size
+        self.records = []
+        self._collector = None
+        self._record = None
+        self._start = None
+        self._last = None
+
+    def start_step(self):
+        """
+        Start the record of a step.
+        """
+        self._record = {}
+        self._start = self._last = time.perf_counter()
+
+    def record_type(self, agent_type, seconds, agent_count, calls):
+        """
+        Called by the scheduler after stepping the agents of agent_type.
+        """
+        record = self._record
+        if record is None:
+            # The scheduler was stepped outside of a model step
+            return
+        name = agent_type.__name__
+        record[name + ".time"] = record.get(name + ".time", 0.0) + seconds
+        record[name + ".agents"] = agent_count
+        record[name + ".calls"] = record.get(name + ".calls", 0) + calls
+
+    def lap(self, name):
+        """
+        Add the time since the start of the step, or the last lap, to the
+        column name of the current record.
+        """
+        now = time.perf_counter()
+        self._record[name] = self._record.get(name, 0.0) + now - self._last
+        self._last = now
+
+    def end_step(self):
+        """
+        Finish the record of the step, and keep or stream it.
+        """
+        record = self._record
+        record["total"] = time.perf_counter() - self._start
+        self._record = None
+        if self.stream_to is None:
+            self.records.append(record)
+            return
+        if self._collector is None:
+            reporters = {
+                name: (lambda record, name=name: record.get(name, 0)) for name in record
+            }
+            self._collector = StreamingDataCollector(reporters, self.stream_to, self.chunk_size)
+        self._collector.collect(record)
+
+    def columns(self):
+        """
+        The records kept in memory as a dict of column name -> array, with a
+        "Step" column (the number of the profiled step, from 0) first.
+        """
+        names = {}
+        for record in self.records:
+            names.update(dict.fromkeys(record))
+        columns = {"Step": np.arange(len(self.records))}
+        for name in names:
+            columns[name] = np.array([record.get(name, 0) for record in self.records])
+        return columns
+
+    def flush(self):
+        """
+        Write out the streamed records collected so far.
+        """
+        if self._collector is not None:
+            self._collector.flush()
+
+    def close(self):
+        """
+        Flush and finish the streamed output, if any.
+        """
+        if self._collector is not None:
+            self._collector.close()
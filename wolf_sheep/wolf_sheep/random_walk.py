@@ -11,12 +11,16 @@ class RandomWalker(mesa.Agent):
 
     Not intended to be used on its own, but to inherit its methods to multiple
     other agents.
+
+    The attributes of mesa.Agent are slots here, and subclasses declare
+    __slots__ for their own attributes, so that none of them is stored in an
+    instance dict. mesa.Agent itself has no __slots__, so the instances
+    still have an (empty) __dict__ and a __weakref__: the saving is the
+    stored attributes only, about 72 bytes per agent (see
+    memory_benchmark.py).
     """
 
-    grid = None
-    x = None
-    y = None
-    moore = True
+    __slots__ = ("unique_id", "model", "pos", "moore")
 
     def __init__(self, unique_id, pos, model, moore=True):
         """
@@ -34,9 +38,18 @@ class RandomWalker(mesa.Agent):
         """
         Step one cell in any allowable direction.
         """
+        grid = self.model.grid
+        # Duck-typed, so that this module imports without the package (see
+        # test_random_walk.py)
+        random_neighbor = getattr(grid, "random_neighbor", None)
+        if random_neighbor is not None:
+            # Precomputed neighborhoods (space.TypedMultiGrid)
+            next_move = random_neighbor(self.pos, self.moore, True, self.random)
+            grid.move_agent_in_bounds(self, next_move)
+            return
         # Pick the next cell from the adjacent cells.
-        next_moves = self.model.grid.get_neighborhood(self.pos, self.moore, True)
+        next_moves = grid.get_neighborhood(self.pos, self.moore, True)
         next_move = self.random.choice(next_moves)
         # Now move:
 
-        self.model.grid.move_agent(self, next_move)
+        grid.move_agent(self, next_move)
@@ -0,0 +1,219 @@
+"""
+Raster canvas
+================================
+
+RasterCanvas draws the whole grid into one RGB image on the server, one
+pixel per cell, and sends it to the browser as a single PNG per frame,
+instead of one rectangle or image per agent. The work per frame is a few
+vectorized operations on arrays shaped to the grid, so grids of 1000x1000
+cells can be watched.
+
+The image is built in layers, from the bottom:
+
+- the resource patches, one colour per kind and state (grown or eaten), read
+  from the ResourceField of the model if it has one, else from the patch
+  agents;
+- the density of each kind of animal ("Lamprey(female)", "Lamprey(male)",
+  "Lamprey(stuck)", "Species_C", "Species_E", "Species_D"): its colour is
+  blended over the cell in proportion to the number of animals there, fully
+  opaque from saturation animals up.
+
+The animals are read from the arrays of a VectorizedWolfSheep, or from the
+agents of a model2.WolfSheep.
+
+Example:
+>>> canvas_element = RasterCanvas(1000, 1000, 800, 800)
+"""
+
+import base64
+import struct
+import zlib
+
+import numpy as np
+from mesa.visualization import VisualizationElement
+
+from .agents2 import GrassPatch, GrassPatch2, Sheep, Sheep2, Wolf, Wolf2
+from .canvas import RESOURCES
+from .field import EMPTY, GRASS, GRASS2
+
+BACKGROUND = "#FFFFFF"
+
+# (kind, fully grown) -> colour, as in server.wolf_sheep_portrayal
+PATCH_COLORS = {
+    (GRASS, True): "#00CC00",
+    (GRASS, False): "#ADEBAD",
+    (GRASS2, True): "#201E9B",
+    (GRASS2, False): "#8E8CF9",
+}
+
+# Animal layers, from the bottom, with the colours of the chart
+ANIMAL_COLORS = {
+    "Lamprey(female)": "#A626B5",
+    "Lamprey(male)": "#E2D246",
+    "Lamprey(stuck)": "#A730C8",
+    "Species_C": "#1CDCD3",
+    "Species_E": "#AA0000",
+    "Species_D": "#EB8E17",
+}
+
+
+def _rgb(color):
+    color = color.lstrip("#")
+    return np.array([int(color[i:i + 2], 16) for i in (0, 2, 4)], dtype=float)
+
+
+def encode_png(image, compresslevel=1):
+    """
+    The bytes of an 8-bit RGB PNG of image, a (height, width, 3) uint8
+    array, compressed with zlib at compresslevel.
+    """
+    height, width, _ = image.shape
+    # Every row starts with its filter type, 0 (none)
+    rows = np.zeros((height, 1 + 3 * width), dtype=np.uint8)
+    rows[:, 1:] = image.reshape(height, 3 * width)
+
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", header)
+        + chunk(b"IDAT", zlib.compress(rows.tobytes(), compresslevel))
+        + chunk(b"IEND", b"")
+    )
+
+
+def patch_arrays(model):
+    """
+    The kind and fully_grown arrays, shaped (width, height), of the resource
+    patches of model.
+    """
+    field = getattr(model, "resource_field", None)
+    if field is not None:
+        return field.kind, field.fully_grown
+    kind = np.full((model.width, model.height), EMPTY, dtype=np.int8)
+    fully_grown = np.zeros(kind.shape, dtype=bool)
+    for patch_class, patch_kind in ((GrassPatch, GRASS), (GrassPatch2, GRASS2)):
+        patches = model.schedule.get_agents_of_type(patch_class)
+        if not patches:
+            continue
+        x, y = np.array([patch.pos for patch in patches]).T
+        kind[x, y] = patch_kind
+        fully_grown[x, y] = [patch.fully_grown for patch in patches]
+    return kind, fully_grown
+
+
+def animal_positions(model):
+    """
+    A dict of animal layer name -> (x, y) arrays of the positions of its
+    animals in model.
+    """
+    if hasattr(model, "wolves2"):
+        # VectorizedWolfSheep
+        sheep = model.sheep
+        free = ~sheep.stuck
+        layers = {
+            "Lamprey(female)": free & ~sheep.male,
+            "Lamprey(male)": free & sheep.male,
+            "Lamprey(stuck)": sheep.stuck,
+        }
+        positions = {name: (sheep.x[mask], sheep.y[mask]) for name, mask in layers.items()}
+        for name, population in (
+            ("Species_C", model.sheep2),
+            ("Species_E", model.wolves),
+            ("Species_D", model.wolves2),
+        ):
+            positions[name] = (population.x, population.y)
+        return positions
+
+    def xy(agents):
+        if not agents:
+            return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+        return tuple(np.array([agent.pos for agent in agents]).T)
+
+    get_agents_of_type = model.schedule.get_agents_of_type
+    sheep = get_agents_of_type(Sheep)
+    return {
+        "Lamprey(female)": xy([s for s in sheep if not s.stuck and s.sex == "Female"]),
+        "Lamprey(male)": xy([s for s in sheep if not s.stuck and s.sex == "Male"]),
+        "Lamprey(stuck)": xy([s for s in sheep if s.stuck]),
+        "Species_C": xy(get_agents_of_type(Sheep2)),
+        "Species_E": xy(get_agents_of_type(Wolf)),
+        "Species_D": xy(get_agents_of_type(Wolf2)),
+    }
+
+
+def render_image(model, saturation=3, layers=None):
+    """
+    The (height, width, 3) uint8 image of model, row 0 at the top (the
+    largest y), see the module docstring. layers selects the animal layers
+    to draw (all of them by default).
+    """
+    width, height = model.width, model.height
+    kind, fully_grown = patch_arrays(model)
+    # One palette entry per (kind, fully grown) pair: kind * 2 + grown
+    palette = np.tile(_rgb(BACKGROUND), (2 * (GRASS2 + 1), 1))
+    for (patch_kind, grown), color in PATCH_COLORS.items():
+        palette[2 * patch_kind + grown] = _rgb(color)
+    # (x, y) arrays -> rows from the top (the largest y), columns from the left
+    index = 2 * kind.T[::-1].astype(np.intp) + fully_grown.T[::-1]
+    image = palette.astype(np.uint8)[index].reshape(height * width, 3)
+
+    # Blend the animals into the cells that have any, only
+    for name, (x, y) in animal_positions(model).items():
+        if layers is not None and name not in layers:
+            continue
+        if not len(x):
+            continue
+        cells, counts = np.unique((height - 1 - y) * width + x, return_counts=True)
+        alpha = np.minimum(counts / saturation, 1.0)[:, None]
+        pixels = image[cells].astype(float)
+        pixels += alpha * (_rgb(ANIMAL_COLORS[name]) - pixels)
+        image[cells] = pixels.round()
+    return image.reshape(height, width, 3)
+
+
+class RasterCanvas(VisualizationElement):
+    """
+    Canvas element that sends the grid as one PNG per frame, see the module
+    docstring.
+
+    Args:
+        grid_width, grid_height: Size of the grid, in cells
+        canvas_width, canvas_height: Size of the canvas, in pixels
+        saturation: Number of animals from which a cell shows the colour of
+                    their layer only
+        layers: Names of the animal layers to draw; all by default
+        compresslevel: zlib level of the PNG (1 is fastest)
+    """
+
+    local_includes = ["RasterCanvasModule.js"]
+    local_dir = RESOURCES
+
+    def __init__(
+        self,
+        grid_width,
+        grid_height,
+        canvas_width=500,
+        canvas_height=500,
+        saturation=3,
+        layers=None,
+        compresslevel=1,
+    ):
+        super().__init__()
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        self.canvas_width = canvas_width
+        self.canvas_height = canvas_height
+        self.saturation = saturation
+        self.layers = layers
+        self.compresslevel = compresslevel
+        self.js_code = "elements.push(new RasterCanvasModule({}, {}));".format(
+            canvas_width, canvas_height
+        )
+
+    def render(self, model):
+        image = render_image(model, self.saturation, self.layers)
+        png = encode_png(image, self.compresslevel)
+        return "data:image/png;base64," + base64.b64encode(png).decode("ascii")
@@ -0,0 +1,333 @@
+"""
+Run recording and replay
+================================
+
+TraceRecorder writes a compact trace of a model2.WolfSheep run, step by
+step: the position and state of every animal, the state of the resource
+patches and the values of the model reporters. TraceReplay reads it back as
+a stand-in for the model, with a grid and a datacollector, so the
+visualization elements of the server (CanvasGrid, DeltaCanvasGrid,
+ChartModule, BatchChartModule) can show the recorded run, from any step,
+without simulating it again: a frame only costs decoding one step of the
+trace.
+
+A trace is a directory:
+
+- header.npz: the grid size, the reporter names and the kind of the patch
+  of every cell (field.EMPTY, GRASS or GRASS2), which never changes;
+- chunk_000000.npz, ...: chunk_size steps each, compressed, with per step
+  the reporter values, the fully_grown and para bits of the patches
+  (packed, one bit per cell) and the slice of the animal columns "type"
+  (index in ANIMAL_TYPES), "x", "y", "flags" (PARA, STUCK, MALE, and
+  INTEGER for an int energy) and "energy" given by "offsets".
+
+The recorder is enabled with the record_to model parameter (--record-to in
+headless.py).
+
+Example:
+>>> model = WolfSheep(resource1=True, sheep_gain_from_food=5, record_to="run.trace")
+>>> model.run_model(1000)
+>>> model.recorder.close()
+>>> replay = TraceReplay("run.trace", start=500)
+>>> replay.step()
+"""
+
+import bisect
+import os
+
+import numpy as np
+
+from .agents2 import GrassPatch, GrassPatch2, Sheep, Sheep2, Wolf, Wolf2
+from .collector import DEFAULT_CHUNK_SIZE
+from .field import EMPTY, GRASS, GRASS2
+
+ANIMAL_TYPES = (Sheep, Sheep2, Wolf, Wolf2)
+PATCH_TYPES = {GRASS: GrassPatch, GRASS2: GrassPatch2}
+
+# Bits of the "flags" column
+PARA = 1
+STUCK = 2
+MALE = 4
+INTEGER = 8
+
+
+def _patch_arrays(model):
+    """
+    The kind, fully_grown and para arrays, shaped (width, height), of the
+    resource patches of model.
+    """
+    field = getattr(model, "resource_field", None)
+    if field is not None:
+        return field.kind, field.fully_grown, field.para
+    shape = (model.width, model.height)
+    kind = np.full(shape, EMPTY, dtype=np.int8)
+    fully_grown = np.zeros(shape, dtype=bool)
+    para = np.zeros(shape, dtype=bool)
+    for patch_kind, patch_class in PATCH_TYPES.items():
+        patches = model.schedule.get_agents_of_type(patch_class)
+        if not patches:
+            continue
+        x, y = np.array([patch.pos for patch in patches]).T
+        kind[x, y] = patch_kind
+        fully_grown[x, y] = [patch.fully_grown for patch in patches]
+        para[x, y] = [bool(patch.para) for patch in patches]
+    return kind, fully_grown, para
+
+
+def _animal_columns(model):
+    """
+    The "type", "x", "y", "flags" and "energy" columns of the animals of
+    model.
+    """
+    columns = {name: [] for name in ("type", "x", "y", "flags", "energy")}
+    for code, agent_class in enumerate(ANIMAL_TYPES):
+        agents = [agent for agent in model.schedule.get_agents_of_type(agent_class) if agent.pos]
+        if not agents:
+            continue
+        x, y = np.array([agent.pos for agent in agents], dtype=np.int16).T
+        flags = np.array(
+            [
+                (PARA if agent.para else 0) | (INTEGER if isinstance(agent.energy, int) else 0)
+                for agent in agents
+            ],
+            dtype=np.uint8,
+        )
+        if agent_class is Sheep:
+            flags |= np.array(
+                [(STUCK if s.stuck else 0) | (MALE if s.sex == "Male" else 0) for s in agents],
+                dtype=np.uint8,
+            )
+        columns["type"].append(np.full(len(agents), code, dtype=np.uint8))
+        columns["x"].append(x)
+        columns["y"].append(y)
+        columns["flags"].append(flags)
+        columns["energy"].append(np.array([agent.energy for agent in agents], dtype=np.float64))
+    dtypes = {"type": np.uint8, "x": np.int16, "y": np.int16, "flags": np.uint8, "energy": np.float64}
+    return {
+        name: np.concatenate(parts) if parts else np.zeros(0, dtype=dtypes[name])
+        for name, parts in columns.items()
+    }
+
+
+class TraceRecorder:
+    """
+    Records a trace of a model, one step per record() call, see the module
+    docstring.
+
+    Args:
+        path: Directory of the trace
+        model_reporters: dict of reporter name -> function of the model
+        chunk_size: Number of steps per chunk file
+    """
+
+    def __init__(self, path, model_reporters, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.path = path
+        self.model_reporters = dict(model_reporters)
+        self.chunk_size = chunk_size
+        self.steps = 0
+        self.chunks = 0
+        self._buffer = []
+        os.makedirs(path, exist_ok=True)
+
+    def _write_header(self, model, kind):
+        np.savez(
+            os.path.join(self.path, "header.npz"),
+            width=model.width,
+            height=model.height,
+            reporters=np.array(list(self.model_reporters)),
+            kind=kind,
+        )
+
+    def record(self, model):
+        """
+        Record the current state of model.
+        """
+        kind, fully_grown, para = _patch_arrays(model)
+        if self.steps == 0:
+            self._write_header(model, kind)
+        self._buffer.append(
+            (
+                self.steps,
+                [float(reporter(model)) for reporter in self.model_reporters.values()],
+                np.packbits(fully_grown, axis=None),
+                np.packbits(para, axis=None),
+                _animal_columns(model),
+            )
+        )
+        self.steps += 1
+        if len(self._buffer) == self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Write out the steps recorded since the last chunk, if any.
+        """
+        if not self._buffer:
+            return
+        steps, reporters, fully_grown, para, animals = zip(*self._buffer)
+        counts = [len(columns["type"]) for columns in animals]
+        np.savez_compressed(
+            os.path.join(self.path, f"chunk_{self.chunks:06d}.npz"),
+            step=np.array(steps, dtype=np.int64),
+            reporters=np.array(reporters, dtype=np.float64).reshape(len(steps), -1),
+            fully_grown=np.stack(fully_grown),
+            para=np.stack(para),
+            offsets=np.concatenate([[0], np.cumsum(counts)]).astype(np.int64),
+            **{name: np.concatenate([columns[name] for columns in animals]) for name in animals[0]},
+        )
+        self.chunks += 1
+        self._buffer = []
+
+    def close(self):
+        """
+        Flush the steps not written yet. Nothing can be recorded afterwards.
+        """
+        self.flush()
+
+    def __getstate__(self):
+        # Copies would write to the same trace
+        raise TypeError(
+            "a TraceRecorder can't be pickled; snapshot models that are not "
+            "recording (without record_to)"
+        )
+
+
+class ReplayGrid:
+    """
+    The grid of a TraceReplay at its current step. Only provides what the
+    canvas elements read: width, height and get_cell_list_contents, which
+    returns agents of the model2 classes carrying their recorded state
+    (they are not in a model, and changing them changes nothing).
+    """
+
+    def __init__(self, width, height, kind):
+        self.width = width
+        self.height = height
+        self._kind = kind
+        self._fully_grown = np.zeros(kind.shape, dtype=bool)
+        self._para = np.zeros(kind.shape, dtype=bool)
+        self._cells = {}
+
+    def load(self, fully_grown, para, animals):
+        """
+        Show the patch states fully_grown and para, and the animal columns
+        animals.
+        """
+        self._fully_grown = fully_grown
+        self._para = para
+        cells = {}
+        for row in zip(*(animals[name].tolist() for name in ("type", "x", "y", "flags", "energy"))):
+            code, x, y, flags, energy = row
+            agent_class = ANIMAL_TYPES[code]
+            agent = agent_class.__new__(agent_class)
+            agent.pos = (x, y)
+            agent.energy = int(energy) if flags & INTEGER else energy
+            agent._para = bool(flags & PARA)
+            if agent_class is Sheep:
+                agent._stuck = bool(flags & STUCK)
+                agent._sex = "Male" if flags & MALE else "Female"
+            cells.setdefault((x, y), []).append(agent)
+        self._cells = cells
+
+    def _patch(self, pos):
+        patch_class = PATCH_TYPES[int(self._kind[pos])]
+        patch = patch_class.__new__(patch_class)
+        patch.pos = pos
+        patch._fully_grown = bool(self._fully_grown[pos])
+        patch._para = bool(self._para[pos])
+        return patch
+
+    def get_cell_list_contents(self, cell_list):
+        agents = []
+        for pos in cell_list:
+            if self._kind[pos] != EMPTY:
+                agents.append(self._patch(pos))
+            agents.extend(self._cells.get(pos, ()))
+        return agents
+
+
+class _ReplayCollector:
+    # The datacollector of a TraceReplay: the reporters up to its current step
+    def __init__(self, replay):
+        self._replay = replay
+
+    @property
+    def model_vars(self):
+        end = self._replay.current_step + 1
+        values = self._replay.reporters
+        return {name: values[:end, i] for i, name in enumerate(self._replay.reporter_names)}
+
+
+class TraceReplay:
+    """
+    Plays back a trace written by a TraceRecorder as a model for the
+    visualization server: step() moves stride steps on, and running turns
+    False at the last step.
+
+    Args:
+        path: Directory of the trace
+        start: Step to start at
+        stride: Number of recorded steps per step()
+    """
+
+    def __init__(self, path, start=0, stride=1):
+        self.path = path
+        self.stride = max(int(stride), 1)
+        with np.load(os.path.join(path, "header.npz")) as header:
+            self.width = int(header["width"])
+            self.height = int(header["height"])
+            self.reporter_names = [str(name) for name in header["reporters"]]
+            kind = header["kind"]
+        files = sorted(
+            name for name in os.listdir(path) if name.startswith("chunk_") and name.endswith(".npz")
+        )
+        self._files = [os.path.join(path, name) for name in files]
+        # First step of every chunk, and all the reporters (small, and needed
+        # for the chart's history)
+        self._first_steps = []
+        reporters = []
+        for file_name in self._files:
+            with np.load(file_name) as chunk:
+                self._first_steps.append(int(chunk["step"][0]))
+                reporters.append(chunk["reporters"])
+        if not reporters:
+            raise ValueError(f"{path} has no recorded steps")
+        self.reporters = np.concatenate(reporters)
+        self.steps = len(self.reporters)
+        self._chunk_index = None
+        self._chunk = None
+        self.grid = ReplayGrid(self.width, self.height, kind)
+        self.datacollector = _ReplayCollector(self)
+        self.current_step = 0
+        self.running = True
+        self.seek(start)
+
+    def _load_chunk(self, index):
+        if index != self._chunk_index:
+            with np.load(self._files[index]) as chunk:
+                self._chunk = {name: chunk[name] for name in chunk.files}
+            self._chunk_index = index
+
+    def seek(self, step):
+        """
+        Show the recorded step (clamped to the trace).
+        """
+        step = min(max(int(step), 0), self.steps - 1)
+        index = bisect.bisect_right(self._first_steps, step) - 1
+        self._load_chunk(index)
+        chunk = self._chunk
+        row = step - self._first_steps[index]
+        cells = self.width * self.height
+        shape = (self.width, self.height)
+        fully_grown = np.unpackbits(chunk["fully_grown"][row], count=cells).astype(bool)
+        para = np.unpackbits(chunk["para"][row], count=cells).astype(bool)
+        begin, end = chunk["offsets"][row], chunk["offsets"][row + 1]
+        animals = {
+            name: chunk[name][begin:end] for name in ("type", "x", "y", "flags", "energy")
+        }
+        self.grid.load(fully_grown.reshape(shape), para.reshape(shape), animals)
+        self.current_step = step
+        self.running = step < self.steps - 1
+
+    def step(self):
+        self.seek(self.current_step + self.stride)
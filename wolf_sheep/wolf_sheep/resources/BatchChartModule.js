@@ -0,0 +1,77 @@
+/**
+Batched line chart
+====================================================================
+
+Client side of background.BatchChartModule: a ChartModule that receives,
+with each frame, every step since the previous frame, as
+{"start": first step, "values": [[values of the series], ...]}, and labels
+the points with their step numbers.
+*/
+
+const BatchChartModule = function (series, canvas_width, canvas_height) {
+  const canvas = document.createElement("canvas");
+  Object.assign(canvas, {
+    width: canvas_width,
+    height: canvas_height,
+    style: "border:1px dotted",
+  });
+  document.getElementById("elements").appendChild(canvas);
+  const context = canvas.getContext("2d");
+
+  const convertColorOpacity = (hex) => {
+    if (hex.indexOf("#") != 0) {
+      return "rgba(0,0,0,0.1)";
+    }
+    hex = hex.replace("#", "");
+    const r = parseInt(hex.substring(0, 2), 16);
+    const g = parseInt(hex.substring(2, 4), 16);
+    const b = parseInt(hex.substring(4, 6), 16);
+    return `rgba(${r},${g},${b},0.1)`;
+  };
+
+  const datasets = series.map((s) => {
+    const dataset = {
+      backgroundColor: convertColorOpacity(s.Color),
+      borderColor: s.Color,
+      label: s.Label,
+      data: [],
+      pointRadius: 0,
+    };
+    for (const property in s) {
+      if (!["Color", "Label"].includes(property)) dataset[property] = s[property];
+    }
+    return dataset;
+  });
+
+  const chart = new Chart(context, {
+    type: "line",
+    data: { labels: [], datasets: datasets },
+    options: {
+      responsive: true,
+      animation: false,
+      scales: {
+        x: { display: true, ticks: { maxTicksLimit: 11 } },
+        y: { display: true },
+      },
+    },
+  });
+
+  this.render = (data) => {
+    const count = data.values.length ? data.values[0].length : 0;
+    if (!count) return;
+    for (let j = 0; j < count; j++) chart.data.labels.push(data.start + j);
+    data.values.forEach((values, i) => {
+      const points = chart.data.datasets[i].data;
+      for (const value of values) points.push(value);
+    });
+    chart.update("none");
+  };
+
+  this.reset = () => {
+    chart.data.labels.length = 0;
+    chart.data.datasets.forEach((dataset) => {
+      dataset.data.length = 0;
+    });
+    chart.update("none");
+  };
+};
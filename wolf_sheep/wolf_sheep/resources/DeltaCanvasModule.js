@@ -0,0 +1,76 @@
+/**
+Delta-encoded canvas grid
+====================================================================
+
+Client side of canvas.DeltaCanvasGrid. Each frame is
+
+{"keyframe": true | false,
+ "styles": {style number: portrayal without x, y and text, ...},
+ "cells": [[x, y, items], ...]}
+
+where items are style numbers, or [style number, text], in layer order. A
+keyframe clears the canvas and the styles; otherwise only the cells listed
+are cleared and drawn again, with GridDraw.js.
+*/
+
+const DeltaCanvasModule = function (
+  canvas_width,
+  canvas_height,
+  grid_width,
+  grid_height
+) {
+  const parent = document.createElement("div");
+  parent.style.height = `${canvas_height}px`;
+  parent.className = "world-grid-parent";
+  const canvas = document.createElement("canvas");
+  canvas.width = canvas_width;
+  canvas.height = canvas_height;
+  canvas.className = "world-grid";
+  parent.appendChild(canvas);
+  document.getElementById("elements").appendChild(parent);
+
+  const context = canvas.getContext("2d");
+  const canvasDraw = new GridVisualization(
+    canvas_width,
+    canvas_height,
+    grid_width,
+    grid_height,
+    context,
+    null
+  );
+  const cellWidth = Math.floor(canvas_width / grid_width);
+  const cellHeight = Math.floor(canvas_height / grid_height);
+  let styles = {};
+
+  const drawCell = (x, y, items) => {
+    // The canvas y axis points down
+    const left = x * cellWidth;
+    const top = (grid_height - y - 1) * cellHeight;
+    context.clearRect(left, top, cellWidth, cellHeight);
+    const portrayals = items.map((item) => {
+      const [style, text] = Array.isArray(item) ? item : [item, undefined];
+      const portrayal = Object.assign({}, styles[style], { x: x, y: y });
+      if (text !== undefined) portrayal.text = text;
+      return portrayal;
+    });
+    if (portrayals.length) canvasDraw.drawLayer(portrayals);
+    context.beginPath();
+    context.strokeStyle = "#eee";
+    context.strokeRect(left + 0.5, top + 0.5, cellWidth, cellHeight);
+  };
+
+  this.render = (data) => {
+    if (data.keyframe) {
+      canvasDraw.resetCanvas();
+      styles = {};
+    }
+    Object.assign(styles, data.styles);
+    for (const [x, y, items] of data.cells) drawCell(x, y, items);
+    if (data.keyframe) canvasDraw.drawGridLines("#eee");
+  };
+
+  this.reset = () => {
+    canvasDraw.resetCanvas();
+    styles = {};
+  };
+};
@@ -0,0 +1,29 @@
+/**
+Raster canvas
+====================================================================
+
+Client side of raster.RasterCanvas: each frame is the grid as one PNG data
+URL, one pixel per cell, scaled to the canvas without smoothing.
+*/
+
+const RasterCanvasModule = function (canvas_width, canvas_height) {
+  const canvas = document.createElement("canvas");
+  canvas.width = canvas_width;
+  canvas.height = canvas_height;
+  canvas.style.border = "1px dotted";
+  document.getElementById("elements").appendChild(canvas);
+  const context = canvas.getContext("2d");
+  const image = new Image();
+  image.onload = () => {
+    context.imageSmoothingEnabled = false;
+    context.drawImage(image, 0, 0, canvas_width, canvas_height);
+  };
+
+  this.render = (data) => {
+    image.src = data;
+  };
+
+  this.reset = () => {
+    context.clearRect(0, 0, canvas_width, canvas_height);
+  };
+};
@@ -1,18 +1,399 @@
-from typing import Callable, Optional, Type
+import heapq
+import operator
+import time
+from typing import Any, Callable, Optional, Type
 
 import mesa
 
 
+class TrackedAttribute(property):
+    """
+    An agent attribute that reports every change to the model's scheduler and
+    grid (when they define attribute_changed), so that counters registered
+    with RandomActivationByTypeFiltered.add_counter and the buckets of a
+    TypedMultiGrid stay up to date.
+
+    The value is kept in the attribute '_' + name, which a class with
+    __slots__ must list among its slots, and is read back with an
+    operator.attrgetter so that reads don't run Python code. The attribute
+    must be assigned (usually in __init__) before it is read.
+
+    Example:
+    >>> class Sheep(mesa.Agent):
+    ...     __slots__ = ("_sex",)
+    ...     sex = TrackedAttribute()
+    """
+
+    def __set_name__(self, owner, name):
+        self.name = name
+        self.storage = "_" + name
+        # The name is only known now, so set up the property here
+        super().__init__(operator.attrgetter(self.storage), self._set)
+
+    def _set(self, agent, value):
+        old = getattr(agent, self.storage, None)
+        setattr(agent, self.storage, value)
+        if old != value:
+            model = agent.model
+            for observer in (model.schedule, getattr(model, "grid", None)):
+                attribute_changed = getattr(observer, "attribute_changed", None)
+                if attribute_changed is not None:
+                    attribute_changed(agent, self.name, old, value)
+
+
+class TimingWheel:
+    """
+    Timers keyed by step. Timers less than size steps ahead go in a ring of
+    size buckets, one per step, so adding a timer and taking the timers of a
+    step cost O(1) each however many timers are pending; timers further
+    ahead wait in a heap until they come within range.
+
+    Example:
+    >>> wheel = TimingWheel()
+    >>> wheel.schedule(5, "a")
+    >>> wheel.pop_due(5)
+    ['a']
+    """
+
+    def __init__(self, size=64):
+        self.size = size
+        self.buckets = [[] for _ in range(size)]
+        self.overflow = []
+        # Tie-break of the overflow timers of the same step, a plain int so
+        # that a wheel pickles (snapshot.save, snapshot.fork)
+        self._sequence = 0
+        # The first step whose bucket has not been popped yet
+        self.now = 0
+
+    def __len__(self):
+        return sum(map(len, self.buckets)) + len(self.overflow)
+
+    def schedule(self, step, item):
+        """
+        Add a timer for item at step (at the next pop_due if it is past).
+        """
+        step = max(step, self.now)
+        if step - self.now < self.size:
+            self.buckets[step % self.size].append(item)
+        else:
+            heapq.heappush(self.overflow, (step, self._sequence, item))
+            self._sequence += 1
+
+    def pop_due(self, step):
+        """
+        Remove and return the items of the timers for steps up to step, in
+        order of step, then of scheduling.
+        """
+        due = []
+        while self.now <= step:
+            bucket = self.buckets[self.now % self.size]
+            due.extend(bucket)
+            bucket.clear()
+            self.now += 1
+            overflow = self.overflow
+            while overflow and overflow[0][0] - self.now < self.size:
+                timer_step, _, item = heapq.heappop(overflow)
+                self.buckets[timer_step % self.size].append(item)
+        return due
+
+
+class _Counter:
+    __slots__ = ("type_class", "attr", "predicate", "count")
+
+    def __init__(self, type_class, attr, predicate):
+        self.type_class = type_class
+        self.attr = attr
+        self.predicate = predicate
+        self.count = 0
+
+
 class RandomActivationByTypeFiltered(mesa.time.RandomActivationByType):
     """
     A scheduler that overrides the get_type_count method to allow for filtering
     of agents by a function before counting.
 
+    Counts that are needed every step can instead be registered by name with
+    add_counter; they are kept up to date as agents are added, removed or
+    change the counted attribute, and read back in O(1) with get_counter.
+
+    Agents can also be removed later with remove_later: they are not
+    stepped any more, and leave the queue when remove_pending is called.
+
+    The agents of a type passed to step_on_demand are only stepped while
+    they are active, so that a step costs nothing for the ones with nothing
+    to do. After each step, agent.next_activation() tells when it needs to
+    be stepped next: schedule.steps + 1 (every step) keeps it active, a
+    later step puts it to sleep until then (on a TimingWheel), and None
+    until it is woken by wake(), e.g. through a condition registered with
+    add_wake_condition. An agent woken while its own type is being stepped
+    is stepped in the same step, after the others.
+
+    If profiler is set (e.g. to a profiling.StepProfiler), the time, number
+    of agents and number of step() calls of each type's step are reported
+    to profiler.record_type.
+
+    mesa wraps step() in a method that takes no arguments, so the order of
+    the types and of the agents within a type are set with the attributes
+    shuffle_types and shuffle_agents (both True by default) instead.
+
     Example:
     >>> scheduler = RandomActivationByTypeFiltered(model)
     >>> scheduler.get_type_count(AgentA, lambda agent: agent.some_attribute > 10)
+    >>> scheduler.add_counter("AgentA where flag", AgentA, "flag")
+    >>> scheduler.get_counter("AgentA where flag")
     """
 
+    def __init__(self, model, agents=None):
+        self._counters = {}
+        self._counters_by_type = {}
+        self._counters_by_attr = {}
+        self._pending_removal = {}
+        self._active = {}
+        self._timers = TimingWheel()
+        self._wake_at = {}
+        self._wake_conditions = {}
+        # The active agents of the type being stepped, and the agents of
+        # that type woken meanwhile
+        self._turn = None
+        self._woken_in_turn = []
+        self.profiler = None
+        self.shuffle_types = True
+        self.shuffle_agents = True
+        super().__init__(model, agents)
+
+    def add_counter(
+        self,
+        name: str,
+        type_class: Type[mesa.Agent],
+        attr: str,
+        predicate: Callable[[Any], bool] = bool,
+    ) -> None:
+        """
+        Register a counter of the agents of type_class in the queue for which
+        predicate(agent.<attr>) is true. attr must be a TrackedAttribute of
+        type_class, otherwise changes to it are not seen.
+        """
+        if name in self._counters:
+            raise ValueError(f"counter {name!r} already registered")
+        counter = _Counter(type_class, attr, predicate)
+        if type_class in self._agents_by_type:
+            for agent in self._agents_by_type[type_class]:
+                if predicate(getattr(agent, attr)):
+                    counter.count += 1
+        self._counters[name] = counter
+        self._counters_by_type.setdefault(type_class, []).append(counter)
+        self._counters_by_attr.setdefault((type_class, attr), []).append(counter)
+
+    def get_counter(self, name: str) -> int:
+        """
+        Returns the current value of a counter registered with add_counter.
+        """
+        return self._counters[name].count
+
+    def step_on_demand(self, type_class: Type[mesa.Agent]) -> None:
+        """
+        Step the agents of type_class only while they are active (see the
+        class docstring). They must define next_activation(). The agents of
+        type_class already in the queue start active.
+        """
+        active = self._active.setdefault(type_class, {})
+        if type_class in self._agents_by_type:
+            for agent in self._agents_by_type[type_class]:
+                active[agent] = None
+
+    def add_wake_condition(
+        self,
+        type_class: Type[mesa.Agent],
+        attr: str,
+        predicate: Callable[[Any], bool] = bool,
+    ) -> None:
+        """
+        Wake an agent of type_class whenever attr changes to a value for
+        which predicate is true. attr must be a TrackedAttribute.
+        """
+        self._wake_conditions.setdefault((type_class, attr), []).append(predicate)
+
+    def wake(self, agent: mesa.Agent) -> None:
+        """
+        Make agent active again, if its type is stepped on demand.
+        """
+        active = self._active.get(type(agent))
+        if active is not None and agent in self._agents:
+            if active is self._turn and agent not in active:
+                self._woken_in_turn.append(agent)
+            active[agent] = None
+            self._wake_at.pop(agent, None)
+
+    def sleep(self, agent: mesa.Agent, until: Optional[int] = None) -> None:
+        """
+        Stop stepping agent until it is woken, or until step until (the value
+        of schedule.steps) begins. Replaces the agent's earlier timer, if any.
+        """
+        self._active[type(agent)].pop(agent, None)
+        if until is None:
+            self._wake_at.pop(agent, None)
+        else:
+            self._wake_at[agent] = until
+            self._timers.schedule(until, (until, agent))
+
+    def get_active_count(self, type_class: Type[mesa.Agent]) -> int:
+        """
+        Returns the number of active agents of a type stepped on demand.
+        """
+        return len(self._active.get(type_class, ()))
+
+    def add(self, agent: mesa.Agent) -> None:
+        super().add(agent)
+        active = self._active.get(type(agent))
+        if active is not None:
+            active[agent] = None
+        for counter in self._counters_by_type.get(type(agent), ()):
+            if counter.predicate(getattr(agent, counter.attr)):
+                counter.count += 1
+
+    def remove(self, agent: mesa.Agent) -> None:
+        super().remove(agent)
+        active = self._active.get(type(agent))
+        if active is not None:
+            active.pop(agent, None)
+        for counter in self._counters_by_type.get(type(agent), ()):
+            if counter.predicate(getattr(agent, counter.attr)):
+                counter.count -= 1
+
+    def remove_later(self, agent: mesa.Agent) -> None:
+        """
+        Stop stepping agent now, and remove it from the queue at the next
+        remove_pending call.
+        """
+        self._pending_removal[agent] = None
+
+    def remove_pending(self) -> list:
+        """
+        Remove the agents passed to remove_later since the last call, and
+        return them.
+        """
+        agents = list(self._pending_removal)
+        self._pending_removal.clear()
+        for agent in agents:
+            self.remove(agent)
+        return agents
+
+    def step(
+        self, shuffle_types: Optional[bool] = None, shuffle_agents: Optional[bool] = None
+    ) -> None:
+        """
+        Step every type of agent in turn. shuffle_types and shuffle_agents
+        default to the attributes of the same name.
+        """
+        if shuffle_types is None:
+            shuffle_types = self.shuffle_types
+        if shuffle_agents is None:
+            shuffle_agents = self.shuffle_agents
+        wake_at = self._wake_at
+        for until, agent in self._timers.pop_due(self.steps):
+            # Skip the timers replaced by a later sleep or cancelled by wake
+            if wake_at.get(agent) == until:
+                self.wake(agent)
+        super().step(shuffle_types, shuffle_agents)
+
+    def _step_active(self, active, shuffle_agents):
+        agents = list(active)
+        if shuffle_agents:
+            self.model.random.shuffle(agents)
+        pending = self._pending_removal
+        next_step = self.steps + 1
+        woken = self._woken_in_turn
+        self._turn = active
+        calls = 0
+        stepped = None
+        try:
+            while agents:
+                for agent in agents:
+                    if agent in pending:
+                        continue
+                    agent.step()
+                    calls += 1
+                    activation = agent.next_activation()
+                    if activation != next_step:
+                        self.sleep(agent, activation)
+                if not woken:
+                    break
+                # The agents woken during this turn were asleep when it
+                # began; they are stepped after the others, as they would
+                # have been stepped this step without step_on_demand. Those
+                # that were stepped before going to sleep again are not.
+                if stepped is None:
+                    stepped = set(agents)
+                else:
+                    stepped.update(agents)
+                agents = [
+                    agent
+                    for agent in dict.fromkeys(woken)
+                    if agent not in stepped and agent in active
+                ]
+                woken.clear()
+        finally:
+            self._turn = None
+            woken.clear()
+        return calls
+
+    def _step_all(self, agenttype, shuffle_agents):
+        agents = self._agents_by_type[agenttype]
+        if shuffle_agents:
+            agents.shuffle(inplace=True)
+        # AgentSet.do, skipping the agents waiting to be removed (including
+        # those passed to remove_later during this loop)
+        pending = self._pending_removal
+        agent_refs = agents._agents.keyrefs()
+        skipped = 0
+        for agent_ref in agent_refs:
+            agent = agent_ref()
+            if agent is None or agent in pending:
+                skipped += 1
+                continue
+            agent.step()
+        return len(agent_refs) - skipped
+
+    def step_type(self, agenttype: Type[mesa.Agent], shuffle_agents: bool = True) -> None:
+        active = self._active.get(agenttype)
+        profiler = self.profiler
+        if profiler is None:
+            if active is None:
+                self._step_all(agenttype, shuffle_agents)
+            else:
+                self._step_active(active, shuffle_agents)
+            return
+        agent_count = len(self._agents_by_type[agenttype])
+        start = time.perf_counter()
+        if active is None:
+            calls = self._step_all(agenttype, shuffle_agents)
+        else:
+            calls = self._step_active(active, shuffle_agents)
+        profiler.record_type(agenttype, time.perf_counter() - start, agent_count, calls)
+
+    def attribute_changed(self, agent, attr, old, new) -> None:
+        """
+        Called by TrackedAttribute when attr of agent changes from old to new.
+        """
+        key = (type(agent), attr)
+        counters = self._counters_by_attr.get(key)
+        conditions = self._wake_conditions.get(key)
+        if (counters is None and conditions is None) or agent not in self._agents:
+            return
+        for counter in counters or ():
+            counter.count += counter.predicate(new) - counter.predicate(old)
+        for predicate in conditions or ():
+            if predicate(new):
+                self.wake(agent)
+                break
+
+    def get_agents_of_type(self, type_class: Type[mesa.Agent]) -> list:
+        """
+        Returns a list of the agents of type_class in the schedule.
+        """
+        agents = self._agents_by_type.get(type_class)
+        return list(agents) if agents is not None else []
+
     def get_type_count(
         self,
         type_class: Type[mesa.Agent],
@@ -22,10 +403,12 @@ class RandomActivationByTypeFiltered(mesa.time.RandomActivationByType):
         Returns the current number of agents of certain type in the queue
         that satisfy the filter function.
         """
-        if type_class not in self.agents_by_type:
+        if type_class not in self._agents_by_type:
             return 0
+        if filter_func is None:
+            return len(self._agents_by_type[type_class])
         count = 0
-        for agent in self.agents_by_type[type_class].values():
-            if filter_func is None or filter_func(agent):
+        for agent in self._agents_by_type[type_class]:
+            if filter_func(agent):
                 count += 1
         return count
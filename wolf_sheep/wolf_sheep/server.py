@@ -1,6 +1,14 @@
 import mesa
 from wolf_sheep.agents2 import GrassPatch, Sheep, Wolf, GrassPatch2, Sheep2, Wolf2
+from wolf_sheep.background import BackgroundServer, BatchChartModule
+from wolf_sheep.canvas import DeltaCanvasGrid, DeltaModularServer
 from wolf_sheep.model2 import WolfSheep
+from wolf_sheep.raster import RasterCanvas
+from wolf_sheep.replay import TraceReplay
+from wolf_sheep.sessions import SessionServer
+
+GRID_WIDTH = 20
+GRID_HEIGHT = 20
 
 
 def wolf_sheep_portrayal(agent):
@@ -53,23 +61,28 @@ def wolf_sheep_portrayal(agent):
     return portrayal
 
 
-canvas_element = mesa.visualization.CanvasGrid(wolf_sheep_portrayal, 20, 20, 500, 500)
-chart_element = mesa.visualization.ChartModule(
-    [
-        {"Label": "Species_E", "Color": "#AA0000"},
-        {"Label": "Lamprey(male)", "Color": "#E2D246"},
-        {"Label": "Lamprey(female)", "Color": "#A626B5"},
-        {"Label": "Species_B", "Color": "#00AA00"},
-        {"Label": "Species_A", "Color": "#201E9B"},
-        {"Label": "Species_C", "Color": "#1CDCD3"},
-        {"Label": "Species_D", "Color": "#EB8E17"},
-        {"Label": "Parasite", "Color": "#171614"},
-    ]
+# Sends only the cells that changed; wolves show their energy, which changes
+# every step without a grid event
+canvas_element = DeltaCanvasGrid(
+    wolf_sheep_portrayal, GRID_WIDTH, GRID_HEIGHT, 500, 500, volatile_types=(Wolf,)
 )
+CHART_SERIES = [
+    {"Label": "Species_E", "Color": "#AA0000"},
+    {"Label": "Lamprey(male)", "Color": "#E2D246"},
+    {"Label": "Lamprey(female)", "Color": "#A626B5"},
+    {"Label": "Species_B", "Color": "#00AA00"},
+    {"Label": "Species_A", "Color": "#201E9B"},
+    {"Label": "Species_C", "Color": "#1CDCD3"},
+    {"Label": "Species_D", "Color": "#EB8E17"},
+    {"Label": "Parasite", "Color": "#171614"},
+]
+chart_element = mesa.visualization.ChartModule(CHART_SERIES)
 
 model_params = {
     # The following line is an example to showcase StaticText.
     "title": mesa.visualization.StaticText("Parameters:"),
+    "width": GRID_WIDTH,
+    "height": GRID_HEIGHT,
     "resource1": mesa.visualization.Checkbox("Grass Enabled", True),
     "resource_regrowth_time": mesa.visualization.Slider("Grass Regrowth Time", 25, 1, 50),
     "initial_sheep": mesa.visualization.Slider(
@@ -93,7 +106,96 @@ model_params = {
     "sheep_gain_from_food": mesa.visualization.Slider("Sheep Gain From Food", 5, 0, 10),
 }
 
-server = mesa.visualization.ModularServer(
+server = DeltaModularServer(
     WolfSheep, [canvas_element, chart_element], "Wolf Sheep Predation", model_params
 )
 server.port = 8521
+
+
+def make_background_server():
+    """
+    A BackgroundServer for the same model and parameters as server: the
+    model runs at full speed in a worker thread, and the page shows the
+    latest state at its frame rate, with every step in the chart.
+    """
+    background_canvas = DeltaCanvasGrid(
+        wolf_sheep_portrayal, GRID_WIDTH, GRID_HEIGHT, 500, 500, volatile_types=(Wolf,)
+    )
+    background_server = BackgroundServer(
+        WolfSheep,
+        [background_canvas, BatchChartModule(CHART_SERIES)],
+        "Wolf Sheep Predation",
+        model_params,
+    )
+    background_server.port = 8521
+    return background_server
+
+
+def make_raster_server(size=1000):
+    """
+    A BackgroundServer for a size x size grid, drawn by a RasterCanvas, one
+    pixel per cell. The resource patches are kept in a ResourceField.
+    """
+    raster_params = dict(model_params, width=size, height=size, resource_field=True)
+    raster_server = BackgroundServer(
+        WolfSheep,
+        [RasterCanvas(size, size, 800, 800), BatchChartModule(CHART_SERIES)],
+        "Wolf Sheep Predation",
+        raster_params,
+    )
+    raster_server.port = 8521
+    return raster_server
+
+
+def session_elements():
+    """
+    The visualization elements of one session of the session server.
+    """
+    session_canvas = DeltaCanvasGrid(
+        wolf_sheep_portrayal, GRID_WIDTH, GRID_HEIGHT, 500, 500, volatile_types=(Wolf,)
+    )
+    return [session_canvas, mesa.visualization.ChartModule(CHART_SERIES)]
+
+
+def make_session_server(processes=None, max_sessions=16):
+    """
+    A SessionServer for the same model and parameters as server: every page
+    gets its own model, in one of processes worker processes, with up to
+    max_sessions pages at once.
+    """
+    session_server = SessionServer(
+        WolfSheep,
+        session_elements,
+        "Wolf Sheep Predation",
+        model_params,
+        processes=processes,
+        max_sessions=max_sessions,
+    )
+    session_server.port = 8521
+    return session_server
+
+
+def make_replay_server(path):
+    """
+    A DeltaModularServer that plays back the trace recorded in path (see
+    replay.py) instead of running the model. The start step and the number
+    of recorded steps per frame are parameters: set them and press Reset to
+    seek.
+    """
+    trace = TraceReplay(path)
+    replay_params = {
+        "path": path,
+        "start": mesa.visualization.Slider("Start at step", 0, 0, trace.steps - 1),
+        "stride": mesa.visualization.Slider("Steps per frame", 1, 1, 50),
+    }
+    replay_canvas = DeltaCanvasGrid(
+        wolf_sheep_portrayal, trace.width, trace.height, 500, 500
+    )
+    replay_server = DeltaModularServer(
+        TraceReplay,
+        [replay_canvas, BatchChartModule(CHART_SERIES)],
+        "Wolf Sheep Predation (replay)",
+        replay_params,
+    )
+    replay_server.port = 8521
+    return replay_server
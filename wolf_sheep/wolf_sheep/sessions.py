@@ -0,0 +1,404 @@
+"""
+Multi-session server
+================================
+
+In mesa's ModularServer there is one model, in the web process, shared by
+every browser page. SessionServer gives every websocket session its own
+model instead, hosted in a worker process of a SessionPool, so the sessions
+of several users neither share their state nor their CPU: the web process
+only relays the messages of the pages (reset, get_step and the parameter
+changes) and the frames rendered by the workers.
+
+The pool has a fixed number of worker processes, started on demand; each
+session goes to the worker with the fewest sessions and stays there, with
+its model and its own visualization elements (made by make_elements, e.g.
+a DeltaCanvasGrid keeps per-session state). A worker that died is started
+again for the next session; the sessions it hosted are closed.
+
+Sessions are limited to max_sessions: further pages are closed at once with
+code 1013 (try again later). A session whose page sent no message for
+idle_timeout seconds (a stopped page) is closed and its model dropped.
+
+The workers import model_cls and make_elements by name, so both must be
+defined at module level, and the script that launches the server must
+guard it with if __name__ == "__main__".
+
+Example:
+>>> server = SessionServer(
+...     WolfSheep, make_elements, "Wolf Sheep", model_params, max_sessions=8
+... )
+>>> server.launch()
+"""
+
+import asyncio
+import concurrent.futures
+import copy
+import itertools
+import multiprocessing
+import os
+import time
+import traceback
+
+import mesa
+import tornado.escape
+import tornado.ioloop
+import tornado.web
+from mesa_viz_tornado.ModularVisualization import SocketHandler, is_user_param
+
+DEFAULT_MAX_SESSIONS = 16
+DEFAULT_IDLE_TIMEOUT = 600.0
+
+# Websocket close codes
+TRY_AGAIN_LATER = 1013
+GOING_AWAY = 1001
+INTERNAL_ERROR = 1011
+
+
+class SessionLimitError(RuntimeError):
+    pass
+
+
+class SessionError(RuntimeError):
+    pass
+
+
+def _render(model, elements):
+    return [element.render(model) for element in elements]
+
+
+def _serve(connection, model_cls, make_elements):
+    """
+    Main loop of a worker process: runs the commands (command, session,
+    argument) received on connection, and sends back (ok, reply).
+    """
+    sessions = {}
+    while True:
+        try:
+            message = connection.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        command, session, argument = message
+        try:
+            if command == "reset":
+                model = model_cls(**argument)
+                # As ModularServer.reset_model
+                model.running = True
+                sessions[session] = (model, make_elements())
+                reply = _render(*sessions[session])
+            elif command == "step":
+                model, elements = sessions[session]
+                if model.running:
+                    model.step()
+                    reply = _render(model, elements)
+                else:
+                    reply = None
+            elif command == "close":
+                sessions.pop(session, None)
+                reply = None
+            else:
+                raise ValueError(f"Unknown command {command!r}")
+        except Exception:
+            connection.send((False, traceback.format_exc()))
+        else:
+            connection.send((True, reply))
+
+
+class _Worker:
+    """
+    A worker process and the thread that relays the commands to it, one at
+    a time.
+    """
+
+    def __init__(self, context, model_cls, make_elements):
+        self.connection, child = context.Pipe()
+        self.process = context.Process(
+            target=_serve, args=(child, model_cls, make_elements), daemon=True
+        )
+        self.process.start()
+        child.close()
+        self.sessions = set()
+        self._relay = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+    def _call(self, message):
+        try:
+            self.connection.send(message)
+            ok, reply = self.connection.recv()
+        except (EOFError, OSError) as exception:
+            raise SessionError("The worker process has died") from exception
+        if not ok:
+            raise SessionError(reply)
+        return reply
+
+    def call(self, command, session, argument=None):
+        return self._relay.submit(self._call, (command, session, argument))
+
+    def close(self):
+        if self.process.is_alive():
+            try:
+                self.connection.send(None)
+            except OSError:
+                pass
+        self._relay.shutdown(wait=False)
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.connection.close()
+
+
+class SessionPool:
+    """
+    Hosts the models of the sessions in worker processes, see the module
+    docstring.
+
+    Args:
+        model_cls: Model class, defined at module level
+        make_elements: Module-level function that returns the visualization
+                       elements of a new session
+        processes: Number of worker processes; os.cpu_count() by default
+        max_sessions: Maximum number of open sessions
+    """
+
+    def __init__(
+        self, model_cls, make_elements, processes=None, max_sessions=DEFAULT_MAX_SESSIONS
+    ):
+        self.model_cls = model_cls
+        self.make_elements = make_elements
+        self.processes = processes or os.cpu_count() or 1
+        self.max_sessions = max_sessions
+        # Spawned, not forked, as the web process runs threads
+        self._context = multiprocessing.get_context("spawn")
+        self._workers = [None] * self.processes
+        self._sessions = {}
+        self._ids = itertools.count()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _worker(self, index):
+        worker = self._workers[index]
+        if worker is not None and not worker.process.is_alive():
+            for session in worker.sessions:
+                del self._sessions[session]
+            worker.close()
+            worker = None
+        if worker is None:
+            worker = self._workers[index] = _Worker(
+                self._context, self.model_cls, self.make_elements
+            )
+        return worker
+
+    def _call(self, session, command, argument=None):
+        worker = self._sessions.get(session)
+        if worker is None:
+            # Closed, or dropped with its dead worker: fail like a call would
+            future = concurrent.futures.Future()
+            future.set_exception(SessionError(f"Session {session} was closed"))
+            return future
+        return worker.call(command, session, argument)
+
+    def open(self):
+        """
+        Returns the id of a new session, without a model until its first
+        reset. Raises SessionLimitError if max_sessions are open.
+        """
+        if len(self._sessions) >= self.max_sessions:
+            raise SessionLimitError(f"{self.max_sessions} sessions are open")
+        index = min(
+            range(self.processes),
+            key=lambda i: len(self._workers[i].sessions) if self._workers[i] else 0,
+        )
+        worker = self._worker(index)
+        session = next(self._ids)
+        worker.sessions.add(session)
+        self._sessions[session] = worker
+        return session
+
+    def reset(self, session, model_kwargs):
+        """
+        Returns a concurrent.futures.Future of the first frame of a new
+        model_cls(**model_kwargs) for session. The future fails with
+        SessionError if the model or its worker failed, or if session was
+        closed.
+        """
+        return self._call(session, "reset", model_kwargs)
+
+    def step(self, session):
+        """
+        Returns a concurrent.futures.Future of the frame after the next step
+        of the model of session, or of None if it has stopped running. Fails
+        as reset does.
+        """
+        return self._call(session, "step")
+
+    def close(self, session):
+        """
+        Drop session and its model.
+        """
+        worker = self._sessions.pop(session, None)
+        if worker is not None:
+            worker.sessions.discard(session)
+            worker.call("close", session)
+
+    def shutdown(self):
+        """
+        Stop the worker processes.
+        """
+        for worker in self._workers:
+            if worker is not None:
+                worker.close()
+        self._workers = [None] * self.processes
+        self._sessions = {}
+
+
+class SessionSocketHandler(SocketHandler):
+    """
+    The websocket handler of SessionServer: one session per connection,
+    with its own parameter values.
+    """
+
+    def open(self):
+        application = self.application
+        try:
+            self.session = application.pool.open()
+        except SessionLimitError:
+            self.session = None
+            self.close(TRY_AGAIN_LATER, "Too many sessions")
+            return
+        self.last_message = time.monotonic()
+        self.busy = False
+        self.model_kwargs = copy.deepcopy(application.model_kwargs)
+        self.started = False
+        application.connections.add(self)
+        params = {
+            param: value.json for param, value in self.model_kwargs.items() if is_user_param(value)
+        }
+        self.write_message({"type": "model_params", "params": params})
+
+    def session_kwargs(self):
+        """
+        The arguments of the model of the session, as ModularServer.reset_model.
+        """
+        kwargs = {}
+        for key, value in self.model_kwargs.items():
+            if is_user_param(value):
+                if value.param_type == "static_text":
+                    continue
+                kwargs[key] = value.value
+            else:
+                kwargs[key] = value
+        return kwargs
+
+    async def _request(self, future):
+        # A session waiting for its worker is not idle
+        self.busy = True
+        try:
+            frame = await asyncio.wrap_future(future)
+        except SessionError:
+            traceback.print_exc()
+            self.close(INTERNAL_ERROR, "The session failed")
+            return
+        finally:
+            self.busy = False
+            self.last_message = time.monotonic()
+        if frame is None:
+            self.write_message({"type": "end"})
+        else:
+            self.write_message({"type": "viz_state", "data": frame})
+
+    async def on_message(self, message):
+        if self.session is None:
+            return
+        self.last_message = time.monotonic()
+        msg = tornado.escape.json_decode(message)
+        pool = self.application.pool
+        if msg["type"] == "reset" or (msg["type"] == "get_step" and not self.started):
+            self.started = True
+            await self._request(pool.reset(self.session, self.session_kwargs()))
+        elif msg["type"] == "get_step":
+            await self._request(pool.step(self.session))
+        elif msg["type"] == "submit_params":
+            param = msg["param"]
+            if param in self.application.user_params:
+                if is_user_param(self.model_kwargs[param]):
+                    self.model_kwargs[param].value = msg["value"]
+                else:
+                    self.model_kwargs[param] = msg["value"]
+
+    def on_close(self):
+        if self.session is not None:
+            self.application.connections.discard(self)
+            self.application.pool.close(self.session)
+            self.session = None
+
+
+class _SessionRoutes(tornado.web.Application):
+    # Comes right after ModularServer in the MRO of SessionServer, so it
+    # receives the handlers ModularServer builds and swaps the websocket's
+    def __init__(self, handlers, **settings):
+        handlers = [
+            (handler[0], SessionSocketHandler) + tuple(handler[2:])
+            if handler[1] is SocketHandler
+            else handler
+            for handler in handlers
+        ]
+        super().__init__(handlers, **settings)
+
+
+class SessionServer(mesa.visualization.ModularServer, _SessionRoutes):
+    """
+    A ModularServer that runs one model per websocket session in a
+    SessionPool, see the module docstring.
+
+    Args:
+        model_cls: Model class, defined at module level
+        make_elements: Module-level function that returns the visualization
+                       elements of a session; the page is built from one
+                       call in the web process
+        name, model_params, port: As ModularServer; model_params are the
+                                  initial values of every session's
+        processes: Number of worker processes; os.cpu_count() by default
+        max_sessions: Maximum number of open sessions
+        idle_timeout: Seconds without a message after which a session is
+                      closed
+    """
+
+    def __init__(
+        self,
+        model_cls,
+        make_elements,
+        name="Mesa Model",
+        model_params=None,
+        port=None,
+        processes=None,
+        max_sessions=DEFAULT_MAX_SESSIONS,
+        idle_timeout=DEFAULT_IDLE_TIMEOUT,
+    ):
+        self.pool = SessionPool(model_cls, make_elements, processes, max_sessions)
+        self.idle_timeout = idle_timeout
+        self.connections = set()
+        self._eviction = None
+        super().__init__(model_cls, make_elements(), name, model_params, port)
+
+    def reset_model(self):
+        # The models live in the workers only
+        self.model = None
+
+    def evict_idle(self):
+        """
+        Close the sessions idle for idle_timeout seconds.
+        """
+        now = time.monotonic()
+        for connection in list(self.connections):
+            if not connection.busy and now - connection.last_message >= self.idle_timeout:
+                self.connections.discard(connection)
+                connection.close(GOING_AWAY, "Idle session")
+                connection.on_close()
+
+    def listen(self, *args, **kwargs):
+        if self._eviction is None:
+            interval = max(min(self.idle_timeout / 4, 60.0), 0.1)
+            self._eviction = tornado.ioloop.PeriodicCallback(self.evict_idle, interval * 1000)
+            self._eviction.start()
+        return super().listen(*args, **kwargs)
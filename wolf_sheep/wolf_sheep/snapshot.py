@@ -0,0 +1,97 @@
+"""
+Model snapshots
+================================
+
+Save a running model (grid, scheduler, agents, random number generators,
+next_id counter and collected data) to a compressed file and load it back,
+or fork it in memory into branches that continue from the same step.
+
+A snapshot is the pickled model, so everything reachable from it must be
+picklable (the model2 reporters are partials rather than lambdas for this
+reason). Only load snapshots you wrote yourself: unpickling runs code.
+
+Example:
+>>> model = WolfSheep(seed=1)
+>>> model.run_model(1000)  # burn-in
+>>> save(model, "burn_in.snapshot")
+>>> branches = fork(model, 10, seeds=range(10))
+>>> for branch, rate in zip(branches, rates):
+...     branch.rate = rate
+...     branch.run_model(200)
+"""
+
+import gzip
+import pickle
+
+import numpy as np
+
+from .streams import LegacyStreams, RandomStreams
+
+PROTOCOL = pickle.HIGHEST_PROTOCOL
+
+
+def save(model, path, compresslevel=6):
+    """
+    Write a snapshot of model to path (a gzip-compressed pickle).
+    """
+    with gzip.open(path, "wb", compresslevel=compresslevel) as file:
+        pickle.dump(model, file, protocol=PROTOCOL)
+
+
+def load(path):
+    """
+    Read back a model saved with save(). It continues exactly as the saved
+    model would have.
+    """
+    with gzip.open(path, "rb") as file:
+        return pickle.load(file)
+
+
+def reseed(model, seed):
+    """
+    Reseed the random number generators of model (model.random, the NumPy
+    generators of the resource field and the vectorized model, and the
+    RandomStreams if any), so that branches of a fork follow different random
+    paths.
+    """
+    model._seed = seed
+    model.random.seed(seed)
+    if getattr(model, "resource_field", None) is not None:
+        model.resource_field.seed(model.random.getrandbits(64))
+    if isinstance(getattr(model, "rng", None), np.random.Generator):
+        model.rng = np.random.default_rng(model.random.getrandbits(64))
+        if isinstance(getattr(model, "streams", None), LegacyStreams):
+            model.streams = LegacyStreams(model.rng, model.streams.names)
+    streams = getattr(model, "streams", None)
+    if isinstance(streams, RandomStreams):
+        model.streams = RandomStreams(seed, streams.block_size, streams.names)
+        if getattr(model, "resource_field", None) is not None:
+            model.resource_field.rng = model.streams.generator("patch_recovery")
+
+
+def fork(model, n=None, seeds=None):
+    """
+    Clone model in memory. The model is pickled once and unpickled for each
+    branch, which is cheaper than copy.deepcopy.
+
+    Args:
+        model: the model to clone; it is not changed
+        n: Number of branches; if None, returns a single clone instead of a
+           list
+        seeds: optional seeds for the branches (see reseed). Without them
+               every branch continues with the same random numbers, and
+               diverges only through the changes made to it.
+    """
+    count = 1 if n is None else n
+    if seeds is not None:
+        seeds = list(seeds)
+        if len(seeds) != count:
+            raise ValueError(f"got {len(seeds)} seeds for {count} branches")
+    data = pickle.dumps(model, protocol=PROTOCOL)
+    branches = [pickle.loads(data) for _ in range(count)]
+    if seeds is not None:
+        for branch, seed in zip(branches, seeds):
+            reseed(branch, seed)
+    if n is None:
+        return branches[0]
+    return branches
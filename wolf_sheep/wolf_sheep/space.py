@@ -0,0 +1,230 @@
+"""
+Grid with a per-cell index of its agents by type.
+"""
+
+import mesa
+import numpy as np
+
+
+class TypedMultiGrid(mesa.space.MultiGrid):
+    """
+    A MultiGrid that also keeps, for every cell, the agents of each type in
+    the order they were placed there, so "the GrassPatch2 in this cell" is a
+    dict lookup instead of a scan over the cell with isinstance checks.
+
+    Agents of a type can additionally be bucketed by the value of one of their
+    attributes (e.g. Sheep by sex or by stuck), for agents that look for
+    "the male lampreys here". The attribute must be a TrackedAttribute so
+    that the grid hears about changes. Buckets cost an update on every
+    change of the attribute, so they are opt-in: model2 registers none, as
+    its agents look at the first agent of a type in a cell, or draw one at
+    random, and only then at its attributes.
+
+    Types are matched exactly: subclasses are indexed under their own type.
+
+    On a torus of at least 3x3 cells, the radius 1 neighborhoods of every
+    cell are also precomputed, as int32 arrays of neighbor cell ids (x *
+    height + y) indexed by cell id, for agents that move every step.
+
+    After track_changes(), the grid also records in changed_cells every cell
+    where an agent was placed, removed or moved to or from, or where a
+    TrackedAttribute of an agent changed, so that a visualization can redraw
+    those cells only (see canvas.DeltaCanvasGrid).
+
+    Example:
+    >>> grid = TypedMultiGrid(20, 20, torus=True)
+    >>> grid.add_bucket(Sheep, "sex")
+    >>> grid.get_first(pos, GrassPatch)
+    >>> grid.get_bucket(pos, Sheep, "sex", "Male")
+    """
+
+    def __init__(self, width, height, torus):
+        super().__init__(width, height, torus)
+        # (pos, type) -> [agents] and (pos, type, attr, value) -> [agents]
+        self._index = {}
+        self._bucket_attrs = {}
+        self._neighbor_tables = {}
+        # Cells changed since the last pop_changed_cells, if tracked
+        self.changed_cells = None
+
+    def track_changes(self):
+        """
+        Start recording the changed cells in changed_cells.
+        """
+        if self.changed_cells is None:
+            self.changed_cells = set()
+
+    def pop_changed_cells(self):
+        """
+        Returns the cells changed since the last call (or track_changes), and
+        starts a new set.
+        """
+        changed, self.changed_cells = self.changed_cells, set()
+        return changed
+
+    def add_bucket(self, type_class, attr):
+        """
+        Index the agents of type_class in each cell by the value of attr.
+        Must be called before any agent of that type is placed.
+        """
+        self._bucket_attrs.setdefault(type_class, []).append(attr)
+
+    def get_of_type(self, pos, type_class):
+        """
+        Returns a list of the agents of type_class in the cell at pos.
+        """
+        return list(self._index.get((pos, type_class), ()))
+
+    def get_first(self, pos, type_class):
+        """
+        Returns the first agent of type_class placed in the cell at pos, or
+        None if there is none.
+        """
+        agents = self._index.get((pos, type_class))
+        return agents[0] if agents else None
+
+    def get_bucket(self, pos, type_class, attr, value):
+        """
+        Returns a list of the agents of type_class in the cell at pos whose
+        attr equals value.
+        """
+        return list(self._index.get((pos, type_class, attr, value), ()))
+
+    def _has_neighbor_tables(self):
+        # Elsewhere the neighborhoods don't all have the same size
+        return self.torus and self.width >= 3 and self.height >= 3
+
+    def neighbor_table(self, moore, include_center=True):
+        """
+        Returns an int32 array of shape (width * height, k): row x * height
+        + y holds the ids of the cells that get_neighborhood((x, y), moore,
+        include_center) returns, in the same order. Built on first use, from
+        fixed offsets wrapped around the torus. Only for a torus of at least
+        3x3 cells.
+        """
+        key = (moore, include_center)
+        if key in self._neighbor_tables:
+            return self._neighbor_tables[key][0]
+        if not self._has_neighbor_tables():
+            raise ValueError("neighbor tables need a torus of at least 3x3 cells")
+        # In the order of get_neighborhood: by dx, then dy
+        offsets = [
+            (dx, dy)
+            for dx in (-1, 0, 1)
+            for dy in (-1, 0, 1)
+            if (moore or abs(dx) + abs(dy) <= 1) and (include_center or (dx, dy) != (0, 0))
+        ]
+        x = np.arange(self.width, dtype=np.int32)[:, None]
+        y = np.arange(self.height, dtype=np.int32)[None, :]
+        table = np.empty((self.width * self.height, len(offsets)), dtype=np.int32)
+        for column, (dx, dy) in enumerate(offsets):
+            cells = (x + dx) % self.width * self.height + (y + dy) % self.height
+            table[:, column] = cells.ravel()
+        # With the range of its columns, for random_neighbor
+        self._neighbor_tables[key] = (table, range(len(offsets)))
+        return table
+
+    def random_neighbor(self, pos, moore, include_center, random):
+        """
+        A cell drawn with random.choice from the neighborhood of pos, the
+        same draw as random.choice(get_neighborhood(...)) makes.
+        """
+        key = (moore, include_center)
+        if key not in self._neighbor_tables:
+            if not self._has_neighbor_tables():
+                return random.choice(self.get_neighborhood(pos, moore, include_center))
+            self.neighbor_table(moore, include_center)
+        table, columns = self._neighbor_tables[key]
+        x, y = pos
+        # Draws the same index as random.choice of the row
+        cell = table.item(x * self.height + y, random.choice(columns))
+        return divmod(cell, self.height)
+
+    def _index_add(self, agent, pos):
+        index = self._index
+        type_class = type(agent)
+        key = (pos, type_class)
+        try:
+            index[key].append(agent)
+        except KeyError:
+            index[key] = [agent]
+        for attr in self._bucket_attrs.get(type_class, ()):
+            index.setdefault((pos, type_class, attr, getattr(agent, attr)), []).append(agent)
+
+    def _index_remove(self, agent, pos):
+        index = self._index
+        type_class = type(agent)
+        key = (pos, type_class)
+        agents = index[key]
+        if len(agents) == 1:
+            del index[key]
+        else:
+            agents.remove(agent)
+        for attr in self._bucket_attrs.get(type_class, ()):
+            key = (pos, type_class, attr, getattr(agent, attr))
+            agents = index[key]
+            if len(agents) == 1:
+                del index[key]
+            else:
+                agents.remove(agent)
+
+    def place_agent(self, agent, pos):
+        x, y = pos
+        if agent.pos is None or agent not in self._grid[x][y]:
+            self._index_add(agent, pos)
+        super().place_agent(agent, pos)
+        if self.changed_cells is not None:
+            self.changed_cells.add(pos)
+
+    def remove_agent(self, agent):
+        if self.changed_cells is not None:
+            self.changed_cells.add(agent.pos)
+        self._index_remove(agent, agent.pos)
+        super().remove_agent(agent)
+
+    def move_agent(self, agent, pos):
+        self.move_agent_in_bounds(agent, self.torus_adj(pos))
+
+    def move_agent_in_bounds(self, agent, pos):
+        """
+        move_agent for a pos known to be on the grid (e.g. from
+        neighbor_table), which skips the torus wrapping.
+        """
+        old_pos = agent.pos
+        self._index_remove(agent, old_pos)
+        self._index_add(agent, pos)
+        # MultiGrid.remove_agent and place_agent, inlined
+        x, y = old_pos
+        cell = self._grid[x][y]
+        cell.remove(agent)
+        x, y = pos
+        self._grid[x][y].append(agent)
+        agent.pos = pos
+        if self._empties_built:
+            if not cell:
+                self._empties.add(old_pos)
+                self._empty_mask[old_pos] = False
+            self._empties.discard(pos)
+            self._empty_mask[pos] = True
+        if self.changed_cells is not None:
+            self.changed_cells.add(old_pos)
+            self.changed_cells.add(pos)
+
+    def attribute_changed(self, agent, attr, old, new):
+        """
+        Called by TrackedAttribute when attr of agent changes from old to new.
+        """
+        if self.changed_cells is not None and agent.pos is not None:
+            self.changed_cells.add(agent.pos)
+        type_class = type(agent)
+        if attr not in self._bucket_attrs.get(type_class, ()):
+            return
+        old_key = (agent.pos, type_class, attr, old)
+        agents = self._index.get(old_key)
+        if agents is None or agent not in agents:
+            # Not placed on the grid (yet)
+            return
+        agents.remove(agent)
+        if not agents:
+            del self._index[old_key]
+        self._index.setdefault((agent.pos, type_class, attr, new), []).append(agent)
@@ -0,0 +1,151 @@
+"""
+Stop conditions
+================================
+
+Conditions that end a run before its last step, once its outcome is decided:
+
+- Extinction: one of the watched species has died out;
+- SteadyState: the collected series no longer change, statistically, over a
+  rolling window of steps.
+
+A condition reads the values of the current step by reporter name, from
+model.census() if the model has one, otherwise from the values its
+mesa.DataCollector has just collected. start(model) is called once the model
+is set up, and check(model) at the end of every step, which returns the
+reason to stop or None.
+
+The models build their conditions with make_stop_conditions from their
+stop_on_extinction / steady_state_window parameters. When one is met they set
+running to False, which ends run_model, sweep runs and headless runs, and
+keep the reason in stop_reason.
+
+Example:
+>>> model = WolfSheep(stop_on_extinction=True, steady_state_window=200)
+>>> model.run_model(10000)
+>>> model.stop_reason
+'Species_E extinct at step 312'
+"""
+
+import numpy as np
+
+
+def current_value(model, name):
+    """
+    The value of the reporter name at the current step of model.
+    """
+    census = getattr(model, "census", None)
+    if census is not None:
+        return census()[name]
+    return model.datacollector.model_vars[name][-1]
+
+
+def _step(model):
+    schedule = getattr(model, "schedule", None)
+    return schedule.steps if schedule is not None else model.time
+
+
+class Extinction:
+    """
+    Stops a run when one of the species counted by the reporters names has
+    no individuals left. Species that are absent when the run starts are not
+    watched.
+    """
+
+    def __init__(self, names):
+        self.names = tuple(names)
+        self.watched = self.names
+
+    def start(self, model):
+        self.watched = tuple(name for name in self.names if current_value(model, name) > 0)
+
+    def check(self, model):
+        for name in self.watched:
+            if current_value(model, name) == 0:
+                return f"{name} extinct at step {_step(model)}"
+        return None
+
+
+class SteadyState:
+    """
+    Stops a run when the series of the reporters names are stationary over
+    the last window steps: for every series, the means of the older and the
+    newer half of the window differ by no more than threshold standard
+    errors. The window should span several population cycles, so that a
+    steady oscillation counts as stationary.
+
+    Population series are autocorrelated, so the standard errors are
+    underestimated and the test errs on the side of running longer.
+    """
+
+    def __init__(self, names, window, threshold=2.0):
+        if window < 4:
+            raise ValueError(f"window must be at least 4 steps, got {window}")
+        self.names = tuple(names)
+        self.window = window
+        self.threshold = threshold
+        # Every value is stored twice, at i and i + window, so that the last
+        # window values are always one contiguous slice
+        self._history = np.zeros((2 * window, len(self.names)))
+        self._count = 0
+
+    def start(self, model):
+        self._count = 0
+        self._add(model)
+
+    def _add(self, model):
+        position = self._count % self.window
+        values = [current_value(model, name) for name in self.names]
+        self._history[position] = values
+        self._history[position + self.window] = values
+        self._count += 1
+
+    def check(self, model):
+        self._add(model)
+        if self._count < self.window:
+            return None
+        start = self._count % self.window
+        values = self._history[start:start + self.window]
+        half = self.window // 2
+        older, newer = values[-2 * half:-half], values[-half:]
+        difference = np.abs(newer.mean(axis=0) - older.mean(axis=0))
+        error = np.sqrt((older.var(axis=0, ddof=1) + newer.var(axis=0, ddof=1)) / half)
+        if np.all(difference <= self.threshold * error):
+            return f"steady state over steps {_step(model) - self.window + 1}-{_step(model)}"
+        return None
+
+
+def make_stop_conditions(
+    model,
+    species,
+    reporters,
+    stop_on_extinction=False,
+    steady_state_window=0,
+    steady_state_threshold=2.0,
+):
+    """
+    The stop conditions selected by a model's parameters, started on model:
+    an Extinction of species if stop_on_extinction, and a SteadyState of
+    reporters if steady_state_window is not 0.
+    """
+    conditions = []
+    if stop_on_extinction:
+        conditions.append(Extinction(species))
+    if steady_state_window:
+        conditions.append(SteadyState(reporters, steady_state_window, steady_state_threshold))
+    for condition in conditions:
+        condition.start(model)
+    return conditions
+
+
+def check_stop_conditions(model):
+    """
+    Check model.stop_conditions at the end of a step; the first one that is
+    met stops the model (running = False) and sets its stop_reason. Every
+    condition is checked, so that each sees every step.
+    """
+    reasons = [condition.check(model) for condition in model.stop_conditions]
+    reason = next((reason for reason in reasons if reason is not None), None)
+    if reason is not None and model.running:
+        model.running = False
+        model.stop_reason = reason
+    return reason
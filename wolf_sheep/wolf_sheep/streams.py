@@ -0,0 +1,178 @@
+"""
+Random number streams for agent decisions
+================================
+
+RandomStreams gives every kind of random decision in the model (capture,
+reproduction, sex of offspring, ...) its own stream of uniform [0, 1) draws,
+spawned from one seed with numpy.random.SeedSequence. Each stream draws its
+numbers from NumPy in blocks, and a draw is a single C-level next() on the
+current block, cheaper than a call to random.random() through agent.random.
+
+Because the streams are independent, the numbers one kind of decision sees do
+not depend on how many draws the other kinds made, so a seeded run stays
+reproducible when draws are added or removed elsewhere, and the object and
+vectorized engines can take each decision kind from the same seeded stream.
+
+LegacyStreams has the same interface, with every stream being the model's
+random.random, so that the draws are exactly those of the code before the
+streams were introduced.
+
+Example:
+>>> streams = RandomStreams(42)
+>>> streams.capture()  # one draw
+>>> streams.random("capture", 1000)  # an array of draws, for vectorized code
+"""
+
+import copy
+import itertools
+from functools import partial
+
+import numpy as np
+
+# One stream per kind of decision
+STREAMS = (
+    "infection",
+    "capture",
+    "recovery",
+    "reproduce",
+    "offspring_sex",
+    "selectivity",
+    "patch_recovery",
+)
+
+BLOCK_SIZE = 4096
+
+
+def stream_seed(model):
+    """
+    The seed of a model's RandomStreams: the seed the model was created with
+    if it is an int, otherwise a number drawn from model.random.
+    """
+    seed = getattr(model, "_seed", None)
+    if isinstance(seed, (int, np.integer)):
+        return int(seed)
+    return model.random.getrandbits(128)
+
+
+class _Blocks:
+    """
+    Endless iterator of blocks of uniform draws, each handed out as a list
+    iterator so that the draws left in the current block can be recovered.
+    """
+
+    def __init__(self, generator, block_size, first_block=()):
+        self.generator = generator
+        self.block_size = block_size
+        self.pending = list(first_block)
+        self.current = iter(())
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.pending:
+            values, self.pending = self.pending, []
+        else:
+            values = self.generator.random(self.block_size).tolist()
+        self.current = iter(values)
+        return self.current
+
+    def remaining(self):
+        # From a copy: the chain is still reading self.current
+        return list(copy.copy(self.current))
+
+
+class RandomStreams:
+    """
+    Independent streams of uniform draws, one per name in names, spawned from
+    seed. Each stream is an attribute: streams.capture() returns its next
+    draw. random(name, size) returns an array of draws from the same stream,
+    for vectorized code; a stream should be used one way or the other.
+
+    Instances can be pickled (for snapshots): a copy continues every stream
+    where the original was.
+    """
+
+    def __init__(self, seed=None, block_size=BLOCK_SIZE, names=STREAMS):
+        self.seed = seed
+        self.block_size = block_size
+        self.names = tuple(names)
+        children = np.random.SeedSequence(seed).spawn(len(self.names))
+        self._setup({name: (np.random.default_rng(child), ()) for name, child in zip(self.names, children)})
+
+    def _setup(self, streams):
+        self._generators = {}
+        self._blocks = {}
+        for name, (generator, first_block) in streams.items():
+            blocks = _Blocks(generator, self.block_size, first_block)
+            self._generators[name] = generator
+            self._blocks[name] = blocks
+            setattr(self, name, partial(next, itertools.chain.from_iterable(blocks)))
+
+    def random(self, name, size):
+        """
+        An array of size draws from the stream name.
+        """
+        return self._generators[name].random(size)
+
+    def generator(self, name):
+        """
+        The numpy Generator behind the stream name, for code that needs
+        other distributions or keeps its own generator (ResourceField).
+        """
+        return self._generators[name]
+
+    def legacy_neighbor_draw(self, grid, pos, moore):
+        """
+        Nothing: see LegacyStreams.legacy_neighbor_draw.
+        """
+
+    def __getstate__(self):
+        # The chain iterators can't be pickled, so keep the generators and the
+        # draws left in each stream's current block
+        return {
+            "seed": self.seed,
+            "block_size": self.block_size,
+            "names": self.names,
+            "streams": {
+                name: (self._generators[name], self._blocks[name].remaining())
+                for name in self.names
+            },
+        }
+
+    def __setstate__(self, state):
+        self.seed = state["seed"]
+        self.block_size = state["block_size"]
+        self.names = state["names"]
+        self._setup(state["streams"])
+
+
+class LegacyStreams:
+    """
+    The RandomStreams interface on top of a single random source, a
+    random.Random or a numpy Generator: every stream draws from
+    random_source.random, in call order.
+    """
+
+    def __init__(self, random_source, names=STREAMS):
+        self.random_source = random_source
+        self.names = tuple(names)
+        for name in self.names:
+            setattr(self, name, random_source.random)
+
+    def random(self, name, size):
+        """
+        An array of size draws from random_source.
+        """
+        if isinstance(self.random_source, np.random.Generator):
+            return self.random_source.random(size)
+        return np.array([self.random_source.random() for _ in range(size)])
+
+    def legacy_neighbor_draw(self, grid, pos, moore):
+        """
+        Draw a neighbor cell of pos and discard it. The code before the
+        streams drew the cell of a newborn this way, then placed it in its
+        parent's cell; the draw is only kept so that seeded runs don't
+        change. RandomStreams skip it.
+        """
+        grid.random_neighbor(pos, moore, True, self.random_source)
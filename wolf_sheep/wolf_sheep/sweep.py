@@ -0,0 +1,216 @@
+"""
+Parallel parameter sweeps
+================================
+
+Runs a model over every combination of a set of parameter values, with a
+number of replicates per combination, spread over a process pool.
+
+Every run gets its own seed, spawned from one master seed with
+numpy.random.SeedSequence in a fixed task order. A run's result only depends
+on its parameters and its position in that order, so a sweep gives the same
+result whatever the number of worker processes.
+
+Example:
+>>> from wolf_sheep.sweep import sweep
+>>> result = sweep(
+...     {"sheep_reproduce": [0.04, 0.06], "initial_rate": 0.5},
+...     replicates=10,
+...     max_steps=100,
+...     master_seed=42,
+... )
+>>> import pandas as pd
+>>> pd.DataFrame(result)
+
+For large ensembles, aggregate_sweep summarizes the replicates of every
+combination with an ensemble.ReplicateAggregator as the runs come back,
+instead of returning every collected step of every run.
+"""
+
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .ensemble import DEFAULT_QUANTILES, ReplicateAggregator
+from .model2 import WolfSheep
+
+# Model parameters that write a run's output to a path: the sweep reads
+# the collected data from the DataCollector, and every run would write to
+# the same path
+OUTPUT_PARAMETERS = ("stream_to", "profile_to", "record_to")
+
+
+def make_tasks(parameters, replicates=1):
+    """
+    Expand a dict of parameter values into one dict of model kwargs per run.
+
+    Values that are lists, tuples or ranges are swept over, anything else is
+    passed to every run as is. Combinations are in itertools.product order,
+    with the replicates of one combination next to each other.
+    """
+    names = list(parameters)
+    values = []
+    for name in names:
+        value = parameters[name]
+        if isinstance(value, (list, tuple, range)):
+            values.append(list(value))
+        else:
+            values.append([value])
+    tasks = []
+    for combination in itertools.product(*values):
+        kwargs = dict(zip(names, combination))
+        for replicate in range(replicates):
+            tasks.append((kwargs, replicate))
+    return tasks
+
+
+def spawn_seeds(master_seed, n):
+    """
+    Returns n independent integer seeds derived from master_seed.
+    """
+    children = np.random.SeedSequence(master_seed).spawn(n)
+    return [int(child.generate_state(1, np.uint64)[0]) for child in children]
+
+
+def _run(task):
+    """
+    Run one model to completion and return its DataCollector model variables
+    as a dict of lists, and its stop_reason. Module level so that it can be
+    sent to the workers.
+    """
+    model_cls, kwargs, seed, max_steps = task
+    model = model_cls(**kwargs, seed=seed)
+    for _ in range(max_steps):
+        if not model.running:
+            break
+        model.step()
+    return model.datacollector.model_vars, getattr(model, "stop_reason", None)
+
+
+def _results(jobs, processes, chunksize):
+    """
+    Yield the results of _run for jobs, in order, computed over processes
+    worker processes.
+    """
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if processes == 1 or len(jobs) <= 1:
+        yield from map(_run, jobs)
+        return
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        # map returns results in task order, whichever worker ran them
+        yield from executor.map(_run, jobs, chunksize=chunksize)
+
+
+def _jobs(parameters, replicates, max_steps, master_seed, model_cls):
+    for name in OUTPUT_PARAMETERS:
+        if parameters.get(name) is not None:
+            raise ValueError(f"{name} can't be used in a sweep: every run would write to it")
+    tasks = make_tasks(parameters, replicates)
+    seeds = spawn_seeds(master_seed, len(tasks))
+    jobs = [
+        (model_cls, kwargs, seed, max_steps)
+        for (kwargs, _), seed in zip(tasks, seeds)
+    ]
+    return tasks, seeds, jobs
+
+
+def sweep(
+    parameters,
+    replicates=1,
+    max_steps=200,
+    master_seed=0,
+    processes=None,
+    model_cls=WolfSheep,
+    chunksize=1,
+):
+    """
+    Run model_cls over every combination of parameters, replicates times
+    each, for up to max_steps steps, and gather the collected data.
+
+    Args:
+        parameters: dict of model kwargs; list/tuple/range values are swept.
+                    The OUTPUT_PARAMETERS (stream_to, ...) are rejected.
+        replicates: Number of runs per combination of parameters
+        max_steps: Number of steps per run (fewer if the model stops running,
+                   e.g. with stop_on_extinction or steady_state_window)
+        master_seed: Seed that all the per-run seeds are derived from
+        processes: Number of worker processes, os.cpu_count() by default; 1
+                   runs everything in this process
+        model_cls: Model class to run; it must accept a seed kwarg and have
+                   a mesa.DataCollector as .datacollector
+        chunksize: Runs sent to a worker at a time
+
+    Returns:
+        A dict of equal-length numpy arrays, one row per collected step of
+        every run: "run", "replicate", "seed", "Step", "stop_reason" (why
+        the run stopped early, "" if it did not), one column per swept or
+        fixed parameter and one per model reporter. Rows are ordered by run,
+        then step.
+    """
+    tasks, seeds, jobs = _jobs(parameters, replicates, max_steps, master_seed, model_cls)
+    results = list(_results(jobs, processes, chunksize))
+
+    columns = {"run": [], "replicate": [], "seed": [], "Step": [], "stop_reason": []}
+    for name in parameters:
+        columns[name] = []
+    for run, ((kwargs, replicate), seed, (model_vars, stop_reason)) in enumerate(
+        zip(tasks, seeds, results)
+    ):
+        steps = len(next(iter(model_vars.values()), []))
+        columns["run"].extend([run] * steps)
+        columns["replicate"].extend([replicate] * steps)
+        columns["seed"].extend([seed] * steps)
+        columns["Step"].extend(range(steps))
+        columns["stop_reason"].extend([stop_reason or ""] * steps)
+        for name in parameters:
+            columns[name].extend([kwargs[name]] * steps)
+        for name, values in model_vars.items():
+            columns.setdefault(name, []).extend(values)
+    result = {name: np.asarray(values) for name, values in columns.items()}
+    # Seeds use all 64 bits, which would otherwise turn them into floats
+    result["seed"] = np.asarray(columns["seed"], dtype=np.uint64)
+    return result
+
+
+def aggregate_sweep(
+    parameters,
+    replicates=1,
+    max_steps=200,
+    master_seed=0,
+    processes=None,
+    model_cls=WolfSheep,
+    chunksize=1,
+    quantiles=DEFAULT_QUANTILES,
+    carry_forward=False,
+):
+    """
+    Run the same sweep as sweep(), with the same seeds, but summarize the
+    replicates of every combination of parameters with a
+    ReplicateAggregator as the runs come back, so that memory does not grow
+    with the number of replicates.
+
+    Args:
+        parameters, replicates, max_steps, master_seed, processes,
+        model_cls, chunksize: See sweep()
+        quantiles, carry_forward: See ensemble.ReplicateAggregator
+
+    Returns:
+        A list of (kwargs, aggregator) pairs, one per combination of
+        parameters, in itertools.product order. The aggregators summarize
+        every model reporter; their count shows how many runs got to each
+        step.
+    """
+    tasks, _, jobs = _jobs(parameters, replicates, max_steps, master_seed, model_cls)
+    summaries = []
+    for (kwargs, replicate), (model_vars, _) in zip(
+        tasks, _results(jobs, processes, chunksize)
+    ):
+        if replicate == 0:
+            aggregator = ReplicateAggregator(
+                model_vars, max_steps + 1, quantiles, carry_forward
+            )
+            summaries.append((kwargs, aggregator))
+        aggregator.add(model_vars)
+    return summaries
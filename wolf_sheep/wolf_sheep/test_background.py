@@ -0,0 +1,68 @@
+"""
+Tests of background.BackgroundSimulation.
+"""
+
+import concurrent.futures
+
+import mesa
+import pytest
+
+from .background import BackgroundSimulation
+
+
+class Counter(mesa.Model):
+    """
+    Counts its steps; step fail_at raises.
+    """
+
+    def __init__(self, fail_at=None):
+        super().__init__()
+        self.count = 0
+        self.fail_at = fail_at
+
+    def step(self):
+        if self.count == self.fail_at:
+            raise ValueError("step failed")
+        self.count += 1
+
+
+def request(simulation, function=lambda model: model.count):
+    return simulation.request(function).result(timeout=10)
+
+
+def test_requests_run_between_steps():
+    simulation = BackgroundSimulation(Counter(), idle_timeout=10)
+    try:
+        counts = [request(simulation) for _ in range(50)]
+        assert counts == sorted(counts)
+        assert counts[-1] <= simulation.steps
+    finally:
+        simulation.close()
+
+
+def test_a_failed_step_fails_the_requests():
+    model = Counter(fail_at=5)
+    simulation = BackgroundSimulation(model, idle_timeout=10)
+    try:
+        with pytest.raises(ValueError, match="step failed"):
+            # Keeps the worker stepping until it fails
+            for _ in range(1000):
+                request(simulation)
+        assert isinstance(simulation.error, ValueError)
+        assert not model.running
+        assert simulation.steps == model.count == 5
+        # Requests made after the failure fail as well
+        with pytest.raises(ValueError):
+            request(simulation)
+    finally:
+        simulation.close()
+
+
+def test_close_cancels_the_queued_requests():
+    simulation = BackgroundSimulation(Counter(), idle_timeout=10)
+    simulation.close()
+    future = simulation.request(lambda model: model.count)
+    simulation.close()
+    assert future.cancelled()
+    with pytest.raises(concurrent.futures.CancelledError):
+        future.result()
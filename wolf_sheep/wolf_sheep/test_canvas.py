@@ -0,0 +1,136 @@
+"""
+Tests of DeltaCanvasGrid and BatchChartModule served to several pages.
+"""
+
+import json
+
+import tornado.testing
+import tornado.websocket
+
+from .agents2 import GrassPatch, Sheep, Wolf
+from .background import BatchChartModule
+from .canvas import DeltaCanvasGrid, DeltaModularServer
+from .model2 import WolfSheep
+
+SERIES = [{"Label": "Species_E", "Color": "#AA0000"}, {"Label": "Species_B", "Color": "#00AA00"}]
+
+
+def portrayal(agent):
+    if isinstance(agent, Wolf):
+        return {"Shape": "circle", "Color": "red", "r": 0.8, "Layer": 2, "text": str(agent.energy)}
+    if isinstance(agent, Sheep):
+        return {"Shape": "circle", "Color": "white", "r": 0.5, "Layer": 1}
+    if isinstance(agent, GrassPatch):
+        color = "green" if agent.fully_grown else "brown"
+        return {"Shape": "rect", "Color": color, "w": 1, "h": 1, "Layer": 0}
+    return None
+
+
+def expected_cells(model):
+    """
+    The portrayals of every non-empty cell, as a page should draw them.
+    """
+    cells = {}
+    for x in range(model.grid.width):
+        for y in range(model.grid.height):
+            portrayals = [portrayal(agent) for agent in model.grid.get_cell_list_contents([(x, y)])]
+            portrayals = sorted(filter(None, portrayals), key=lambda p: p["Layer"])
+            if portrayals:
+                cells[x, y] = portrayals
+    return cells
+
+
+class Page:
+    """
+    Applies the frames of one connection as DeltaCanvasModule.js and
+    BatchChartModule.js do.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.styles = {}
+        self.cells = {}
+        self.chart = [[] for _ in SERIES]
+
+    async def request(self, message_type):
+        await self.connection.write_message(json.dumps({"type": message_type}))
+        while True:
+            message = json.loads(await self.connection.read_message())
+            if message["type"] == "viz_state":
+                break
+        canvas, chart = message["data"]
+        if canvas["keyframe"]:
+            self.styles = {}
+            self.cells = {}
+        self.styles.update({int(style): value for style, value in canvas["styles"].items()})
+        for x, y, items in canvas["cells"]:
+            portrayals = []
+            for item in items:
+                style, text = (item, None) if isinstance(item, int) else item
+                portrayal = dict(self.styles[style])
+                if text is not None:
+                    portrayal["text"] = text
+                portrayals.append(portrayal)
+            if portrayals:
+                self.cells[x, y] = portrayals
+            else:
+                self.cells.pop((x, y), None)
+        for values, new_values in zip(self.chart, chart["values"]):
+            del values[chart["start"]:]
+            values.extend(new_values)
+        return canvas
+
+
+class TestTwoConnections(tornado.testing.AsyncHTTPTestCase):
+    def get_app(self):
+        self.canvas = DeltaCanvasGrid(portrayal, 20, 20, volatile_types=(Wolf,))
+        self.chart = BatchChartModule(SERIES)
+        server = DeltaModularServer(
+            WolfSheep,
+            [self.canvas, self.chart],
+            "Wolf Sheep",
+            {"resource1": True, "sheep_gain_from_food": 5, "initial_wolves": 5, "seed": 1},
+        )
+        server.verbose = False
+        self.server = server
+        return server
+
+    async def connect(self):
+        url = f"ws://127.0.0.1:{self.get_http_port()}/ws"
+        page = Page(await tornado.websocket.websocket_connect(url))
+        # The model_params message
+        await page.connection.read_message()
+        return page
+
+    def check(self, page):
+        model = self.server.model
+        self.assertEqual(page.cells, expected_cells(model))
+        model_vars = model.datacollector.model_vars
+        self.assertEqual(page.chart, [list(model_vars[s["Label"]]) for s in SERIES])
+
+    @tornado.testing.gen_test
+    async def test_pages_get_their_own_changes(self):
+        first = await self.connect()
+        await first.request("reset")
+        self.check(first)
+        for _ in range(3):
+            await first.request("get_step")
+            self.check(first)
+
+        second = await self.connect()
+        canvas = await second.request("get_step")
+        self.assertTrue(canvas["keyframe"])
+        self.check(second)
+        for _ in range(3):
+            for page in (first, second, second, first):
+                canvas = await page.request("get_step")
+                self.assertFalse(canvas["keyframe"])
+                self.check(page)
+
+        second.connection.close()
+        for _ in range(100):
+            if len(self.canvas._clients) == 1:
+                break
+            await tornado.gen.sleep(0.01)
+        self.assertEqual(len(self.canvas._clients), 1)
+        self.assertEqual(len(self.chart._clients), 1)
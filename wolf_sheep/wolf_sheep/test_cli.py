@@ -0,0 +1,64 @@
+"""
+Tests of the headless command-line runner: its output files hold the same
+data as the model run in memory.
+"""
+
+import csv
+import io
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+from .collector import read_columns
+from .model2 import WolfSheep
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+STEPS = 15
+ARGS = ["--steps", str(STEPS), "--seed", "4", "--resource1", "true", "--sheep-gain-from-food", "5"]
+
+
+def run_cli(*args):
+    result = subprocess.run(
+        [sys.executable, "headless.py", *ARGS, *args],
+        cwd=os.path.dirname(HERE), capture_output=True, text=True, timeout=120,
+    )
+    assert result.returncode == 0, result.stderr
+    return result.stdout
+
+
+def expected_model_vars():
+    model = WolfSheep(resource1=True, sheep_gain_from_food=5, seed=4)
+    for _ in range(STEPS):
+        model.step()
+    return model.datacollector.model_vars
+
+
+def test_csv_output_matches_the_model():
+    expected = expected_model_vars()
+    rows = list(csv.DictReader(io.StringIO(run_cli())))
+    assert [int(row["Step"]) for row in rows] == list(range(STEPS + 1))
+    for name, values in expected.items():
+        assert [int(row[name]) for row in rows] == values
+
+
+def test_npz_output_matches_the_model(tmp_path):
+    path = tmp_path / "run.npz"
+    run_cli("--output", str(path))
+    expected = expected_model_vars()
+    with np.load(path) as output:
+        np.testing.assert_array_equal(output["Step"], np.arange(STEPS + 1))
+        for name, values in expected.items():
+            np.testing.assert_array_equal(output[name], values)
+
+
+def test_streamed_output_reads_back_with_read_columns(tmp_path):
+    path = tmp_path / "chunks"
+    run_cli("--stream-to", str(path), "--stream-chunk-size", "4")
+    expected = expected_model_vars()
+    columns = read_columns(str(path))
+    np.testing.assert_array_equal(columns["Step"], np.arange(STEPS + 1))
+    for name, values in expected.items():
+        np.testing.assert_array_equal(columns[name], values)
@@ -0,0 +1,52 @@
+"""
+Tests of StreamingDataCollector: streamed runs read back as the data that
+mesa.DataCollector keeps in memory.
+"""
+
+import numpy as np
+import pytest
+
+from .collector import StreamingDataCollector, iter_chunks, read_columns
+from .model2 import WolfSheep
+
+STEPS = 25
+PARAMS = dict(resource1=True, resource2=True, sheep_gain_from_food=5, seed=6)
+
+
+def run(**kwargs):
+    model = WolfSheep(**PARAMS, **kwargs)
+    for _ in range(STEPS):
+        model.step()
+    if "stream_to" in kwargs:
+        model.datacollector.close()
+    return model
+
+
+def assert_columns_match(columns, model_vars):
+    np.testing.assert_array_equal(columns["Step"], np.arange(STEPS + 1))
+    assert set(columns) == {"Step", *model_vars}
+    for name, values in model_vars.items():
+        np.testing.assert_array_equal(columns[name], values)
+
+
+@pytest.mark.parametrize("name", ["chunks", "run.parquet"])
+def test_streamed_runs_read_back_as_the_model_vars(tmp_path, name):
+    if name.endswith(".parquet"):
+        pytest.importorskip("pyarrow")
+    expected = run().datacollector.model_vars
+    path = str(tmp_path / name)
+    run(stream_to=path, stream_chunk_size=7)
+    assert_columns_match(read_columns(path), expected)
+    # 26 steps in chunks of 7
+    assert [len(chunk["Step"]) for chunk in iter_chunks(path, ["Step"])] == [7, 7, 7, 5]
+
+
+def test_columns_keep_the_type_of_their_first_value(tmp_path):
+    path = str(tmp_path / "chunks")
+    with StreamingDataCollector({"count": len, "flag": bool, "ratio": lambda x: len(x) / 4}, path, 2) as collector:
+        for value in ([1], [], [1, 2, 3]):
+            collector.collect(value)
+    columns = read_columns(path, ["count", "flag", "ratio"])
+    assert columns["count"].dtype == np.int64 and list(columns["count"]) == [1, 0, 3]
+    assert columns["flag"].dtype == bool and list(columns["flag"]) == [True, False, True]
+    assert columns["ratio"].dtype == np.float64 and list(columns["ratio"]) == [0.25, 0, 0.75]
@@ -0,0 +1,74 @@
+"""
+Tests of ensemble.ReplicateAggregator against NumPy on the same runs.
+"""
+
+import numpy as np
+import pytest
+
+from .ensemble import DEFAULT_QUANTILES, ReplicateAggregator
+from .model2 import WolfSheep
+
+STEPS = 10
+NAMES = ("Species_E", "Species_C", "Parasite")
+
+
+def replicate_runs(seeds, **kwargs):
+    runs = []
+    for seed in seeds:
+        model = WolfSheep(resource1=True, resource2=True, sheep_gain_from_food=5, seed=seed, **kwargs)
+        model.run_model(STEPS)
+        runs.append(model.datacollector.model_vars)
+    return runs
+
+
+def aggregate(runs, **kwargs):
+    aggregator = ReplicateAggregator(NAMES, STEPS + 1, **kwargs)
+    for run in runs:
+        aggregator.add(run)
+    return aggregator
+
+
+def test_mean_and_variance_match_numpy():
+    runs = replicate_runs(range(12))
+    aggregator = aggregate(runs)
+    assert aggregator.runs == 12 and list(aggregator.count) == [12] * (STEPS + 1)
+    for name in NAMES:
+        values = np.array([run[name] for run in runs], dtype=float)
+        np.testing.assert_allclose(aggregator.mean(name), values.mean(axis=0))
+        np.testing.assert_allclose(aggregator.variance(name), values.var(axis=0, ddof=1))
+
+
+def test_quantiles_are_exact_below_5_runs():
+    runs = replicate_runs(range(4))
+    aggregator = aggregate(runs)
+    for name in NAMES:
+        values = np.array([run[name] for run in runs], dtype=float)
+        for q in DEFAULT_QUANTILES:
+            np.testing.assert_allclose(aggregator.quantile(name, q), np.quantile(values, q, axis=0))
+
+
+def test_quantiles_estimate_numpy_on_many_runs():
+    rng = np.random.default_rng(0)
+    aggregator = ReplicateAggregator(["x"], 3)
+    samples = rng.normal([0, 10, 100], [1, 5, 20], size=(5000, 3))
+    for sample in samples:
+        aggregator.add({"x": sample})
+    for q in DEFAULT_QUANTILES:
+        expected = np.quantile(samples, q, axis=0)
+        spread = samples.std(axis=0)
+        assert np.all(np.abs(aggregator.quantile("x", q) - expected) < 0.05 * spread)
+
+
+@pytest.mark.parametrize("carry_forward", [False, True])
+def test_runs_that_stopped_early(carry_forward):
+    runs = [{"x": [1, 2, 3, 4]}, {"x": [5, 6]}]
+    aggregator = ReplicateAggregator(["x"], 4, carry_forward=carry_forward)
+    for run in runs:
+        aggregator.add(run)
+    if carry_forward:
+        assert list(aggregator.count) == [2, 2, 2, 2]
+        assert list(aggregator.mean("x")) == [3, 4, 4.5, 5]
+    else:
+        assert list(aggregator.count) == [2, 2, 1, 1]
+        assert list(aggregator.mean("x")) == [3, 4, 3, 4]
+        assert np.isnan(aggregator.variance("x")[2:]).all()
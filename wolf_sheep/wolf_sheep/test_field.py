@@ -0,0 +1,77 @@
+"""
+Tests of field.ResourceField against the patch agents it replaces.
+"""
+
+import numpy as np
+
+from .agents2 import GrassPatch, GrassPatch2
+from .field import EMPTY, GRASS, GRASS2
+from .model2 import WolfSheep
+
+PATCH_KINDS = {GrassPatch: GRASS, GrassPatch2: GRASS2}
+
+
+def patch_arrays(model):
+    """
+    The kind, fully_grown and countdown arrays of the patch agents of model.
+    """
+    shape = (model.width, model.height)
+    kind = np.full(shape, EMPTY, dtype=np.int8)
+    fully_grown = np.zeros(shape, dtype=bool)
+    countdown = np.zeros(shape)
+    for patch_class, patch_kind in PATCH_KINDS.items():
+        for patch in model.schedule.get_agents_of_type(patch_class):
+            kind[patch.pos] = patch_kind
+            fully_grown[patch.pos] = patch.fully_grown
+            countdown[patch.pos] = patch.countdown
+    return kind, fully_grown, countdown
+
+
+def eat_column(model, x):
+    for y in range(model.height):
+        if model.resource_field is not None:
+            model.resource_field.fully_grown[x, y] = False
+        else:
+            for patch in model.grid.get_cell_list_contents([(x, y)]):
+                patch.fully_grown = False
+
+
+def test_field_regrows_as_the_patch_agents():
+    params = dict(
+        initial_sheep=0, initial_wolves=0, resource1=True, resource_regrowth_time=10, seed=2
+    )
+    agents = WolfSheep(**params)
+    field = WolfSheep(**params, resource_field=True)
+    grown = set()
+    for step in range(40):
+        kind, fully_grown, countdown = patch_arrays(agents)
+        np.testing.assert_array_equal(field.resource_field.kind, kind)
+        np.testing.assert_array_equal(field.resource_field.fully_grown, fully_grown)
+        np.testing.assert_array_equal(field.resource_field.countdown, countdown)
+        for patch_class in PATCH_KINDS:
+            assert field.count_patches(patch_class, "fully_grown") == agents.count_patches(
+                patch_class, "fully_grown"
+            )
+        grown.add(int(fully_grown.sum()))
+        # Between two steps, so that the patches are eaten at the same point
+        # of the step in both models
+        for model in (agents, field):
+            eat_column(model, step * 7 % model.width)
+            model.step()
+    # The eaten patches regrow at different steps
+    assert len(grown) > 5
+
+
+def test_field_starts_with_the_same_patches():
+    params = dict(resource1=True, resource2=True, sheep_gain_from_food=5, seed=3)
+    agents = WolfSheep(**params)
+    field = WolfSheep(**params, resource_field=True)
+    kind, fully_grown, countdown = patch_arrays(agents)
+    np.testing.assert_array_equal(field.resource_field.kind, kind)
+    np.testing.assert_array_equal(field.resource_field.fully_grown, fully_grown)
+    np.testing.assert_array_equal(field.resource_field.countdown, countdown)
+    para = np.zeros(kind.shape, dtype=bool)
+    for patch_class in PATCH_KINDS:
+        for patch in agents.schedule.get_agents_of_type(patch_class):
+            para[patch.pos] = patch.para
+    np.testing.assert_array_equal(field.resource_field.para, para)
@@ -0,0 +1,48 @@
+"""
+Tests of the deferred deaths and births of lifecycle.DeferredLifecycle.
+"""
+
+from .model2 import WolfSheep
+from .test_scheduler import assert_counters_match_a_full_scan
+from .test_space import assert_index_matches_the_cells
+
+PARAMS = dict(resource1=True, resource2=True, sheep_gain_from_food=5, deferred_updates=True)
+
+
+def test_deferred_runs_are_reproducible():
+    def run():
+        model = WolfSheep(**PARAMS, seed=4)
+        model.run_model(30)
+        return model.datacollector.model_vars
+
+    assert run() == run()
+
+
+def test_grid_and_schedule_agree_after_every_step():
+    model = WolfSheep(**PARAMS, seed=1)
+    for _ in range(20):
+        model.step()
+        scheduled = set(model.schedule.agents)
+        placed = {
+            agent
+            for x in range(model.grid.width)
+            for y in range(model.grid.height)
+            for agent in model.grid.get_cell_list_contents([(x, y)])
+        }
+        assert placed == scheduled
+        assert all(agent.pos is not None for agent in scheduled)
+        assert_counters_match_a_full_scan(model)
+        assert_index_matches_the_cells(model.grid)
+
+
+def test_the_dead_are_reused_for_the_newborns():
+    model = WolfSheep(**PARAMS, seed=1)
+    objects, unique_ids = set(), set()
+    for _ in range(30):
+        model.step()
+        for agent in model.schedule.agents:
+            objects.add(id(agent))
+            unique_ids.add(agent.unique_id)
+        pooled = [agent for pool in model.lifecycle.pool.values() for agent in pool]
+        assert not set(pooled) & set(model.schedule.agents)
+    assert len(objects) < len(unique_ids)
@@ -0,0 +1,61 @@
+"""
+Tests of model2.WolfSheep: the seeded output, and the census the data
+collector reports.
+"""
+
+import pytest
+
+from .agents2 import GrassPatch, GrassPatch2
+from .model2 import ANIMAL_CLASSES, WolfSheep
+
+PARAMS = dict(
+    resource1=True,
+    resource2=True,
+    sheep_gain_from_food=5,
+    initial_sheep=30,
+    initial_wolves=5,
+    sheep_reproduce=0.06,
+    wolf_gain_from_food=15,
+    resource_regrowth_time=25,
+)
+
+# The last collected row of WolfSheep(**PARAMS, seed=1) after 30 steps, as
+# given by the model before any of the optimizations
+BASELINE = {
+    "Species_E": 10,
+    "Species_D": 0,
+    "Species_C": 15,
+    "Lamprey(male)": 31,
+    "Lamprey(female)": 27,
+    "Species_B": 156,
+    "Species_A": 133,
+    "Parasite": 106,
+}
+
+
+def last_row(model):
+    return {name: values[-1] for name, values in model.datacollector.model_vars.items()}
+
+
+def test_default_options_give_the_baseline():
+    model = WolfSheep(**PARAMS, seed=1)
+    model.run_model(30)
+    assert last_row(model) == BASELINE
+    model = WolfSheep(
+        **PARAMS, seed=1, rng_streams=False, deferred_updates=False, active_patches=False
+    )
+    model.run_model(30)
+    assert last_row(model) == BASELINE
+
+
+@pytest.mark.parametrize("resource_field", [False, True])
+def test_census_counts_the_parasites(resource_field):
+    model = WolfSheep(**PARAMS, seed=3, resource_field=resource_field)
+    for _ in range(15):
+        model.step()
+        expected = sum(
+            bool(agent.para) for agent in model.schedule.agents if isinstance(agent, ANIMAL_CLASSES)
+        )
+        expected += model.count_patches(GrassPatch, "para")
+        expected += model.count_patches(GrassPatch2, "para")
+        assert model.census()["Parasite"] == expected
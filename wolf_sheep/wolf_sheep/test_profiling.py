@@ -0,0 +1,48 @@
+"""
+Tests of profiling.StepProfiler on model2.WolfSheep.
+"""
+
+import numpy as np
+
+from .collector import read_columns
+from .model2 import WolfSheep
+
+PARAMS = dict(resource1=True, resource2=True, sheep_gain_from_food=5, seed=1)
+STEPS = 12
+
+
+def run(**kwargs):
+    model = WolfSheep(**PARAMS, **kwargs)
+    for _ in range(STEPS):
+        model.step()
+    return model
+
+
+def test_profiling_does_not_change_the_run():
+    expected = run().datacollector.model_vars
+    assert run(profile=True).datacollector.model_vars == expected
+
+
+def test_records_cover_every_step_and_type():
+    model = run(profile=True, active_patches=True)
+    columns = model.profiler.columns()
+    np.testing.assert_array_equal(columns["Step"], np.arange(STEPS))
+    for name in ("GrassPatch", "GrassPatch2", "Sheep", "Sheep2", "Wolf", "Wolf2"):
+        assert np.all(columns[name + ".time"] >= 0)
+        assert np.all(columns[name + ".calls"] <= columns[name + ".agents"])
+    # Every patch is stepped in the first step, then those that are fully
+    # grown sleep
+    assert columns["GrassPatch.calls"][0] == columns["GrassPatch.agents"][0]
+    assert np.all(columns["GrassPatch.calls"][1:] < columns["GrassPatch.agents"][1:])
+    parts = columns["schedule"] + columns["collect"] + columns["bookkeeping"]
+    assert np.all(parts <= columns["total"])
+
+
+def test_records_stream_to_disk(tmp_path):
+    path = str(tmp_path / "profile")
+    model = run(profile_to=path)
+    model.profiler.close()
+    columns = read_columns(path)
+    np.testing.assert_array_equal(columns["Step"], np.arange(STEPS))
+    assert {"Wolf.time", "Wolf.agents", "Wolf.calls", "schedule", "collect", "total"} <= set(columns)
+    assert model.profiler.records == []
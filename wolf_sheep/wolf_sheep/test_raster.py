@@ -0,0 +1,82 @@
+"""
+Tests of the images of raster.py.
+"""
+
+import struct
+import zlib
+
+import numpy as np
+
+from .model2 import WolfSheep
+from .raster import ANIMAL_COLORS, PATCH_COLORS, _rgb, encode_png, patch_arrays, render_image
+from .vectorized import VectorizedWolfSheep
+
+PARAMS = dict(resource1=True, resource2=True, sheep_gain_from_food=5, seed=1)
+
+
+def decode_png(data):
+    """
+    The image of an 8-bit RGB PNG without filters, checking every chunk.
+    """
+    assert data[:8] == b"\x89PNG\r\n\x1a\n"
+    chunks = []
+    offset = 8
+    while offset < len(data):
+        (length,) = struct.unpack(">I", data[offset:offset + 4])
+        tag = data[offset + 4:offset + 8]
+        body = data[offset + 8:offset + 8 + length]
+        (crc,) = struct.unpack(">I", data[offset + 8 + length:offset + 12 + length])
+        assert crc == zlib.crc32(tag + body)
+        chunks.append((tag, body))
+        offset += 12 + length
+    assert [tag for tag, _ in chunks] == [b"IHDR", b"IDAT", b"IEND"]
+    width, height, depth, color_type, *_ = struct.unpack(">IIBBBBB", chunks[0][1])
+    assert (depth, color_type) == (8, 2)
+    rows = np.frombuffer(zlib.decompress(chunks[1][1]), dtype=np.uint8).reshape(height, -1)
+    assert not rows[:, 0].any()
+    return rows[:, 1:].reshape(height, width, 3)
+
+
+def test_encode_png_round_trips():
+    image = np.random.default_rng(0).integers(0, 256, (7, 11, 3), dtype=np.uint8)
+    for compresslevel in (1, 9):
+        np.testing.assert_array_equal(decode_png(encode_png(image, compresslevel)), image)
+
+
+def test_patches_are_drawn_in_their_colours():
+    model = WolfSheep(**PARAMS, width=12, height=8)
+    image = render_image(model, layers=[])
+    assert image.shape == (8, 12, 3) and image.dtype == np.uint8
+    kind, fully_grown = patch_arrays(model)
+    for x in range(12):
+        for y in range(8):
+            # Row 0 is the top of the grid
+            color = PATCH_COLORS[kind[x, y], fully_grown[x, y]]
+            np.testing.assert_array_equal(image[7 - y, x], _rgb(color))
+
+
+def test_resource_field_and_patch_agents_give_the_same_image():
+    agents = WolfSheep(**PARAMS, width=12, height=8)
+    field = WolfSheep(**PARAMS, width=12, height=8, resource_field=True)
+    np.testing.assert_array_equal(render_image(field), render_image(agents))
+
+
+def test_animals_saturate_their_cell():
+    model = WolfSheep(**PARAMS, width=12, height=8)
+    wolves = [agent for agent in model.schedule.agents if type(agent).__name__ == "Wolf"]
+    for wolf in wolves:
+        model.grid.move_agent(wolf, (3, 2))
+    # (3, 2) is in row 8 - 1 - 2 = 5 from the top
+    image = render_image(model, saturation=len(wolves), layers=["Species_E"])
+    np.testing.assert_array_equal(image[5, 3], _rgb(ANIMAL_COLORS["Species_E"]))
+    # Below saturation their colour is only blended in
+    image = render_image(model, saturation=len(wolves) + 1, layers=["Species_E"])
+    assert not np.array_equal(image[5, 3], _rgb(ANIMAL_COLORS["Species_E"]))
+
+
+def test_vectorized_models_are_drawn():
+    model = VectorizedWolfSheep(**PARAMS, width=12, height=8)
+    model.step()
+    image = render_image(model)
+    assert image.shape == (8, 12, 3)
+    assert not np.array_equal(image, render_image(model, layers=[]))
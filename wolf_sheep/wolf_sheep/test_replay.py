@@ -0,0 +1,84 @@
+"""
+Tests of TraceRecorder and TraceReplay: a replayed run shows the states of
+the recorded one.
+"""
+
+import pytest
+
+from .model2 import WolfSheep
+from .field import EMPTY
+from .replay import ANIMAL_TYPES, PATCH_TYPES, TraceReplay, _patch_arrays
+
+STEPS = 12
+PARAMS = dict(resource1=True, resource2=True, sheep_gain_from_food=5, width=10, height=10, seed=1)
+
+
+def grid_state(grid):
+    """
+    The states of the animals and of the patches on grid, sorted.
+    """
+    states = []
+    for x in range(grid.width):
+        for y in range(grid.height):
+            for agent in grid.get_cell_list_contents([(x, y)]):
+                if isinstance(agent, ANIMAL_TYPES):
+                    state = (agent.energy, getattr(agent, "stuck", None), getattr(agent, "sex", None))
+                else:
+                    state = (agent.fully_grown,)
+                states.append((agent.pos, type(agent).__name__, bool(agent.para)) + state)
+    return sorted(states, key=repr)
+
+
+def model_state(model):
+    """
+    grid_state of a live model, whose patches may be in a resource field
+    instead of on the grid.
+    """
+    if model.resource_field is None:
+        return grid_state(model.grid)
+    states = [state for state in grid_state(model.grid) if state[1] not in ("GrassPatch", "GrassPatch2")]
+    kind, fully_grown, para = _patch_arrays(model)
+    for x in range(model.width):
+        for y in range(model.height):
+            if kind[x, y] != EMPTY:
+                name = PATCH_TYPES[int(kind[x, y])].__name__
+                states.append(((x, y), name, bool(para[x, y]), bool(fully_grown[x, y])))
+    return sorted(states, key=repr)
+
+
+@pytest.fixture(params=[{}, {"resource_field": True}], ids=["agents", "field"])
+def recorded(request, tmp_path):
+    path = str(tmp_path / "run.trace")
+    model = WolfSheep(**PARAMS, **request.param, record_to=path, stream_chunk_size=5)
+    states = [model_state(model)]
+    for _ in range(STEPS):
+        model.step()
+        states.append(model_state(model))
+    model.recorder.close()
+    return path, model, states
+
+
+def test_replay_shows_every_recorded_step(recorded):
+    path, model, states = recorded
+    replay = TraceReplay(path)
+    assert replay.steps == STEPS + 1
+    for step in range(STEPS + 1):
+        assert replay.current_step == step
+        assert replay.running == (step < STEPS)
+        assert grid_state(replay.grid) == states[step]
+        for name, values in model.datacollector.model_vars.items():
+            assert list(replay.datacollector.model_vars[name]) == values[:step + 1]
+        replay.step()
+
+
+def test_replay_seeks_and_strides(recorded):
+    path, _, states = recorded
+    replay = TraceReplay(path, start=7, stride=3)
+    assert grid_state(replay.grid) == states[7]
+    replay.step()
+    assert grid_state(replay.grid) == states[10]
+    replay.step()
+    # Clamped to the last step
+    assert replay.current_step == STEPS and not replay.running
+    replay.seek(-5)
+    assert grid_state(replay.grid) == states[0]
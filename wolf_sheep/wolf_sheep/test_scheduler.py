@@ -0,0 +1,153 @@
+"""
+Tests of RandomActivationByTypeFiltered: the counters, the agents stepped
+on demand, and the TimingWheel they sleep on.
+"""
+
+import pickle
+import random
+
+import mesa
+
+from .agents2 import GrassPatch, GrassPatch2, Sheep, Sheep2, Wolf, Wolf2
+from .model2 import WolfSheep
+from .scheduler import RandomActivationByTypeFiltered, TimingWheel
+from .snapshot import fork
+
+
+class Relay(mesa.Agent):
+    """
+    Wakes the next agent of the chain when stepped, then sleeps.
+    """
+
+    def __init__(self, unique_id, model):
+        super().__init__(unique_id, model)
+        self.next = None
+        self.steps = []
+
+    def step(self):
+        self.steps.append(self.model.schedule.steps)
+        if self.next is not None:
+            self.model.schedule.wake(self.next)
+
+    def next_activation(self):
+        return None
+
+
+class Grazer(mesa.Agent):
+    """
+    Eats the patches of one column per step, in a fixed order.
+    """
+
+    def step(self):
+        model = self.model
+        x = model.schedule.steps * 7 % model.width
+        for patch in model.grid.get_cell_list_contents([(x, y) for y in range(model.height)]):
+            if isinstance(patch, (GrassPatch, GrassPatch2)):
+                patch.fully_grown = False
+
+
+def assert_counters_match_a_full_scan(model):
+    schedule = model.schedule
+    for agent_class in (GrassPatch, GrassPatch2, Sheep, Sheep2, Wolf, Wolf2):
+        agents = schedule.get_agents_of_type(agent_class)
+        assert schedule.get_counter(f"{agent_class.__name__} where para") == sum(
+            bool(agent.para) for agent in agents
+        )
+    for patch_class in (GrassPatch, GrassPatch2):
+        patches = schedule.get_agents_of_type(patch_class)
+        assert schedule.get_counter(f"{patch_class.__name__} where fully_grown") == sum(
+            patch.fully_grown for patch in patches
+        )
+    for sex in ("Male", "Female"):
+        assert schedule.get_counter(f"Sheep where sex=={sex!r}") == schedule.get_type_count(
+            Sheep, lambda sheep: sheep.sex == sex
+        )
+
+
+def test_counters_match_a_full_scan():
+    model = WolfSheep(resource1=True, resource2=True, sheep_gain_from_food=5, seed=1)
+    for _ in range(20):
+        model.step()
+        assert_counters_match_a_full_scan(model)
+
+
+def test_woken_in_turn_are_stepped_in_the_same_step():
+    model = mesa.Model()
+    model.schedule = RandomActivationByTypeFiltered(model)
+    relays = [Relay(i, model) for i in range(5)]
+    for relay, next_relay in zip(relays, relays[1:]):
+        relay.next = next_relay
+    for relay in relays:
+        model.schedule.add(relay)
+    model.schedule.step_on_demand(Relay)
+    for relay in relays[1:]:
+        model.schedule.sleep(relay)
+
+    model.schedule.step()
+    assert [relay.steps for relay in relays] == [[0]] * 5
+    assert model.schedule.get_active_count(Relay) == 0
+
+    model.schedule.wake(relays[3])
+    model.schedule.step()
+    assert [relay.steps for relay in relays] == [[0]] * 3 + [[0, 1]] * 2
+
+
+def _grown_counts(active_patches, steps=60):
+    model = WolfSheep(
+        initial_sheep=0,
+        initial_wolves=0,
+        resource1=True,
+        resource_regrowth_time=10,
+        active_patches=active_patches,
+        seed=3,
+    )
+    model.schedule.add(Grazer(model.next_id(), model))
+    # The types in a fixed order, as the random draws differ between the
+    # two modes
+    model.schedule.shuffle_types = False
+    counts = []
+    for _ in range(steps):
+        model.step()
+        counts.append(
+            (
+                model.count_patches(GrassPatch, "fully_grown"),
+                model.count_patches(GrassPatch2, "fully_grown"),
+            )
+        )
+    return counts
+
+
+def test_active_patches_grow_as_every_step():
+    counts = _grown_counts(False)
+    assert _grown_counts(True) == counts
+    # The grazer keeps some patches regrowing
+    assert min(grown + grown2 for grown, grown2 in counts) < 400
+
+
+def test_active_patches_forks_continue_exactly():
+    model = WolfSheep(resource1=True, resource2=True, sheep_gain_from_food=5, active_patches=True, seed=2)
+    model.run_model(10)
+    branch = fork(model)
+    model.run_model(20)
+    branch.run_model(20)
+    assert branch.datacollector.model_vars == model.datacollector.model_vars
+
+
+def test_timing_wheel_pops_in_order_of_step_then_scheduling():
+    rng = random.Random(1)
+    wheel = TimingWheel(size=8)
+    pending = []
+    order = 0
+    for now in range(200):
+        for _ in range(rng.randrange(4)):
+            # Some in the past, most within the ring, some in the overflow
+            step = now + rng.randrange(-3, 30)
+            wheel.schedule(step, order)
+            pending.append((max(step, now), order))
+            order += 1
+        if now % 50 == 25:
+            wheel = pickle.loads(pickle.dumps(wheel))
+        expected = sorted(timer for timer in pending if timer[0] <= now)
+        pending = [timer for timer in pending if timer[0] > now]
+        assert wheel.pop_due(now) == [item for _, item in expected]
+        assert len(wheel) == len(pending)
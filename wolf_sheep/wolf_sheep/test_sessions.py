@@ -0,0 +1,106 @@
+"""
+Tests of sessions.SessionPool and of SessionServer.evict_idle. The worker
+processes are spawned, so they import WolfSheep and make_elements by name.
+"""
+
+import time
+
+import pytest
+
+from .model2 import WolfSheep
+from .sessions import SessionError, SessionLimitError, SessionPool, SessionServer
+
+MODEL_KWARGS = dict(
+    width=5, height=5, initial_sheep=4, initial_wolves=2, resource1=True, sheep_gain_from_food=5, seed=1
+)
+
+
+def make_elements():
+    return []
+
+
+def result(future):
+    return future.result(timeout=60)
+
+
+@pytest.fixture
+def pool():
+    pool = SessionPool(WolfSheep, make_elements, processes=1, max_sessions=2)
+    yield pool
+    pool.shutdown()
+
+
+def test_sessions_are_limited(pool):
+    first = pool.open()
+    second = pool.open()
+    with pytest.raises(SessionLimitError):
+        pool.open()
+    pool.close(first)
+    assert len(pool) == 1
+    assert pool.open() not in (first, second)
+
+
+def test_sessions_run_their_own_models(pool):
+    first, second = pool.open(), pool.open()
+    assert result(pool.reset(first, MODEL_KWARGS)) == []
+    assert result(pool.reset(second, dict(MODEL_KWARGS, initial_wolves=0))) == []
+    for _ in range(3):
+        assert result(pool.step(first)) == []
+    # A model that can't be created fails its session's request only
+    with pytest.raises(SessionError):
+        result(pool.reset(second, dict(MODEL_KWARGS, width="five")))
+    assert result(pool.step(first)) == []
+
+
+def test_closed_sessions_fail_their_requests(pool):
+    session = pool.open()
+    result(pool.reset(session, MODEL_KWARGS))
+    pool.close(session)
+    # Returned as failed futures, not raised
+    for future in (pool.step(session), pool.reset(session, MODEL_KWARGS)):
+        with pytest.raises(SessionError, match="was closed"):
+            result(future)
+
+
+def test_the_sessions_of_a_dead_worker_fail(pool):
+    session = pool.open()
+    result(pool.reset(session, MODEL_KWARGS))
+    worker = pool._workers[0]
+    worker.process.kill()
+    worker.process.join()
+    with pytest.raises(SessionError, match="has died"):
+        result(pool.step(session))
+    # The next session restarts the worker and drops the dead one's
+    replacement = pool.open()
+    assert len(pool) == 1
+    assert result(pool.reset(replacement, MODEL_KWARGS)) == []
+    with pytest.raises(SessionError, match="was closed"):
+        result(pool.step(session))
+
+
+class Connection:
+    """
+    The state of a SessionSocketHandler that evict_idle reads.
+    """
+
+    def __init__(self, idle, busy=False):
+        self.last_message = time.monotonic() - idle
+        self.busy = busy
+        self.closed_with = None
+
+    def close(self, code, reason):
+        self.closed_with = code
+
+    def on_close(self):
+        pass
+
+
+def test_idle_sessions_are_evicted():
+    server = SessionServer(WolfSheep, make_elements, "Wolf Sheep", {}, processes=1, idle_timeout=10)
+    idle, active, busy = Connection(20), Connection(1), Connection(20, busy=True)
+    server.connections.update((idle, active, busy))
+    server.evict_idle()
+    assert server.connections == {active, busy}
+    assert idle.closed_with == 1001
+    assert active.closed_with is None and busy.closed_with is None
+    server.pool.shutdown()
@@ -0,0 +1,59 @@
+"""
+Tests of model snapshots: saved, loaded and forked models continue exactly
+as the original does.
+"""
+
+import pytest
+
+from .model2 import WolfSheep
+from .snapshot import fork, load, save
+
+PARAMS = dict(resource1=True, resource2=True, sheep_gain_from_food=5, seed=1)
+
+
+def agent_states(model):
+    return sorted(
+        (type(agent).__name__, agent.pos, getattr(agent, "energy", None))
+        for agent in model.schedule.agents
+    )
+
+
+@pytest.mark.parametrize(
+    "options", [{}, {"rng_streams": True, "resource_field": True}]
+)
+def test_forks_and_snapshots_continue_exactly(options, tmp_path):
+    model = WolfSheep(**PARAMS, **options)
+    model.run_model(10)
+    branch = fork(model)
+    path = tmp_path / "model.snapshot"
+    save(model, path)
+    loaded = load(path)
+    for other in (model, branch, loaded):
+        other.run_model(15)
+    for other in (branch, loaded):
+        assert other.datacollector.model_vars == model.datacollector.model_vars
+        assert agent_states(other) == agent_states(model)
+
+
+@pytest.mark.parametrize("options", [{}, {"rng_streams": True}])
+def test_branches_with_the_same_seed_agree(options):
+    model = WolfSheep(**PARAMS, **options)
+    model.run_model(5)
+    branches = fork(model, 3, seeds=[7, 7, 8])
+    for branch in branches:
+        branch.run_model(20)
+    first, same, other = (agent_states(branch) for branch in branches)
+    assert first == same
+    assert first != other
+
+
+def test_fork_checks_the_number_of_seeds():
+    with pytest.raises(ValueError):
+        fork(WolfSheep(**PARAMS), 2, seeds=[1])
+
+
+def test_streaming_models_cannot_be_snapshotted(tmp_path):
+    model = WolfSheep(**PARAMS, stream_to=str(tmp_path / "chunks"))
+    with pytest.raises(TypeError):
+        fork(model)
+    model.datacollector.close()
@@ -0,0 +1,119 @@
+"""
+Tests of space.TypedMultiGrid: the per-type index, the buckets, the
+neighbor tables, and the random walk.
+"""
+
+import os
+import random
+import subprocess
+import sys
+
+import mesa
+import pytest
+
+from .agents2 import GrassPatch, GrassPatch2, Sheep, Sheep2, Wolf, Wolf2
+from .model2 import WolfSheep
+from .scheduler import RandomActivationByTypeFiltered
+from .space import TypedMultiGrid
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+AGENT_CLASSES = (GrassPatch, GrassPatch2, Sheep, Sheep2, Wolf, Wolf2)
+NEIGHBORHOODS = [(moore, include_center) for moore in (True, False) for include_center in (True, False)]
+
+
+def assert_index_matches_the_cells(grid):
+    for x in range(grid.width):
+        for y in range(grid.height):
+            contents = grid.get_cell_list_contents([(x, y)])
+            for agent_class in AGENT_CLASSES:
+                of_type = [agent for agent in contents if type(agent) is agent_class]
+                assert grid.get_of_type((x, y), agent_class) == of_type
+                assert grid.get_first((x, y), agent_class) == (of_type[0] if of_type else None)
+
+
+def test_index_matches_the_cells():
+    model = WolfSheep(resource1=True, resource2=True, sheep_gain_from_food=5, seed=1)
+    for _ in range(20):
+        model.step()
+    assert_index_matches_the_cells(model.grid)
+
+
+def test_buckets_match_the_cells():
+    model = mesa.Model()
+    model.schedule = RandomActivationByTypeFiltered(model)
+    model.grid = grid = TypedMultiGrid(5, 5, torus=True)
+    grid.add_bucket(Sheep, "sex")
+    grid.add_bucket(Sheep, "stuck")
+    rng = random.Random(4)
+    sheep = []
+    for i in range(300):
+        action = rng.random()
+        if action < 0.3 or not sheep:
+            pos = (rng.randrange(5), rng.randrange(5))
+            agent = Sheep(i, pos, model, True, 1, rng.choice(("Male", "Female")), False, False)
+            grid.place_agent(agent, pos)
+            model.schedule.add(agent)
+            sheep.append(agent)
+        elif action < 0.5:
+            agent = sheep.pop(rng.randrange(len(sheep)))
+            grid.remove_agent(agent)
+            model.schedule.remove(agent)
+        elif action < 0.7:
+            grid.move_agent(rng.choice(sheep), (rng.randrange(5), rng.randrange(5)))
+        elif action < 0.85:
+            agent = rng.choice(sheep)
+            agent.stuck = not agent.stuck
+        else:
+            agent = rng.choice(sheep)
+            agent.sex = "Male" if agent.sex == "Female" else "Female"
+        for x in range(5):
+            for y in range(5):
+                here = grid.get_cell_list_contents([(x, y)])
+                for attr, values in (("sex", ("Male", "Female")), ("stuck", (True, False))):
+                    for value in values:
+                        # Buckets are not kept in placement order
+                        bucket = grid.get_bucket((x, y), Sheep, attr, value)
+                        assert len(bucket) == len(set(bucket))
+                        assert set(bucket) == {a for a in here if getattr(a, attr) == value}
+
+
+def test_random_walk_script_runs():
+    # test_random_walk.py imports random_walk as a top-level module, so
+    # random_walk.py must not depend on the package
+    result = subprocess.run(
+        [sys.executable, "test_random_walk.py"], cwd=HERE, capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
+    assert "Step: 9" in result.stdout
+
+
+@pytest.mark.parametrize("width, height", [(3, 3), (5, 7), (20, 20)])
+@pytest.mark.parametrize("moore, include_center", NEIGHBORHOODS)
+def test_neighbor_table_matches_get_neighborhood(width, height, moore, include_center):
+    grid = TypedMultiGrid(width, height, torus=True)
+    table = grid.neighbor_table(moore, include_center)
+    assert table.shape[0] == width * height
+    for x in range(width):
+        for y in range(height):
+            expected = grid.get_neighborhood((x, y), moore, include_center)
+            row = table[x * height + y]
+            assert [divmod(int(cell), height) for cell in row] == list(expected)
+
+
+@pytest.mark.parametrize("width, height", [(2, 5), (5, 7)])
+@pytest.mark.parametrize("moore, include_center", NEIGHBORHOODS)
+def test_random_neighbor_draws_as_random_choice(width, height, moore, include_center):
+    # The same draws as random.choice over get_neighborhood, so that seeded
+    # runs don't depend on the tables
+    grid = TypedMultiGrid(width, height, torus=True)
+    tables, choices = random.Random(7), random.Random(7)
+    for i in range(500):
+        pos = (i % width, i // width % height)
+        drawn = grid.random_neighbor(pos, moore, include_center, tables)
+        assert drawn == choices.choice(grid.get_neighborhood(pos, moore, include_center))
+
+
+def test_neighbor_table_needs_a_torus_of_3x3():
+    for grid in (TypedMultiGrid(2, 5, torus=True), TypedMultiGrid(5, 5, torus=False)):
+        with pytest.raises(ValueError):
+            grid.neighbor_table(True)
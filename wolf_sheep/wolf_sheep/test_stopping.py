@@ -0,0 +1,82 @@
+"""
+Tests of the stop conditions of stopping.py.
+"""
+
+import pytest
+
+from .model2 import WolfSheep
+from .stopping import Extinction, SteadyState, check_stop_conditions
+
+PARAMS = dict(resource1=True, resource2=True, sheep_gain_from_food=5, seed=1)
+
+
+class Series:
+    """
+    A model whose census is one series, value(step).
+    """
+
+    def __init__(self, value, condition):
+        self.value = value
+        self.time = 0
+        self.running = True
+        self.stop_reason = None
+        self.stop_conditions = [condition]
+        condition.start(self)
+
+    def census(self):
+        return {"x": self.value(self.time), "absent": 0}
+
+    def step(self):
+        self.time += 1
+        check_stop_conditions(self)
+
+
+def run_series(value, window, steps=200):
+    model = Series(value, SteadyState(["x"], window))
+    while model.running and model.time < steps:
+        model.step()
+    return model
+
+
+def test_extinction_stops_the_run():
+    model = WolfSheep(**PARAMS, initial_wolves=2, stop_on_extinction=True)
+    assert model.run_model(100) == model.stop_reason == f"Species_E extinct at step {model.schedule.steps}"
+    assert not model.running
+    assert model.datacollector.model_vars["Species_E"][-1] == 0
+    assert model.schedule.steps > 1
+
+
+def test_extinction_ignores_the_species_absent_at_the_start():
+    model = Series(lambda step: max(3 - step, 0), Extinction(["x", "absent"]))
+    for _ in range(5):
+        model.step()
+    assert model.stop_reason == "x extinct at step 3"
+
+
+def test_runs_without_stop_conditions_go_to_the_end():
+    model = WolfSheep(**PARAMS, initial_wolves=2)
+    assert model.run_model(30) is None
+    assert model.schedule.steps == 30
+
+
+def test_steady_state_stops_a_stationary_run():
+    model = WolfSheep(**PARAMS, steady_state_window=20)
+    reason = model.run_model(300)
+    assert reason.startswith("steady state over steps")
+    assert model.schedule.steps < 300
+
+
+def test_steady_state_waits_for_a_full_window():
+    model = run_series(lambda step: 5, 10)
+    assert model.time == 9
+    assert model.stop_reason == "steady state over steps 0-9"
+
+
+def test_steady_state_does_not_stop_a_trend():
+    model = run_series(lambda step: step + (step % 3), 10)
+    assert model.running and model.stop_reason is None
+
+
+def test_steady_state_needs_a_window_of_4():
+    with pytest.raises(ValueError):
+        SteadyState(["x"], 3)
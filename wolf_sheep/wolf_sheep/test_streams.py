@@ -0,0 +1,50 @@
+"""
+Tests of streams.RandomStreams: independent, reproducible and picklable
+streams of draws.
+"""
+
+import pickle
+import random
+
+import numpy as np
+
+from .model2 import WolfSheep
+from .streams import LegacyStreams, RandomStreams
+
+
+def test_streams_are_independent():
+    # The draws of one stream don't depend on the draws made from another,
+    # across block boundaries
+    alone = RandomStreams(5, block_size=64)
+    mixed = RandomStreams(5, block_size=64)
+    expected = [alone.capture() for _ in range(1000)]
+    drawn = []
+    for i in range(1000):
+        for _ in range(i % 3):
+            mixed.infection()
+        drawn.append(mixed.capture())
+    assert drawn == expected
+
+
+def test_pickled_streams_continue_where_they_were():
+    streams = RandomStreams(9, block_size=16)
+    for _ in range(21):
+        streams.reproduce()
+    copy = pickle.loads(pickle.dumps(streams))
+    assert [copy.reproduce() for _ in range(40)] == [streams.reproduce() for _ in range(40)]
+    np.testing.assert_array_equal(copy.random("capture", 5), streams.random("capture", 5))
+
+
+def test_legacy_streams_draw_from_the_random_source():
+    streams = LegacyStreams(random.Random(3))
+    source = random.Random(3)
+    assert [streams.capture(), streams.infection()] == [source.random(), source.random()]
+
+
+def test_models_with_streams_are_reproducible():
+    def run():
+        model = WolfSheep(resource1=True, resource2=True, sheep_gain_from_food=5, seed=2, rng_streams=True)
+        model.run_model(25)
+        return model.datacollector.model_vars
+
+    assert run() == run()
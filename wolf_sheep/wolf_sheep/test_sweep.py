@@ -0,0 +1,42 @@
+"""
+Tests of sweep.sweep.
+"""
+
+import numpy as np
+import pytest
+
+from .sweep import make_tasks, sweep
+
+PARAMETERS = {
+    "resource1": True,
+    "sheep_gain_from_food": 5,
+    "initial_sheep": [10, 30],
+    "sheep_reproduce": (0.04, 0.06),
+}
+
+
+def test_make_tasks_sweeps_lists_and_tuples():
+    tasks = make_tasks(PARAMETERS, replicates=2)
+    assert len(tasks) == 8
+    assert [replicate for _, replicate in tasks] == [0, 1] * 4
+    assert tasks[0][0] == {
+        "resource1": True,
+        "sheep_gain_from_food": 5,
+        "initial_sheep": 10,
+        "sheep_reproduce": 0.04,
+    }
+
+
+def test_results_do_not_depend_on_the_number_of_processes():
+    serial = sweep(PARAMETERS, replicates=2, max_steps=10, master_seed=3, processes=1)
+    parallel = sweep(PARAMETERS, replicates=2, max_steps=10, master_seed=3, processes=3)
+    assert serial.keys() == parallel.keys()
+    for name in serial:
+        np.testing.assert_array_equal(serial[name], parallel[name])
+    assert len(np.unique(serial["seed"])) == 8
+    assert len(serial["run"]) == 8 * 11
+
+
+def test_output_paths_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        sweep(dict(PARAMETERS, stream_to=str(tmp_path / "run.npz")), processes=1)
@@ -0,0 +1,33 @@
+"""
+Tests of vectorized.VectorizedWolfSheep against model2.WolfSheep.
+"""
+
+import numpy as np
+
+from .model2 import WolfSheep
+from .vectorized import VectorizedWolfSheep
+
+
+def test_vectorized_engine_agrees_statistically():
+    params = dict(resource1=True, sheep_gain_from_food=4, initial_sheep=100, initial_wolves=10)
+    seeds = range(20)
+    rows = {}
+    for model_cls in (WolfSheep, VectorizedWolfSheep):
+        samples = []
+        for seed in seeds:
+            model = model_cls(**params, seed=seed)
+            model.run_model(20)
+            samples.append([values[-1] for values in model.datacollector.model_vars.values()])
+        rows[model_cls] = np.array(samples, dtype=float)
+    agents, vectorized = rows[WolfSheep], rows[VectorizedWolfSheep]
+    # Means of every reporter at step 20 within 4 standard errors
+    difference = np.abs(agents.mean(0) - vectorized.mean(0))
+    standard_error = np.sqrt((agents.var(0) + vectorized.var(0)) / len(seeds))
+    assert np.all(difference <= 4 * standard_error + 1)
+
+
+def test_seeded_runs_are_reproducible():
+    runs = [VectorizedWolfSheep(resource1=True, resource2=True, sheep_gain_from_food=5, seed=5) for _ in range(2)]
+    for model in runs:
+        model.run_model(30)
+    assert runs[0].datacollector.model_vars == runs[1].datacollector.model_vars
@@ -0,0 +1,548 @@
+"""
+Vectorized Wolf-Sheep Predation Model
+================================
+
+The dynamics of model2.WolfSheep, with every species stored as a set of NumPy
+arrays (struct of arrays) instead of one Python object per agent. Movement,
+feeding, predation, death and birth are batched array operations over a whole
+species, so a step costs a few passes over the population arrays and the model
+scales to millions of agents on one core.
+
+Agents of one species act simultaneously rather than one after another, so
+interactions between agents that share a cell are resolved by drawing a random
+order within each cell:
+
+- Lampreys (Sheep): the first to arrive on a grown patch gets stuck to it, a
+  second one eats the patch and frees it, the same as two Sheep.step calls in
+  a row; a lamprey arriving where one is already stuck eats the patch and
+  frees the stuck one.
+- Sheep2 and Wolf2 grazing: one eater per patch.
+- Predation: the wolves in a cell are matched to distinct prey in that cell in
+  random order, which gives each wolf the same chance of picking a Sheep over
+  a Sheep2 as Wolf.step does.
+
+The species themselves step in a random order each step, like the
+RandomActivationByType scheduler does with agent types. Results are
+statistically equivalent to model2.WolfSheep, not identical run for run.
+"""
+
+from functools import partial
+
+import mesa
+import numpy as np
+
+from .collector import DEFAULT_CHUNK_SIZE, census_reporter, make_collector
+from .field import GRASS, GRASS2, REGROWTH_FACTOR, ResourceField
+from .model2 import REPORTERS, SPECIES
+from .stopping import check_stop_conditions, make_stop_conditions
+from .streams import LegacyStreams, RandomStreams, stream_seed
+
+
+class Population:
+    """
+    One species as a struct of arrays, one entry per living agent.
+
+    Attributes:
+        x, y: int arrays, grid position
+        energy: float array
+        para: bool array, whether the agent carries the parasite
+        male: bool array, sex (lampreys only, otherwise None)
+        stuck: bool array, stuck to a patch (lampreys only, otherwise None)
+    """
+
+    fields = ("x", "y", "energy", "para", "male", "stuck")
+
+    def __init__(self, x, y, energy, para, male=None, stuck=None):
+        self.x = x
+        self.y = y
+        self.energy = energy
+        self.para = para
+        self.male = male
+        self.stuck = stuck
+
+    def __len__(self):
+        return len(self.x)
+
+    def _arrays(self):
+        return {
+            name: getattr(self, name)
+            for name in self.fields
+            if getattr(self, name) is not None
+        }
+
+    def keep(self, mask):
+        """
+        Drop every agent where mask is False.
+        """
+        for name, values in self._arrays().items():
+            setattr(self, name, values[mask])
+
+    def extend(self, other):
+        """
+        Append the agents of another Population of the same species.
+        """
+        for name, values in self._arrays().items():
+            setattr(self, name, np.concatenate([values, getattr(other, name)]))
+
+    def select(self, index):
+        """
+        Returns a new Population holding the agents at index.
+        """
+        return Population(
+            **{name: values[index] for name, values in self._arrays().items()}
+        )
+
+
+def rank_within_cells(cells, rng, return_order=False):
+    """
+    For agents at the given cell ids, returns a random order of the agents
+    sharing each cell: 0 for the first, 1 for the second, and so on.
+
+    With return_order, also returns the agent indices sorted by cell and
+    then by that rank.
+    """
+    n = len(cells)
+    shuffled = rng.permutation(n)
+    order = shuffled[np.argsort(cells[shuffled], kind="stable")]
+    sorted_cells = cells[order]
+    starts = np.ones(n, dtype=bool)
+    starts[1:] = sorted_cells[1:] != sorted_cells[:-1]
+    first = np.maximum.accumulate(np.where(starts, np.arange(n), 0))
+    ranks = np.empty(n, dtype=np.intp)
+    ranks[order] = np.arange(n) - first
+    if return_order:
+        return ranks, order
+    return ranks
+
+
+class VectorizedWolfSheep(mesa.Model):
+    """
+    Wolf-Sheep Predation Model, vectorized over each species.
+
+    Takes the same parameters and collects the same reporters as
+    model2.WolfSheep.
+    """
+
+    height = 20
+    width = 20
+
+    verbose = False  # Print-monitoring
+
+    description = (
+        "A vectorized model for simulating wolf and sheep (predator-prey) ecosystem modelling."
+    )
+
+    def __init__(
+        self,
+        width=20,
+        height=20,
+        initial_sheep=20,
+        initial_sheep2=20,
+        initial_wolves=50,
+        sheep_reproduce=0.04,
+        wolf_reproduce=0.05,
+        wolf_gain_from_food=20,
+        resource1=False,
+        resource2=False,
+        resource_regrowth_time=30,
+        sheep_gain_from_food=0.4,
+        initial_rate=0.5,
+        stream_to=None,
+        stream_chunk_size=DEFAULT_CHUNK_SIZE,
+        rng_streams=False,
+        stop_on_extinction=False,
+        steady_state_window=0,
+        steady_state_threshold=2.0,
+        seed=None,
+    ):
+        """
+        Create a new vectorized Wolf-Sheep model with the given parameters.
+
+        Args:
+            See model2.WolfSheep.
+            rng_streams: If True, draw the decisions (capture, recovery,
+                         reproduction, sex, escape, patch recovery) from the
+                         same RandomStreams as model2.WolfSheep does, instead
+                         of from self.rng.
+            seed: Seed for the model's random number generators
+        """
+        super().__init__()
+        # Set parameters
+        self.width = width
+        self.height = height
+        self.sheep_num = initial_sheep
+        # model2.WolfSheep also starts with as many Sheep2 as Sheep
+        self.sheep2_num = initial_sheep
+        self.initial_wolves = initial_wolves
+        self.sheep_reproduce = sheep_reproduce
+        self.wolf_reproduce = wolf_reproduce
+        self.wolf_gain_from_food = wolf_gain_from_food
+        self.resource1 = resource1
+        self.resource2 = resource2
+        self.resource_regrowth_time = resource_regrowth_time
+        self.sheep_gain_from_food = sheep_gain_from_food
+        self.rate = initial_rate
+        self.initial_male = self.sheep_num * self.rate
+        self.time = 0
+        self._census = None
+        self._census_time = None
+        self.rng = np.random.default_rng(self.random.getrandbits(64))
+        rng = self.rng
+        if rng_streams:
+            self.streams = RandomStreams(stream_seed(self))
+        else:
+            self.streams = LegacyStreams(self.rng)
+
+        # Create sheep:
+        self.sheep = self._spawn(
+            self.sheep_num, 2 * self.sheep_gain_from_food, para=rng.random(self.sheep_num) < 0.5
+        )
+        self.sheep.male = np.arange(self.sheep_num) < self.initial_male
+        self.sheep.stuck = np.zeros(self.sheep_num, dtype=bool)
+
+        # Create wolves
+        self.wolves = self._spawn(self.initial_wolves, 2 * self.wolf_gain_from_food)
+        self.wolves2 = self._spawn(self.initial_wolves, self.wolf_gain_from_food)
+        self.sheep2 = self._spawn(self.sheep2_num, 2 * self.sheep_gain_from_food)
+
+        # Create resource patches
+        self.resource_field = None
+        if self.resource1 or self.resource2:
+            field = ResourceField(self, self.width, self.height)
+            shape = (self.width, self.height)
+            field.kind[:] = np.where(rng.random(shape) < 0.5, GRASS, GRASS2)
+            field.fully_grown[:] = rng.random(shape) < 0.5
+            field.countdown[:] = np.where(
+                field.fully_grown,
+                self.resource_regrowth_time,
+                rng.integers(0, self.resource_regrowth_time, shape),
+            )
+            field.countdown[field.kind == GRASS2] *= REGROWTH_FACTOR[GRASS2]
+            field.para[:] = rng.random(shape) < 0.2
+            field.seed(rng.integers(2**63))
+            if rng_streams:
+                field.rng = self.streams.generator("patch_recovery")
+            self.resource_field = field
+
+        self.datacollector = make_collector(
+            {name: partial(census_reporter, name) for name in REPORTERS},
+            stream_to,
+            stream_chunk_size,
+        )
+
+        self.running = True
+        self.datacollector.collect(self)
+        self.stop_reason = None
+        self.stop_conditions = make_stop_conditions(
+            self,
+            SPECIES,
+            REPORTERS,
+            stop_on_extinction,
+            steady_state_window,
+            steady_state_threshold,
+        )
+
+    def _spawn(self, n, max_energy, para=None):
+        """
+        n agents at random positions, with integer energy below max_energy.
+        """
+        rng = self.rng
+        return Population(
+            x=rng.integers(0, self.width, n),
+            y=rng.integers(0, self.height, n),
+            energy=rng.integers(0, max_energy, n).astype(float),
+            para=np.zeros(n, dtype=bool) if para is None else para,
+        )
+
+    def count_patches(self, kind, attr):
+        if self.resource_field is None:
+            return 0
+        return self.resource_field.count(kind, attr)
+
+    def census(self):
+        """
+        The counts behind the reporters and the end of step(), computed once
+        per step; the same keys as model2.WolfSheep.census().
+        """
+        if self._census_time == self.time and self._census is not None:
+            return self._census
+        males = int(np.count_nonzero(self.sheep.male))
+        grown = self.count_patches(GRASS, "fully_grown")
+        grown2 = self.count_patches(GRASS2, "fully_grown")
+        self._census = {
+            "Species_E": len(self.wolves),
+            "Species_D": len(self.wolves2),
+            "Species_C": len(self.sheep2),
+            "Lamprey(male)": males,
+            "Lamprey(female)": len(self.sheep) - males,
+            "Species_B": grown,
+            "Species_A": grown2,
+            "Parasite": self.count_parasites(),
+            "Sheep": len(self.sheep),
+            "GrassPatch": grown,
+            "GrassPatch2": grown2,
+        }
+        self._census_time = self.time
+        return self._census
+
+    def count_parasites(self):
+        patches = 0
+        if self.resource_field is not None:
+            patches = int(np.count_nonzero(self.resource_field.para[self.resource_field.kind != 0]))
+        return patches + sum(
+            int(np.count_nonzero(population.para))
+            for population in (self.sheep, self.sheep2, self.wolves, self.wolves2)
+        )
+
+    @property
+    def has_resource(self):
+        return bool(self.resource1 or self.resource2)
+
+    def cells(self, population):
+        """Cell id (x * height + y) of every agent of a population."""
+        return population.x * self.height + population.y
+
+    def _move(self, population, index=None):
+        """
+        Move the agents (all, or those at index) to a random cell of their
+        Moore neighbourhood, centre included, like RandomWalker.random_move.
+        """
+        n = len(population) if index is None else len(index)
+        step = self.rng.integers(-1, 2, size=(2, n))
+        if index is None:
+            population.x = (population.x + step[0]) % self.width
+            population.y = (population.y + step[1]) % self.height
+        else:
+            population.x[index] = (population.x[index] + step[0]) % self.width
+            population.y[index] = (population.y[index] + step[1]) % self.height
+
+    def _reproduce(self, population, probability, halve_energy=True):
+        """
+        Each agent gives birth with the given probability to one offspring in
+        its cell, which gets the parent's (halved) energy and no parasite.
+        """
+        parents = np.flatnonzero(self.streams.random("reproduce", len(population)) < probability)
+        if halve_energy:
+            population.energy[parents] /= 2
+        young = population.select(parents)
+        young.para = np.zeros(len(parents), dtype=bool)
+        if young.male is not None:
+            young.male = self.streams.random("offspring_sex", len(parents)) < 0.5
+            young.stuck = np.zeros(len(parents), dtype=bool)
+        population.extend(young)
+
+    def step_sheep(self):
+        """
+        Lampreys: feed on or get stuck to patches, die, get caught, recover
+        and reproduce (Sheep.step).
+        """
+        sheep = self.sheep
+        if not self.has_resource or len(sheep) == 0:
+            return
+        rng = self.rng
+        field = self.resource_field
+        grown = field.fully_grown.reshape(-1)
+        patch_para = field.para.reshape(-1)
+        gain = self.sheep_gain_from_food / 3
+
+        sheep.energy -= np.where(sheep.male, 0.8, 1.0)
+
+        # Stuck lampreys stay while their patch is grown
+        stuck = np.flatnonzero(sheep.stuck)
+        free = np.flatnonzero(~sheep.stuck)
+        fed = grown[self.cells(sheep)[stuck]]
+        sheep.energy[stuck[fed]] += gain
+        sheep.stuck[stuck[~fed]] = False
+
+        # The others move
+        self._move(sheep, free)
+        cells = self.cells(sheep)
+
+        # Cell -> a lamprey stuck to its patch (or -1)
+        occupant = np.full(self.width * self.height, -1)
+        still_stuck = np.flatnonzero(sheep.stuck)
+        occupant[cells[still_stuck]] = still_stuck
+
+        arrivals = free[grown[cells[free]]]
+        if len(arrivals):
+            rank = rank_within_cells(cells[arrivals], rng)
+            first = arrivals[rank == 0]
+            first_cells = cells[first]
+
+            # Someone is already stuck here: eat the patch, free them
+            taken = occupant[first_cells] >= 0
+            grown[first_cells[taken]] = False
+            sheep.stuck[occupant[first_cells[taken]]] = False
+            eaten = np.zeros(len(grown), dtype=bool)
+            eaten[first_cells[taken]] = True
+
+            # Otherwise get stuck and exchange the parasite with the patch
+            stickers = first[~taken]
+            sticker_cells = cells[stickers]
+            sheep.stuck[stickers] = True
+            sheep.energy[stickers] += gain
+            infected_patch = patch_para[sticker_cells]
+            infects = sheep.para[stickers]
+            patch_para[sticker_cells[infects]] = True
+            sheep.para[stickers[~infects & infected_patch]] = True
+
+            # A second arrival finds the first stuck: eat the patch, free it
+            occupant[sticker_cells] = stickers
+            second_cells = cells[arrivals[rank == 1]]
+            second_cells = second_cells[~eaten[second_cells]]
+            grown[second_cells] = False
+            sheep.stuck[occupant[second_cells]] = False
+
+        # Death, caught by human
+        streams = self.streams
+        sheep.keep((sheep.energy >= 0) & (streams.random("capture", len(sheep)) >= 0.01))
+        # Recover
+        sheep.para[streams.random("recovery", len(sheep)) < 0.05] = False
+
+        reproduce = (-4 * (self.rate - 0.5) * (self.rate - 0.5) + 1) * self.sheep_reproduce
+        self._reproduce(sheep, reproduce)
+
+    def step_sheep2(self):
+        """
+        Sheep2: move, graze GrassPatch2, die and reproduce (Sheep2.step).
+        """
+        sheep2 = self.sheep2
+        self._move(sheep2)
+        if self.has_resource:
+            field = self.resource_field
+            sheep2.energy -= 1
+            cells = self.cells(sheep2)
+            on_grass = np.flatnonzero(
+                (field.kind.reshape(-1)[cells] == GRASS2) & field.fully_grown.reshape(-1)[cells]
+            )
+            eaters = on_grass[rank_within_cells(cells[on_grass], self.rng) == 0]
+            eaten = cells[eaters]
+            sheep2.energy[eaters] += self.sheep_gain_from_food * 1.5
+            sheep2.para[eaters] = field.para.reshape(-1)[eaten]
+            field.fully_grown.reshape(-1)[eaten] = False
+            # Death
+            sheep2.keep(sheep2.energy >= 0)
+        self._reproduce(sheep2, self.sheep_reproduce * 1.2, halve_energy=self.has_resource)
+
+    def _hunt(self, wolves, prey, gain):
+        """
+        Match the wolves to distinct prey in their cells and let them eat.
+        prey is a list of Populations; the male lampreys escape 20% of the
+        time. Returns, for each Population in prey, the mask of survivors.
+        """
+        rng = self.rng
+        wolf_cells = self.cells(wolves)
+        prey_cells = np.concatenate([self.cells(p) for p in prey])
+        survivors = np.ones(len(prey_cells), dtype=bool)
+        if len(wolf_cells) and len(prey_cells):
+            # Prey sorted by cell, in random order within each cell
+            _, order = rank_within_cells(prey_cells, rng, return_order=True)
+            counts = np.bincount(prey_cells, minlength=self.width * self.height)
+            starts = np.cumsum(counts) - counts
+
+            wolf_rank = rank_within_cells(wolf_cells, rng)
+            hunters = np.flatnonzero(wolf_rank < counts[wolf_cells])
+            caught = order[starts[wolf_cells[hunters]] + wolf_rank[hunters]]
+
+            prey_male = np.concatenate(
+                [p.male if p.male is not None else np.zeros(len(p), dtype=bool) for p in prey]
+            )
+            prey_para = np.concatenate([p.para for p in prey])
+            eats = ~prey_male[caught] | (self.streams.random("selectivity", len(caught)) < 0.8)
+            hunters, caught = hunters[eats], caught[eats]
+            wolves.energy[hunters] += gain
+            wolves.para[hunters] |= prey_para[caught]
+            survivors[caught] = False
+        bounds = np.cumsum([0] + [len(p) for p in prey])
+        return [survivors[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+    def _end_wolf_step(self, wolves):
+        # Death or reproduction
+        wolves.keep(wolves.energy >= 0)
+        self._reproduce(wolves, self.wolf_reproduce)
+
+    def step_wolves(self):
+        """
+        Wolves: move, eat a Sheep or Sheep2, die or reproduce (Wolf.step).
+        """
+        self._move(self.wolves)
+        self.wolves.energy -= 1
+        alive_sheep, alive_sheep2 = self._hunt(
+            self.wolves, [self.sheep, self.sheep2], self.wolf_gain_from_food
+        )
+        self.sheep.keep(alive_sheep)
+        self.sheep2.keep(alive_sheep2)
+        self._end_wolf_step(self.wolves)
+
+    def step_wolves2(self):
+        """
+        Wolf2: move, eat a Sheep, graze, die or reproduce (Wolf2.step).
+        """
+        wolves2 = self.wolves2
+        self._move(wolves2)
+        wolves2.energy -= 1
+        (alive_sheep,) = self._hunt(wolves2, [self.sheep], self.wolf_gain_from_food * 0.8)
+        self.sheep.keep(alive_sheep)
+
+        field = self.resource_field
+        if field is not None:
+            cells = self.cells(wolves2)
+            grown = field.fully_grown.reshape(-1)
+            on_grass = np.flatnonzero(grown[cells])
+            eaters = on_grass[rank_within_cells(cells[on_grass], self.rng) == 0]
+            eaten = cells[eaters]
+            grown[eaten] = False
+            wolves2.para[eaters] |= field.para.reshape(-1)[eaten]
+            wolves2.energy[eaters] += self.sheep_gain_from_food * np.where(
+                field.kind.reshape(-1)[eaten] == GRASS, 0.3, 0.2
+            )
+        self._end_wolf_step(wolves2)
+
+    def step_patches(self):
+        if self.resource_field is not None:
+            self.resource_field.step()
+
+    def step(self):
+        phases = [
+            self.step_sheep,
+            self.step_sheep2,
+            self.step_wolves,
+            self.step_wolves2,
+            self.step_patches,
+        ]
+        for i in self.rng.permutation(len(phases)):
+            phases[i]()
+        self.time += 1
+        # collect data
+        self.datacollector.collect(self)
+        census = self.census()
+        if self.verbose:
+            print(
+                [
+                    self.time,
+                    census["Species_E"],
+                    census["Sheep"],
+                    census["GrassPatch"],
+                    census["GrassPatch2"],
+                ]
+            )
+        self.sheep_num = census["Sheep"]
+        self.resource1 = census["GrassPatch"]
+        self.resource2 = census["GrassPatch2"]
+        self.male_num = census["Lamprey(male)"]
+        self.rate = 0.5
+        if self.stop_conditions:
+            check_stop_conditions(self)
+
+    def run_model(self, step_count=200):
+        """
+        Run step_count steps, or until a stop condition is met; returns the
+        stop_reason, None if the run went to the end.
+        """
+        for i in range(step_count):
+            if not self.running:
+                break
+            self.step()
+        if hasattr(self.datacollector, "flush"):
+            self.datacollector.flush()
+        return self.stop_reason